@@ -1,12 +1,23 @@
 import threading
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 import hashlib
+import json
 import os
 import requests
 import time
 import debugpy
-from node import ChordNode
+from concurrent.futures import ThreadPoolExecutor
+from node import TRANSFER_CHUNK_SIZE, READ_QUORUM, WRITE_QUORUM, STATUS_DEPARTED
+from dispatch import DEPARTED_ROUTES, dispatch
+from metrics import HTTP_LATENCY, HTTP_REQUESTS, REGISTRY, node_gauges
+from scan import SCAN_MAX_NODES, page, scan_request, slice_params
+from scheduler import MAINTENANCE_POLL
+from vnodes import VirtualNodeHost
+import wire
+import workers
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
+from werkzeug.serving import make_server
 import logging
 log = logging.getLogger('werkzeug')
 log.setLevel(logging.ERROR)
@@ -24,120 +35,138 @@ if DEBUG_MODE:
 NODE_IP = os.getenv("NODE_IP", "0.0.0.0")
 NODE_PORT = int(os.getenv("NODE_PORT", "5000"))
 M_BITS = int(os.getenv("M_BITS", "10"))  # 7-bit IDs for simulation
+BATCH_FAN_OUT = int(os.getenv("BATCH_FAN_OUT", "8"))  # concurrent destinations per batch request
+SERVER_MODE = os.getenv("SERVER_MODE", "flask").lower()  # "flask" or "async"
+
+host = None  # VirtualNodeHost, created in __main__
+# The vnode a request is addressed to (see vnodes.py); the primary by default
+node = LocalProxy(lambda: host.resolve(request.args.get("vnode")))
+
+@app.before_request
+def start_timer():
+    g.started = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUESTS.inc(route, request.method, response.status_code)
+    HTTP_LATENCY.observe(time.perf_counter() - g.started, route)
+    return response
+
+@app.before_request
+def reject_departed():
+    """Tell callers that a vnode has left so they route around it (it may
+    share its process with vnodes that are still on the ring)."""
+    if request.path not in DEPARTED_ROUTES and node.successor is None:
+        return jsonify({
+            "status": "error",
+            "message": f"Node {node.node_id} has left the ring",
+            "node_id": node.node_id
+        }), STATUS_DEPARTED
+
+def peer_route():
+    """Answer a node-to-node route with its handler in dispatch.py."""
+    status, payload = dispatch(node, request.path, request.args.to_dict(), request.get_json(silent=True))
+    return jsonify(payload), status
 
 #AUTHOR: Apurv Choudhari 
-def stabilization_loop(node):
+def stabilization_loop(host):
+    host.join_siblings()
     while True:
-        try:
-            node.stabilize()
-            node.fix_fingers()
-        except Exception as e:
-            print(f"[Background Thread Error] {e}")
-        time.sleep(2)  # run every 5 seconds
+        # Each vnode's scheduler runs whatever is due and says when to come back
+        delays = [vnode.maintenance.run_due() for vnode in host]
+        time.sleep(min(delays + [MAINTENANCE_POLL]))
 
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({
-        "status": "ok",
-        "node_id": node.node_id,
-        "successor": node.successor["node_id"] if node.successor else None,
-        "predecessor": node.predecessor["node_id"] if node.predecessor else None
-    })
+    return peer_route()
 
 #AUTHOR: Apurv Choudhari 
 @app.route('/node_info', methods=['GET'])
 def get_node_info():
-    return jsonify({
-        "node_id": node.node_id,
-        "ip": node.ip,
-        "port": node.port,
-        "successor": {
-            "node_id": node.successor["node_id"] if node.successor else None,
-            "ip": node.successor["ip"] if node.successor else None,
-            "port": node.successor["port"] if node.successor else None
-        } if node.successor else None,
-        "predecessor": {
-            "node_id": node.predecessor["node_id"] if node.predecessor else None,
-            "ip": node.predecessor["ip"] if node.predecessor else None,
-            "port": node.predecessor["port"] if node.predecessor else None
-        } if node.predecessor else None,
-        "finger_table": [
-            {   
-                "start": entry["start"], 
-                "successor_id": entry["successor"]["node_id"]
-            } for entry in node.finger_table
-        ],
-        "data_count": len(node.data_store),
-        "m": node.m
-    })
+    return peer_route()
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/successor', methods=['GET'])
 def get_successor():
-    return jsonify(node.successor)
+    return peer_route()
+
+@app.route('/successor_list', methods=['GET'])
+def get_successor_list():
+    return peer_route()
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/get_predecessor', methods=['GET'])
 def get_predecessor():
-    if node.predecessor:
-        return jsonify(node.predecessor)
-    return jsonify(None)
+    return peer_route()
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/notify', methods=['POST'])
 def notify():
-    data = request.get_json()
-    result = node.notify(data)
-    return jsonify({"success": result})
+    return peer_route()
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/closest_preceding_finger', methods=['GET'])
 def closest_preceding_finger():
-    key_id = int(request.args.get("key_id"))
-    return jsonify(node.closest_preceding_finger(key_id))
+    return peer_route()
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/find_successor', methods=['GET'])
 def find_successor():
-    key_id = int(request.args.get("key_id"))
-    successor = node.find_successor(key_id)
-    return jsonify(successor)
+    return peer_route()
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/find_predecessor', methods=['GET'])
 def find_predecessor():
-    key_id = int(request.args.get("key_id"))
-    predecessor = node.find_predecessor(key_id)
-    return jsonify(predecessor)
+    return peer_route()
 
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/set_successor', methods=['POST'])
 def set_successor():
-    data = request.get_json()
-    new_successor = {"node_id": data.get("node_id"), "ip": data.get("ip"), "port": data.get("port")}
-    # You might add additional checks to verify that new_successor
-    # falls into the correct interval. For minimal change, we simply update.
-    node.successor = new_successor
-    # print(f"set_successor: Updated successor to {new_successor['node_id']}")
-    return jsonify({"message": f"Successor updated to {new_successor['node_id']}"}), 200
+    return peer_route()
 
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/update_finger_table', methods=['POST'])
 def update_finger_table():
-    data = request.get_json()
-    i = data.get("i")
-    s = data.get("s")
-    result = node.update_finger_table(s, i)
-    return jsonify({"success": result})
+    return peer_route()
 
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/transfer_keys', methods=['POST'])
 def transfer_keys():
+    return peer_route()
+
+@app.route('/transfer_keys_stream', methods=['POST'])
+def transfer_keys_stream():
+    """Stream the keys for a new predecessor as newline-delimited JSON chunks.
+    Keys stay here until the receiver acknowledges them via /transfer_ack."""
     data = request.get_json()
-    new_pred_id = data.get("node_id")
-    lower_bound = data.get("lower_bound")  # Optional lower bound
-    keys = node.transfer_keys_to_predecessor(new_pred_id, lower_bound)
-    return jsonify({"keys": keys})
+    chunks = node.transfer_chunks(data.get("node_id"), data.get("lower_bound"), data.get("cursor"),
+                                  data.get("chunk_size", TRANSFER_CHUNK_SIZE))
+
+    def generate():
+        for chunk in chunks:
+            yield json.dumps(chunk) + "\n"
+        yield json.dumps({"done": True}) + "\n"
+
+    return Response(generate(), mimetype="application/x-ndjson")
+
+@app.route('/transfer_ack', methods=['POST'])
+def transfer_ack():
+    return peer_route()
+
+def forward_to_owner(key_id, call):
+    """Resolve the owner of key_id and return call(owner). If the owner cannot
+    be reached it is dropped from our tables and the request is re-resolved
+    once, which lands on the next live successor."""
+    owner = node.find_successor(key_id)
+    try:
+        resp = call(owner)
+        if resp.status_code != STATUS_DEPARTED:
+            return resp
+    except (requests.ConnectionError, requests.Timeout):
+        pass
+    node.peer_failed(owner)
+    return call(node.find_successor(key_id))
 
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/store/<key>', methods=['POST'])
@@ -145,20 +174,30 @@ def store_key(key):
     value = request.data.decode()
     # Use a query parameter "forwarded" with a default value of "0"
     forwarded = request.args.get("forwarded", "0") == "1"
+    w = node.quorum(request.args.get("w"), WRITE_QUORUM)
     key_id = node.hash_key(key)
     if forwarded or node.is_responsible(key_id):
-        node.store_data(key, value)
+        acks = node.store_owned({key: value}, w)
+        if acks < w:
+            return jsonify({
+                "status": "error",
+                "message": f"Write quorum not met for key '{key}' ({acks}/{w} copies)",
+                "node_id": node.node_id,
+                "replicas": acks,
+                "path": [node.node_id]
+            }), 500
         return jsonify({
             "status": "success",
             "message": f"Key '{key}' stored at node {node.node_id}",
             "node_id": node.node_id,
+            "replicas": acks,
             "path": [node.node_id]
         })
     
-    successor = node.find_successor(key_id)
+    node.invalidate_cached([key])
     try:
-        url = f"http://{successor['ip']}:{successor['port']}/store/{key}?forwarded=1"
-        resp = requests.post(url, data=value, timeout=300)
+        resp = forward_to_owner(key_id, lambda owner: node.rpc.post(
+            owner, f"/store/{key}", data=value, params={"forwarded": 1, "w": w}, kind="lookup"))
         resp_data = resp.json()
         
         if "path" in resp_data:
@@ -166,7 +205,7 @@ def store_key(key):
         else:
             resp_data["path"] = [node.node_id]
             
-        return jsonify(resp_data)
+        return jsonify(resp_data), resp.status_code
     except Exception as e:
         return jsonify({
             "status": "error",
@@ -174,14 +213,52 @@ def store_key(key):
             "node_id": node.node_id
         }), 500
 
+def lookup_iterative(key, key_id, params):
+    """Resolve the owner of key iteratively (possibly from the route cache) and
+    ask it for the value. A cached owner that rejects the key or cannot be
+    reached is dropped from the cache and the lookup is retried without it."""
+    params = dict(params, check=1)
+    owner = node.find_successor_iterative(key_id)
+    try:
+        resp = node.rpc.get(owner, f"/lookup/{key}", params=params, kind="routing")
+        rejected = resp.status_code in (409, STATUS_DEPARTED)
+    except requests.RequestException:
+        rejected = True
+    if rejected:
+        node.route_cache.invalidate(owner["node_id"])
+        owner = node.find_successor_iterative(key_id, use_cache=False)
+        resp = node.rpc.get(owner, f"/lookup/{key}", params=params, kind="routing")
+    return resp
+
 #AUTHOR: Harikrishnan Venkatesh
 @app.route('/lookup/<key>', methods=['GET'])
 def lookup_key(key):
     forwarded = request.args.get("forwarded", "0") == "1"
+    r = node.quorum(request.args.get("r"), READ_QUORUM)
     key_id = node.hash_key(key)
     
+    if forwarded and request.args.get("check", "0") == "1" and not node.is_responsible(key_id):
+        # The sender resolved us from a cached route that is no longer valid
+        return jsonify({
+            "status": "error",
+            "message": f"Node {node.node_id} is not responsible for key '{key}'",
+            "node_id": node.node_id,
+            "path": [node.node_id]
+        }), 409
+
     if forwarded or node.is_responsible(key_id):
-        value = node.get_data(key)
+        reader = request.args.get("reader")
+        if reader:
+            # Registered before the read so a write after it invalidates the reader's copy
+            node.cache_readers.add(key, reader)
+        value, version, copies = node.quorum_read(key, r)
+        if copies < r:
+            return jsonify({
+                "status": "error",
+                "message": f"Read quorum not met for key '{key}' ({copies}/{r} copies)",
+                "node_id": node.node_id,
+                "path": [node.node_id]
+            }), 503
         if value is None:
             return jsonify({
                 "status": "error",
@@ -194,15 +271,37 @@ def lookup_key(key):
             "status": "success",
             "key": key,
             "value": value,
+            "version": version,
             "node_id": node.node_id,
             "path": [node.node_id]
         })
     
-    successor = node.find_successor(key_id)
+    # Single-copy reads of other nodes' keys may be answered from the read cache
+    cache = node.read_cache if r == 1 else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return jsonify({
+                "status": "success",
+                "key": key,
+                "value": cached[0],
+                "version": cached[1],
+                "node_id": node.node_id,
+                "cached": True,
+                "path": [node.node_id]
+            })
+    params = {"forwarded": 1, "r": r}
+    if cache is not None:
+        params["reader"] = node.address()
     try:
-        url = f"http://{successor['ip']}:{successor['port']}/lookup/{key}?forwarded=1"
-        resp = requests.get(url, timeout=300)
+        if request.args.get("mode") == "iterative":
+            resp = lookup_iterative(key, key_id, params)
+        else:
+            resp = forward_to_owner(key_id, lambda owner: node.rpc.get(
+                owner, f"/lookup/{key}", params=params, kind="lookup"))
         resp_data = resp.json()
+        if cache is not None and resp.status_code == 200:
+            cache.put(key, resp_data["value"], resp_data["version"])
         
         if "path" in resp_data:
             resp_data["path"].append(node.node_id)
@@ -217,14 +316,119 @@ def lookup_key(key):
             "node_id": node.node_id
         }), 500
 
+def fan_out(groups, send):
+    """Call send(owner, keys) once per destination node, concurrently.
+    Returns (owner, keys, response JSON or exception) for each group."""
+    if not groups:
+        return []
+    with ThreadPoolExecutor(max_workers=min(BATCH_FAN_OUT, len(groups))) as pool:
+        futures = [(owner, keys, pool.submit(send, owner, keys)) for owner, keys in groups.values()]
+    results = []
+    for owner, keys, future in futures:
+        try:
+            results.append((owner, keys, future.result()))
+        except Exception as e:
+            results.append((owner, keys, e))
+    return results
+
+@app.route('/store_batch', methods=['POST'])
+def store_batch():
+    items = request.get_json().get("items", {})
+    forwarded = request.args.get("forwarded", "0") == "1"
+    w = node.quorum(request.args.get("w"), WRITE_QUORUM)
+    if forwarded:
+        if node.store_owned(items, w) < w:
+            return jsonify({"status": "error", "node_id": node.node_id, "stored": 0,
+                            "message": "Write quorum not met"}), 500
+        return jsonify({"status": "success", "node_id": node.node_id, "stored": len(items)})
+
+    # send runs on pool threads, outside the request context the proxy needs
+    local = node._get_current_object()
+
+    def send(owner, keys):
+        if owner["node_id"] == local.node_id:
+            if local.store_owned({k: items[k] for k in keys}, w) < w:
+                raise RuntimeError("Write quorum not met")
+            return {"stored": len(keys)}
+        resp = local.rpc.post(owner, "/store_batch", json={"items": {k: items[k] for k in keys}},
+                             params={"forwarded": 1, "w": w}, kind="lookup")
+        resp.raise_for_status()
+        return resp.json()
+
+    node.invalidate_cached(items)
+    nodes = {}
+    failed = []
+    for owner, keys, result in fan_out(node.group_by_owner(items), send):
+        if isinstance(result, Exception):
+            failed.extend(keys)
+        else:
+            nodes[owner["node_id"]] = result["stored"]
+    return jsonify({
+        "status": "error" if failed else "success",
+        "node_id": node.node_id,
+        "stored": sum(nodes.values()),
+        "nodes": nodes,
+        "failed": failed
+    }), 500 if failed else 200
+
+@app.route('/replicate', methods=['POST'])
+def replicate():
+    """Apply writes pushed by the owner of the keys; older versions are ignored."""
+    return peer_route()
+
+@app.route('/invalidate', methods=['POST'])
+def invalidate():
+    """Drop keys an owner has overwritten from this process's read cache."""
+    return peer_route()
+
+@app.route('/replica_read/<key>', methods=['GET'])
+def replica_read(key):
+    return peer_route()
+
+@app.route('/lookup_batch', methods=['POST'])
+def lookup_batch():
+    keys = request.get_json().get("keys", [])
+    forwarded = request.args.get("forwarded", "0") == "1"
+    if forwarded:
+        values = {k: node.get_data(k) for k in keys}
+        return jsonify({"node_id": node.node_id, "values": {k: v for k, v in values.items() if v is not None}})
+
+    local = node._get_current_object()
+
+    def send(owner, owner_keys):
+        if owner["node_id"] == local.node_id:
+            return {"values": {k: v for k in owner_keys if (v := local.get_data(k)) is not None}}
+        resp = local.rpc.post(owner, "/lookup_batch", json={"keys": owner_keys},
+                             params={"forwarded": 1}, kind="lookup")
+        resp.raise_for_status()
+        return resp.json()
+
+    values = {}
+    nodes = {}
+    failed = []
+    for owner, owner_keys, result in fan_out(node.group_by_owner(keys), send):
+        if isinstance(result, Exception):
+            failed.extend(owner_keys)
+        else:
+            values.update(result["values"])
+            nodes[owner["node_id"]] = owner_keys
+    return jsonify({
+        "status": "error" if failed else "success",
+        "node_id": node.node_id,
+        "values": values,
+        "missing": [k for k in keys if k not in values and k not in failed],
+        "nodes": nodes,
+        "failed": failed
+    }), 500 if failed else 200
+
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/join', methods=['POST'])
 def join():
     bootstrap_address = request.data.decode().strip()
     if not bootstrap_address:
-        result = node.join()
+        result = host.join()
     else:
-        result = node.join(bootstrap_address)
+        result = host.join(bootstrap_address)
         
     if result:
         return jsonify({
@@ -232,19 +436,20 @@ def join():
             "message": f"Node {node.node_id} joined the network",
             "node_id": node.node_id,
             "successor": node.successor,
-            "predecessor": node.predecessor
+            "predecessor": node.predecessor,
+            "vnodes": sorted(host.vnodes)
         })
     else:
         return jsonify({
             "status": "error",
-            "message": "Failed to join network",
+            "message": host.join_error or "Failed to join network",
             "node_id": node.node_id
         }), 500
 
 #AUTHOR: Apurv Choudhari 
 @app.route("/depart", methods=["POST"])
 def depart_node():
-    success = node.depart()
+    success = host.depart()
     if success:
         return jsonify({"status": "success", "message": f"Node {node.node_id} departed."}), 200
     else:
@@ -253,96 +458,117 @@ def depart_node():
 #AUTHOR: Apurv Choudhari 
 @app.route("/update_successor", methods=["POST"])
 def update_successor():
-    data = request.get_json()
-    node.successor = data.get("successor")
-    return jsonify({"status": "success"}), 200
+    return peer_route()
 
 #AUTHOR: Apurv Choudhari 
 @app.route("/update_predecessor", methods=["POST"])
 def update_predecessor():
-    data = request.get_json()
-    node.predecessor = data.get("predecessor")
-    return jsonify({"status": "success"}), 200
+    return peer_route()
 
 #AUTHOR: Apurv Choudhari 
 @app.route("/receive_keys", methods=["POST"])
 def receive_keys():
-    data = request.get_json()
-    keys = data.get("data", {})
-    node.data_store.update(keys)
-    return jsonify({"status": "received"}), 200
+    return peer_route()
 
 
 #AUTHOR: Kruthik Jonnagaddala Thyagaraja
 @app.route('/finger_table', methods=['GET'])
 def get_finger_table():
-    return jsonify({
-        "node_id": node.node_id,
-        "finger_table": node.finger_table
-    })
+    return peer_route()
+
+@app.route('/maintenance', methods=['GET'])
+def get_maintenance():
+    """Current intervals and timings of the stabilization scheduler."""
+    return jsonify({"node_id": node.node_id, **node.maintenance.stats()})
 
 #AUTHOR: Harikrishnan Venkatesh
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus text exposition of this process's metrics (metrics.py)."""
+    return Response(REGISTRY.render(node_gauges(host)), mimetype="text/plain; version=0.0.4")
+
+@app.route('/scan', methods=['GET'])
+def scan():
+    """Page through every stored key in ring-ID order (see scan.py).
+
+    ?prefix= keeps keys that start with it, ?start=/?end= bound the ring IDs,
+    ?values=0 leaves values out and ?limit= sets the page size. The next
+    page is fetched with ?token=<next>; next is null once the scan is done.
+    """
+    if request.args.get("forwarded", "0") == "1":
+        # Another node's scan reading this node's slice
+        return peer_route()
+
+    try:
+        state, position, limit = scan_request(request.args, node.m)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e), "node_id": node.node_id}), 400
+    local = node._get_current_object()
+    entries = []
+    nodes = []
+    while position is not None and len(entries) < limit and len(nodes) < SCAN_MAX_NODES:
+        owner = local.find_successor(position["from"])
+        target = local if owner["node_id"] == local.node_id else local.sibling(owner)
+        try:
+            if target is not None and target.is_responsible(position["from"]):
+                part, following = target.scan_owned(position["from"], position["after"], limit - len(entries),
+                                                    state["prefix"], state["end"], state["values"])
+            else:
+                resp = local.rpc.get(owner, "/scan", params=slice_params(state, position, limit - len(entries)),
+                                     kind="transfer")
+                resp.raise_for_status()
+                body = resp.json()
+                part, following = body["entries"], body["next"]
+        except requests.RequestException as e:
+            # Routing is catching up with a join or failure; the token resumes from here
+            status = 200 if entries else 503
+            return jsonify(page(local, state, position, entries, nodes, f"Scan stopped at {owner['node_id']}: {e}")), status
+        entries.extend(part)
+        nodes.append(owner["node_id"])
+        position = following
+    return jsonify(page(local, state, position, entries, nodes))
+
 @app.route('/data_store', methods=['GET'])
 def get_data_store():
     return jsonify({
         "node_id": node.node_id,
         "data_count": len(node.data_store),
-        "data": node.data_store
+        "data": node.data_store.to_dict()
     })
 
-#AUTHOR: Apurv Choudhari 
-def get_node_state():
-    """Return the current state of this node for visualization purposes."""
-    node_state = {
-        "node_id": node.node_id,
-        "data_count":len(node.data_store),
-        "ip": node.ip,
-        "port": node.port,
-        "successor": node.successor,
-        "predecessor": node.predecessor,
-        "finger_table": [
-            {
-                "start": entry["start"],
-                "successor": entry["successor"]
-            } for entry in node.finger_table
-        ],
-        "m": node.m
-    }
-    return node_state
-
 #AUTHOR: Apurv Choudhari 
 @app.route('/network_state', methods=['GET'])
 def get_network_state():
-    """Return the current state of all known nodes in the network."""
-    visited = set([node.node_id])
-    nodes = [get_node_state()]
-    current = node.successor
-    max_nodes = 100
-    count = 0
-    
-    while current["node_id"] != node.node_id and count < max_nodes:
-        if current["node_id"] in visited:
-            break
-            
-        try:
-            url = f"http://{current['ip']}:{current['port']}/node_info"
-            resp = requests.get(url, timeout=2)
-            if resp.status_code == 200:
-                node_data = resp.json()
-                nodes.append(node_data)
-                visited.add(current["node_id"])
-                current = node_data["successor"]
-        except Exception as e:
-            print(f"Error fetching node state: {e}")
-            
-        count += 1
-    res = jsonify({"nodes": nodes})
-    return res
+    """Return the current state of all reachable nodes in the network.
+
+    Served from node.snapshots (snapshot.py); ?since=<version> returns only
+    the nodes changed since that version, ?fresh=1 skips the cache.
+    """
+    since = request.args.get("since", type=int)
+    fresh = request.args.get("fresh", "").lower() in ("1", "true")
+    return jsonify(node.snapshots.view(since=since, force=fresh))
+
+def run_worker(sock, index):
+    """Body of one worker process (see workers.serve); worker 0 runs stabilization."""
+    if index == 0:
+        threading.Thread(target=stabilization_loop, args=(host,), daemon=True).start()
+        wire.start_server(host, dispatch, NODE_PORT)
+    make_server("0.0.0.0", NODE_PORT, app, threaded=True, fd=sock.fileno()).serve_forever()
 
 if __name__ == "__main__":
-    node = ChordNode(ip=NODE_IP, port=NODE_PORT, m=M_BITS)
-    # node.join(bootstrap_address="0.0.0.0:5000")
+    if SERVER_MODE == "async":
+        import async_api
+        async_api.main()
+        raise SystemExit(0)
+
+    host = VirtualNodeHost(ip=NODE_IP, port=NODE_PORT, m=M_BITS)
+    # host.join(bootstrap_address="0.0.0.0:5000")
+
+    if workers.WORKERS > 1:
+        workers.serve(host, run_worker, NODE_PORT)
+        raise SystemExit(0)
 
-    t = threading.Thread(target=stabilization_loop, args=(node,), daemon=True)
+    t = threading.Thread(target=stabilization_loop, args=(host,), daemon=True)
     t.start()
+    wire.start_server(host, dispatch, NODE_PORT)
     app.run(host="0.0.0.0", port=NODE_PORT, debug=False)
@@ -0,0 +1,631 @@
+"""asyncio serving mode for a Chord node.
+
+Serves the same routes and JSON shapes as api.py, but on aiohttp: lookups
+and store/lookup forwards await their downstream hops instead of holding a
+worker thread, so one process can keep many recursive lookups in flight.
+Blocking maintenance work (join, depart, stabilization, key transfer) runs in
+threads via asyncio.to_thread.
+
+Start it with SERVER_MODE=async python3 api.py, or python3 async_api.py.
+"""
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import aiohttp
+from aiohttp import web
+
+from async_node import AsyncChordNode
+from dispatch import DEPARTED_ROUTES, dispatch
+from metrics import HTTP_LATENCY, HTTP_REQUESTS, REGISTRY, node_gauges
+from scan import SCAN_MAX_NODES, page, scan_request, slice_params
+from scheduler import MAINTENANCE_POLL
+from vnodes import VirtualNodeHost
+import wire
+import workers
+from node import TRANSFER_CHUNK_SIZE, READ_QUORUM, WRITE_QUORUM, STATUS_DEPARTED
+
+NODE_IP = os.getenv("NODE_IP", "0.0.0.0")
+NODE_PORT = int(os.getenv("NODE_PORT", "5000"))
+M_BITS = int(os.getenv("M_BITS", "10"))
+# Threads for blocking work run via to_thread. Joins and finger updates call
+# back into this process (more so with several vnodes), so the default pool
+# of cpu_count + 4 threads can run dry on small containers.
+BLOCKING_THREADS = int(os.getenv("ASYNC_BLOCKING_THREADS", "32"))
+
+routes = web.RouteTableDef()
+HOST = web.AppKey("host", VirtualNodeHost)
+STABILIZER = web.AppKey("stabilizer", asyncio.Task)
+MAINTAIN = web.AppKey("maintain", bool)  # run stabilization in this process
+WIRE = web.AppKey("wire", wire.WireServer)  # binary RPC listener, None unless WIRE_PROTOCOL
+
+
+def _node(request):
+    """The vnode the request is addressed to (see vnodes.py)."""
+    return request.app[HOST].resolve(request.query.get("vnode"))
+
+
+def _key_id_arg(request):
+    return int(request.query["key_id"])
+
+
+async def peer_route(request, blocking=False):
+    """Answer a node-to-node route with its handler in dispatch.py; blocking
+    handlers (ones that call other nodes or read the store) run in a thread."""
+    body = await request.json() if request.can_read_body else None
+    args = (_node(request), request.path, dict(request.query), body)
+    status, payload = await asyncio.to_thread(dispatch, *args) if blocking else dispatch(*args)
+    return web.json_response(payload, status=status)
+
+
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Count and time every request by its route pattern."""
+    started = time.perf_counter()
+    resource = request.match_info.route.resource
+    route = resource.canonical if resource is not None else "unmatched"
+    status = 500
+    try:
+        resp = await handler(request)
+        status = resp.status
+        return resp
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        HTTP_REQUESTS.inc(route, request.method, status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, route)
+
+
+@web.middleware
+async def cors_middleware(request, handler):
+    """Mirror flask_cors' permissive defaults so the dashboard works in either mode."""
+    if request.method == "OPTIONS":
+        resp = web.Response()
+        resp.headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
+        resp.headers["Access-Control-Allow-Headers"] = request.headers.get(
+            "Access-Control-Request-Headers", "*")
+    else:
+        resp = await handler(request)
+    resp.headers["Access-Control-Allow-Origin"] = "*"
+    return resp
+
+
+@web.middleware
+async def departed_middleware(request, handler):
+    """Tell callers that a vnode has left so they route around it (it may
+    share its process with vnodes that are still on the ring)."""
+    node = _node(request)
+    if request.path not in DEPARTED_ROUTES and node.successor is None:
+        return web.json_response({
+            "status": "error",
+            "message": f"Node {node.node_id} has left the ring",
+            "node_id": node.node_id
+        }, status=STATUS_DEPARTED)
+    return await handler(request)
+
+
+async def stabilization_task(app):
+    host = app[HOST]
+    await asyncio.to_thread(host.join_siblings)
+    while True:
+        delays = [await asyncio.to_thread(node.maintenance.run_due) for node in host]
+        await asyncio.sleep(min(delays + [MAINTENANCE_POLL]))
+
+
+@routes.get('/health')
+async def health_check(request):
+    return await peer_route(request)
+
+
+@routes.get('/node_info')
+async def get_node_info(request):
+    return await peer_route(request)
+
+
+@routes.get('/successor')
+async def get_successor(request):
+    return await peer_route(request)
+
+
+@routes.get('/successor_list')
+async def get_successor_list(request):
+    return await peer_route(request)
+
+
+@routes.get('/get_predecessor')
+async def get_predecessor(request):
+    return await peer_route(request)
+
+
+@routes.post('/notify')
+async def notify(request):
+    return await peer_route(request)
+
+
+@routes.get('/closest_preceding_finger')
+async def closest_preceding_finger(request):
+    return await peer_route(request)
+
+
+@routes.get('/find_successor')
+async def find_successor(request):
+    node = _node(request)
+    if request.query.get("mode") == "iterative":
+        successor = await node.find_successor_iterative_async(_key_id_arg(request))
+    else:
+        hops = request.query.get("hops", "0")
+        successor = await node.find_successor_async(_key_id_arg(request), int(hops) if hops.isdigit() else 0)
+    return web.json_response(successor)
+
+
+@routes.get('/find_predecessor')
+async def find_predecessor(request):
+    predecessor = await _node(request).find_predecessor_async(_key_id_arg(request))
+    return web.json_response(predecessor)
+
+
+@routes.post('/set_successor')
+async def set_successor(request):
+    return await peer_route(request)
+
+
+@routes.post('/update_finger_table')
+async def update_finger_table(request):
+    # May propagate to our predecessor, which is a blocking call.
+    return await peer_route(request, blocking=True)
+
+
+@routes.post('/transfer_keys')
+async def transfer_keys(request):
+    return await peer_route(request, blocking=True)
+
+
+@routes.post('/transfer_keys_stream')
+async def transfer_keys_stream(request):
+    """Stream the keys for a new predecessor as newline-delimited JSON chunks."""
+    node = _node(request)
+    data = await request.json()
+    resp = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+    await resp.prepare(request)
+    chunks = node.transfer_chunks(data.get("node_id"), data.get("lower_bound"), data.get("cursor"),
+                                  data.get("chunk_size", TRANSFER_CHUNK_SIZE))
+    for chunk in chunks:
+        # write() waits while the receiver's window is full, which paces the sender
+        await resp.write((json.dumps(chunk) + "\n").encode())
+    await resp.write((json.dumps({"done": True}) + "\n").encode())
+    await resp.write_eof()
+    return resp
+
+
+@routes.post('/transfer_ack')
+async def transfer_ack(request):
+    return await peer_route(request)
+
+
+async def forward_to_owner(node, key_id, call):
+    """Await call(owner) for the owner of key_id, re-resolving once if the
+    owner cannot be reached."""
+    owner = await node.find_successor_async(key_id)
+    try:
+        status, body = await call(owner)
+        if status != STATUS_DEPARTED:
+            return status, body
+    except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+        pass
+    node.peer_failed(owner)
+    return await call(await node.find_successor_async(key_id))
+
+
+@routes.post('/store/{key}')
+async def store_key(request):
+    node = _node(request)
+    key = request.match_info["key"]
+    value = (await request.read()).decode()
+    forwarded = request.query.get("forwarded", "0") == "1"
+    w = node.quorum(request.query.get("w"), WRITE_QUORUM)
+    key_id = node.hash_key(key)
+    if forwarded or node.is_responsible(key_id):
+        acks = await store_owned(node, {key: value}, w)
+        if acks < w:
+            return web.json_response({
+                "status": "error",
+                "message": f"Write quorum not met for key '{key}' ({acks}/{w} copies)",
+                "node_id": node.node_id,
+                "replicas": acks,
+                "path": [node.node_id]
+            }, status=500)
+        return web.json_response({
+            "status": "success",
+            "message": f"Key '{key}' stored at node {node.node_id}",
+            "node_id": node.node_id,
+            "replicas": acks,
+            "path": [node.node_id]
+        })
+
+    node.invalidate_cached([key])
+    try:
+        status, resp_data = await forward_to_owner(node, key_id, lambda owner: node.arpc.post(
+            owner, f"/store/{key}", data=value.encode(), params={"forwarded": 1, "w": w}, kind="lookup"))
+        resp_data.setdefault("path", []).append(node.node_id)
+        return web.json_response(resp_data, status=status)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return web.json_response({
+            "status": "error",
+            "message": f"Failed to store key: {str(e)}",
+            "node_id": node.node_id
+        }, status=500)
+
+
+async def store_owned(node, items, w):
+    """ChordNode.store_owned, off the loop when it has to wait for replicas."""
+    if w > 1:
+        return await asyncio.to_thread(node.store_owned, items, w)
+    return node.store_owned(items, w)
+
+
+async def lookup_iterative(node, key, key_id, params):
+    """Ask the (possibly cached) owner for key, retrying uncached if it rejects
+    the key or cannot be reached."""
+    owner = await node.find_successor_iterative_async(key_id)
+    params = dict(params, check=1)
+    try:
+        status, body = await node.arpc.get(owner, f"/lookup/{key}", params=params)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        status = 409
+    if status in (409, STATUS_DEPARTED):
+        node.route_cache.invalidate(owner["node_id"])
+        owner = await node.find_successor_iterative_async(key_id, use_cache=False)
+        status, body = await node.arpc.get(owner, f"/lookup/{key}", params=params)
+    return status, body
+
+
+@routes.get('/lookup/{key}')
+async def lookup_key(request):
+    node = _node(request)
+    key = request.match_info["key"]
+    forwarded = request.query.get("forwarded", "0") == "1"
+    r = node.quorum(request.query.get("r"), READ_QUORUM)
+    key_id = node.hash_key(key)
+
+    if forwarded and request.query.get("check", "0") == "1" and not node.is_responsible(key_id):
+        return web.json_response({
+            "status": "error",
+            "message": f"Node {node.node_id} is not responsible for key '{key}'",
+            "node_id": node.node_id,
+            "path": [node.node_id]
+        }, status=409)
+
+    if forwarded or node.is_responsible(key_id):
+        reader = request.query.get("reader")
+        if reader:
+            # Registered before the read so a write after it invalidates the reader's copy
+            node.cache_readers.add(key, reader)
+        if r > 1:
+            value, version, copies = await asyncio.to_thread(node.quorum_read, key, r)
+        else:
+            value, version, copies = node.quorum_read(key, r)
+        if copies < r:
+            return web.json_response({
+                "status": "error",
+                "message": f"Read quorum not met for key '{key}' ({copies}/{r} copies)",
+                "node_id": node.node_id,
+                "path": [node.node_id]
+            }, status=503)
+        if value is None:
+            return web.json_response({
+                "status": "error",
+                "message": f"Key '{key}' not found",
+                "node_id": node.node_id,
+                "path": [node.node_id]
+            }, status=404)
+        return web.json_response({
+            "status": "success",
+            "key": key,
+            "value": value,
+            "version": version,
+            "node_id": node.node_id,
+            "path": [node.node_id]
+        })
+
+    # Single-copy reads of other nodes' keys may be answered from the read cache
+    cache = node.read_cache if r == 1 else None
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return web.json_response({
+                "status": "success",
+                "key": key,
+                "value": cached[0],
+                "version": cached[1],
+                "node_id": node.node_id,
+                "cached": True,
+                "path": [node.node_id]
+            })
+    params = {"forwarded": 1, "r": r}
+    if cache is not None:
+        params["reader"] = node.address()
+    try:
+        if request.query.get("mode") == "iterative":
+            status, resp_data = await lookup_iterative(node, key, key_id, params)
+        else:
+            status, resp_data = await forward_to_owner(node, key_id, lambda owner: node.arpc.get(
+                owner, f"/lookup/{key}", params=params, kind="lookup"))
+        if cache is not None and status == 200:
+            cache.put(key, resp_data["value"], resp_data["version"])
+        resp_data.setdefault("path", []).append(node.node_id)
+        return web.json_response(resp_data, status=status)
+    except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+        return web.json_response({
+            "status": "error",
+            "message": f"Failed to lookup key: {str(e)}",
+            "node_id": node.node_id
+        }, status=500)
+
+
+async def fan_out(groups, send):
+    """Await send(owner, keys) once per destination node, concurrently.
+    Returns (owner, keys, response JSON or exception) for each group."""
+    groups = list(groups.values())
+    results = await asyncio.gather(*(send(owner, keys) for owner, keys in groups),
+                                   return_exceptions=True)
+    return [(owner, keys, result) for (owner, keys), result in zip(groups, results)]
+
+
+@routes.post('/store_batch')
+async def store_batch(request):
+    node = _node(request)
+    items = (await request.json()).get("items", {})
+    w = node.quorum(request.query.get("w"), WRITE_QUORUM)
+    if request.query.get("forwarded", "0") == "1":
+        if await store_owned(node, items, w) < w:
+            return web.json_response({"status": "error", "node_id": node.node_id, "stored": 0,
+                                      "message": "Write quorum not met"}, status=500)
+        return web.json_response({"status": "success", "node_id": node.node_id, "stored": len(items)})
+
+    async def send(owner, keys):
+        if owner["node_id"] == node.node_id:
+            if await store_owned(node, {k: items[k] for k in keys}, w) < w:
+                raise RuntimeError("Write quorum not met")
+            return {"stored": len(keys)}
+        status, body = await node.arpc.post(owner, "/store_batch", json={"items": {k: items[k] for k in keys}},
+                                            params={"forwarded": 1, "w": w}, kind="lookup")
+        if status != 200:
+            raise aiohttp.ClientError(f"store_batch to {owner['node_id']} returned {status}")
+        return body
+
+    nodes = {}
+    failed = []
+    node.invalidate_cached(items)
+    for owner, keys, result in await fan_out(await node.group_by_owner_async(items), send):
+        if isinstance(result, Exception):
+            failed.extend(keys)
+        else:
+            nodes[owner["node_id"]] = result["stored"]
+    return web.json_response({
+        "status": "error" if failed else "success",
+        "node_id": node.node_id,
+        "stored": sum(nodes.values()),
+        "nodes": nodes,
+        "failed": failed
+    }, status=500 if failed else 200)
+
+
+@routes.post('/invalidate')
+async def invalidate(request):
+    """Drop keys an owner has overwritten from this process's read cache."""
+    return await peer_route(request)
+
+
+@routes.post('/replicate')
+async def replicate(request):
+    return await peer_route(request)
+
+
+@routes.get('/replica_read/{key}')
+async def replica_read(request):
+    return await peer_route(request)
+
+
+@routes.post('/lookup_batch')
+async def lookup_batch(request):
+    node = _node(request)
+    keys = (await request.json()).get("keys", [])
+    if request.query.get("forwarded", "0") == "1":
+        values = {k: node.get_data(k) for k in keys}
+        return web.json_response({"node_id": node.node_id,
+                                  "values": {k: v for k, v in values.items() if v is not None}})
+
+    async def send(owner, owner_keys):
+        if owner["node_id"] == node.node_id:
+            return {"values": {k: v for k in owner_keys if (v := node.get_data(k)) is not None}}
+        status, body = await node.arpc.post(owner, "/lookup_batch", json={"keys": owner_keys},
+                                            params={"forwarded": 1}, kind="lookup")
+        if status != 200:
+            raise aiohttp.ClientError(f"lookup_batch to {owner['node_id']} returned {status}")
+        return body
+
+    values = {}
+    nodes = {}
+    failed = []
+    for owner, owner_keys, result in await fan_out(await node.group_by_owner_async(keys), send):
+        if isinstance(result, Exception):
+            failed.extend(owner_keys)
+        else:
+            values.update(result["values"])
+            nodes[owner["node_id"]] = owner_keys
+    return web.json_response({
+        "status": "error" if failed else "success",
+        "node_id": node.node_id,
+        "values": values,
+        "missing": [k for k in keys if k not in values and k not in failed],
+        "nodes": nodes,
+        "failed": failed
+    }, status=500 if failed else 200)
+
+
+@routes.post('/join')
+async def join(request):
+    node = _node(request)
+    bootstrap_address = (await request.read()).decode().strip()
+    result = await asyncio.to_thread(request.app[HOST].join, bootstrap_address or None)
+    if result:
+        return web.json_response({
+            "status": "success",
+            "message": f"Node {node.node_id} joined the network",
+            "node_id": node.node_id,
+            "successor": node.successor,
+            "predecessor": node.predecessor,
+            "vnodes": sorted(request.app[HOST].vnodes)
+        })
+    return web.json_response({
+        "status": "error",
+        "message": request.app[HOST].join_error or "Failed to join network",
+        "node_id": node.node_id
+    }, status=500)
+
+
+@routes.post('/depart')
+async def depart_node(request):
+    node = _node(request)
+    node_id = node.node_id
+    if await asyncio.to_thread(request.app[HOST].depart):
+        return web.json_response({"status": "success", "message": f"Node {node_id} departed."})
+    return web.json_response({"status": "error", "message": "Node departure failed."}, status=500)
+
+
+@routes.post('/update_successor')
+async def update_successor(request):
+    return await peer_route(request)
+
+
+@routes.post('/update_predecessor')
+async def update_predecessor(request):
+    return await peer_route(request)
+
+
+@routes.post('/receive_keys')
+async def receive_keys(request):
+    return await peer_route(request)
+
+
+@routes.get('/finger_table')
+async def get_finger_table(request):
+    return await peer_route(request)
+
+
+@routes.get('/maintenance')
+async def get_maintenance(request):
+    node = _node(request)
+    return web.json_response({"node_id": node.node_id, **node.maintenance.stats()})
+
+
+@routes.get('/metrics')
+async def get_metrics(request):
+    """Prometheus text exposition of this process's metrics (metrics.py)."""
+    text = await asyncio.to_thread(REGISTRY.render, node_gauges(request.app[HOST]))
+    return web.Response(body=text.encode(), headers={"Content-Type": "text/plain; version=0.0.4"})
+
+
+@routes.get('/scan')
+async def scan(request):
+    """Page through every stored key in ring-ID order (see scan.py and
+    api.scan). Owners read their slice off the loop."""
+    if request.query.get("forwarded", "0") == "1":
+        # Another node's scan reading this node's slice
+        return await peer_route(request, blocking=True)
+
+    node = _node(request)
+    try:
+        state, position, limit = scan_request(request.query, node.m)
+    except ValueError as e:
+        return web.json_response({"status": "error", "message": str(e), "node_id": node.node_id}, status=400)
+    entries = []
+    nodes = []
+    while position is not None and len(entries) < limit and len(nodes) < SCAN_MAX_NODES:
+        owner = await node.find_successor_async(position["from"])
+        target = node if owner["node_id"] == node.node_id else node.sibling(owner)
+        try:
+            if target is not None and target.is_responsible(position["from"]):
+                part, following = await asyncio.to_thread(
+                    target.scan_owned, position["from"], position["after"], limit - len(entries),
+                    state["prefix"], state["end"], state["values"])
+            else:
+                status, body = await node.arpc.get(owner, "/scan", kind="transfer",
+                                                   params=slice_params(state, position, limit - len(entries)))
+                if status != 200:
+                    raise ValueError(f"status {status}")
+                part, following = body["entries"], body["next"]
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            # Routing is catching up with a join or failure; the token resumes from here
+            return web.json_response(page(node, state, position, entries, nodes,
+                                          f"Scan stopped at {owner['node_id']}: {e}"),
+                                     status=200 if entries else 503)
+        entries.extend(part)
+        nodes.append(owner["node_id"])
+        position = following
+    return web.json_response(page(node, state, position, entries, nodes))
+
+
+@routes.get('/data_store')
+async def get_data_store(request):
+    node = _node(request)
+    return web.json_response({
+        "node_id": node.node_id,
+        "data_count": len(node.data_store),
+        "data": node.data_store.to_dict()
+    })
+
+
+@routes.get('/network_state')
+async def get_network_state(request):
+    """Return the current state of all reachable nodes in the network (see api.py)."""
+    node = _node(request)
+    since = request.query.get("since", "")
+    since = int(since) if since.isdigit() else None
+    fresh = request.query.get("fresh", "").lower() in ("1", "true")
+    state = await asyncio.to_thread(node.snapshots.view, since, fresh)
+    return web.json_response(state)
+
+
+async def _on_startup(app):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=BLOCKING_THREADS))
+    await app[HOST].primary.arpc.start()
+    if app[MAINTAIN]:
+        app[STABILIZER] = asyncio.create_task(stabilization_task(app))
+        app[WIRE] = wire.start_server(app[HOST], dispatch, NODE_PORT)
+
+
+async def _on_cleanup(app):
+    if app[MAINTAIN]:
+        app[STABILIZER].cancel()
+        if app[WIRE] is not None:
+            app[WIRE].close()
+    await app[HOST].primary.arpc.close()
+    app[HOST].primary.rpc.close()
+
+
+def make_app(host, maintain=True):
+    app = web.Application(middlewares=[metrics_middleware, cors_middleware, departed_middleware])
+    app[HOST] = host
+    app[MAINTAIN] = maintain
+    app.add_routes(routes)
+    app.on_startup.append(_on_startup)
+    app.on_cleanup.append(_on_cleanup)
+    return app
+
+
+def main():
+    host = VirtualNodeHost(ip=NODE_IP, port=NODE_PORT, m=M_BITS, node_class=AsyncChordNode)
+    if workers.WORKERS > 1:
+        # One event loop per worker process; worker 0 runs stabilization
+        workers.serve(host, lambda sock, index: web.run_app(make_app(host, maintain=index == 0),
+                                                            sock=sock, print=None), NODE_PORT)
+        return
+    web.run_app(make_app(host), host="0.0.0.0", port=NODE_PORT, print=None)
+
+
+if __name__ == "__main__":
+    main()
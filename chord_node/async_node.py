@@ -0,0 +1,238 @@
+import asyncio
+import time
+
+import aiohttp
+import requests
+
+from metrics import FIND_SUCCESSOR_LATENCY, LOOKUP_COALESCED, LOOKUP_HOPS, RPC_ERRORS, RPC_LATENCY
+from node import ChordNode, STATUS_DEPARTED
+from rpc import TIMEOUTS, POOL_MAXSIZE, RTT_KINDS, RttTable, peer_address, peer_params
+
+
+class AsyncPeerClient:
+    """Non-blocking counterpart of rpc.PeerClient built on one aiohttp session.
+
+    aiohttp pools keep-alive connections per host inside its connector, so a
+    single session serves every peer. It must be started from inside the
+    running event loop. Calls to peers that the shared wire client is
+    already connected to go over the wire (opening a connection blocks, so
+    that is left to the synchronous maintenance calls).
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, limit=1000, timeouts=None, rtt=None, wire=None):
+        self.pool_maxsize = pool_maxsize
+        self.rtt = rtt if rtt is not None else RttTable()
+        self.wire = wire
+        self.limit = limit
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self._session = None
+
+    async def start(self):
+        connector = aiohttp.TCPConnector(limit=self.limit, limit_per_host=self.pool_maxsize)
+        self._session = aiohttp.ClientSession(connector=connector)
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def request(self, method, peer, path, kind="routing", **kwargs):
+        """Issue a call and return (status, decoded JSON body)."""
+        connect, read = self.timeouts[kind]
+        timeout = aiohttp.ClientTimeout(sock_connect=connect, sock_read=read)
+        address = peer_address(peer)
+        url = f"http://{address}{path}"
+        kwargs["params"] = peer_params(peer, kwargs.get("params"))
+        started = time.perf_counter()
+        try:
+            future = None
+            if self.wire is not None and kwargs.get("data") is None:
+                future = self.wire.submit(peer, path, kwargs["params"], kwargs.get("json"), connect=False)
+            if future is not None:
+                try:
+                    result = await asyncio.wait_for(asyncio.wrap_future(future), read)
+                except requests.ConnectionError as e:
+                    raise aiohttp.ClientConnectionError(str(e))
+            else:
+                async with self._session.request(method, url, timeout=timeout, **kwargs) as resp:
+                    result = resp.status, await resp.json(content_type=None)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            RPC_ERRORS.inc(address, kind)
+            raise
+        elapsed = time.perf_counter() - started
+        RPC_LATENCY.observe(elapsed, address, kind)
+        if kind in RTT_KINDS:
+            self.rtt.observe(address, elapsed)
+        return result
+
+    async def get(self, peer, path, params=None, kind="routing"):
+        return await self.request("GET", peer, path, kind=kind, params=params)
+
+    async def post(self, peer, path, json=None, data=None, params=None, kind="maintenance"):
+        return await self.request("POST", peer, path, kind=kind, json=json, data=data, params=params)
+
+
+class AsyncChordNode(ChordNode):
+    """ChordNode whose lookup path runs as coroutines.
+
+    Routing decisions are the same as ChordNode's; only the outbound hops are
+    awaited instead of blocking a thread. Maintenance (join, stabilize,
+    fix_fingers, transfers) keeps using the synchronous methods and is run in
+    worker threads by async_api.
+    """
+
+    def __init__(self, ip, port, m=160, vnode=0, primary=None):
+        super().__init__(ip, port, m, vnode, primary)
+        self.arpc = primary.arpc if primary is not None else AsyncPeerClient(rtt=self.rpc.rtt, wire=self.rpc.wire)
+        self._async_flights = {}  # next hop's ID -> Future of (key_id, successor) for the lookup in flight
+
+    async def find_successor_async(self, key_id, hops=0):
+        """Find the successor node for a key_id without blocking the loop."""
+        started = time.perf_counter()
+        try:
+            return await self._find_successor_async(key_id, hops)
+        finally:
+            FIND_SUCCESSOR_LATENCY.observe(time.perf_counter() - started, "recursive")
+
+    async def _find_successor_async(self, key_id, hops):
+        successor, n_prime = self.next_hop(key_id)
+        if successor is not None:
+            LOOKUP_HOPS.observe(hops, "recursive")
+            return successor
+        sibling = self.sibling(n_prime)
+        if sibling is not None and sibling is not self:
+            # Another virtual node of this process: no need to go over HTTP
+            return await sibling._find_successor_async(key_id, hops + 1)
+        if self.lookup_cache is None:
+            return await self._forward_lookup_async(key_id, hops) or self.successor  # Fallback
+
+        cached = self.cached_successor(key_id, hops)
+        if cached is not None:
+            return cached
+        hop = n_prime["node_id"]
+        flight = self._async_flights.get(hop)
+        if flight is not None:
+            lead_key, successor = await asyncio.shield(flight)
+            if self.settles(lead_key, successor, key_id):
+                LOOKUP_COALESCED.inc("shared")
+                return successor
+            # The query in flight was for a key further along; ask for ours
+            return await self._forward_lookup_async(key_id, hops) or self.successor
+        flight = self._async_flights[hop] = asyncio.get_running_loop().create_future()
+        successor = None
+        try:
+            successor = await self._forward_lookup_async(key_id, hops)
+        finally:
+            del self._async_flights[hop]
+            flight.set_result((key_id, successor))  # waiters on a failed or cancelled lookup ask again
+        if successor is not None:
+            self.remember_successor(key_id, successor)
+        return successor or self.successor  # Fallback
+
+    async def _forward_lookup_async(self, key_id, hops):
+        """Coroutine version of ChordNode._forward_lookup."""
+        for attempt in range(self.successor_list_size + 1):
+            successor, n_prime = self.next_hop(key_id)
+            if successor is not None:
+                LOOKUP_HOPS.observe(hops, "recursive")
+                return successor
+
+            sibling = self.sibling(n_prime)
+            if sibling is not None and sibling is not self:
+                return await sibling._forward_lookup_async(key_id, hops + 1)
+            try:
+                status, body = await self.arpc.get(n_prime, "/find_successor",
+                                                   params={"key_id": key_id, "hops": hops + 1}, kind="lookup")
+                if status == 200:
+                    return body
+                if status == STATUS_DEPARTED:
+                    self.peer_failed(n_prime)
+                    continue
+                break
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                self.peer_failed(n_prime)
+            except aiohttp.ClientError:
+                break
+        return None
+
+    async def find_successor_iterative_async(self, key_id, use_cache=True):
+        """Coroutine version of ChordNode.find_successor_iterative."""
+        if use_cache:
+            cached = self.route_cache.get(key_id)
+            if cached is not None:
+                return cached
+
+        started = time.perf_counter()
+        hops = 0
+        steps = self.iterative_steps(key_id)
+        reply = None
+        try:
+            while True:
+                peer, params = steps.send(reply)
+                hops += 1
+                try:
+                    status, body = await self.arpc.get(peer, "/closest_preceding_finger", params=params)
+                    reply = body if status == 200 else None
+                    if status == STATUS_DEPARTED:
+                        self.peer_failed(peer)
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    self.peer_failed(peer)
+                    reply = None
+                except aiohttp.ClientError:
+                    reply = None
+        except StopIteration as done:
+            LOOKUP_HOPS.observe(hops, "iterative")
+            FIND_SUCCESSOR_LATENCY.observe(time.perf_counter() - started, "iterative")
+            return done.value
+
+    async def group_by_owner_async(self, keys):
+        """Coroutine version of ChordNode.group_by_owner."""
+        groups = {}
+        owner = None
+        run_start = None
+        for key_id, key in sorted(zip(self.hash_keys(keys), keys)):
+            if owner is None or not self.in_interval(key_id, run_start, owner["node_id"],
+                                                     inclusive_left=True, inclusive_right=True):
+                run_start = key_id
+                if self.is_responsible(key_id):
+                    owner = self.as_dict()
+                else:
+                    owner = await self.find_successor_async(key_id)
+            groups.setdefault(owner["node_id"], (owner, []))[1].append(key)
+        return groups
+
+    async def find_predecessor_async(self, key_id):
+        """Find the predecessor node for a key_id without blocking the loop."""
+        me = self.as_dict()
+        if self.successor["node_id"] == self.node_id:
+            return me
+        if self.in_interval(key_id, self.node_id, self.successor["node_id"], inclusive_right=True):
+            return me
+
+        n_prime = me
+        n_succ = self.successor
+        while not self.in_interval(key_id, n_prime["node_id"], n_succ["node_id"], inclusive_right=True):
+            if n_prime["node_id"] == self.node_id:
+                n_prime = self.closest_preceding_finger(key_id)
+                if n_prime["node_id"] == self.node_id:
+                    return me
+            else:
+                try:
+                    status, body = await self.arpc.get(n_prime, "/closest_preceding_finger",
+                                                       params={"key_id": key_id})
+                except (aiohttp.ClientError, asyncio.TimeoutError):
+                    return me
+                if status != 200:
+                    return me
+                n_prime = body
+
+            try:
+                status, body = await self.arpc.get(n_prime, "/successor", kind="ping")
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                return n_prime
+            if status != 200:
+                return n_prime
+            n_succ = body
+        return n_prime
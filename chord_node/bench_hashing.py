@@ -0,0 +1,45 @@
+"""Micro-benchmark of ring hashing: the old hex-parsing hash against RingHasher.
+
+Usage: python bench_hashing.py [m] [keys]
+"""
+import hashlib
+import sys
+import timeit
+
+from hashing import RingHasher
+
+
+def legacy_hash_key(key, m):
+    """ChordNode.hash_key before hashing.py."""
+    h = hashlib.sha1(key.encode()).hexdigest()
+    return int(h, 16) % (2**m)
+
+
+def report(name, seconds, count, baseline=None):
+    per_key = seconds / count * 1e9
+    speedup = f"  x{baseline / seconds:.2f}" if baseline else ""
+    print(f"{name:<32} {per_key:8.0f} ns/key{speedup}")
+    return seconds
+
+
+def main():
+    m = int(sys.argv[1]) if len(sys.argv) > 1 else 160
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    keys = [f"key{i}" for i in range(count)]
+    hot = keys[:100] * (count // 100)
+    hasher = RingHasher(m)
+    assert [legacy_hash_key(k, m) for k in keys[:1000]] == hasher.key_ids(keys[:1000])
+
+    def best(fn):
+        return min(timeit.repeat(fn, number=1, repeat=5))
+
+    print(f"m={m}, {count} keys")
+    base = report("legacy hash_key", best(lambda: [legacy_hash_key(k, m) for k in keys]), count)
+    report("RingHasher.digest_id", best(lambda: [hasher.digest_id(k) for k in keys]), count, base)
+    report("RingHasher.key_ids (batch)", best(lambda: hasher.key_ids(keys)), count, base)
+    hot_base = report("legacy hash_key, 100 hot keys", best(lambda: [legacy_hash_key(k, m) for k in hot]), len(hot))
+    report("RingHasher.key_id, 100 hot keys", best(lambda: [hasher.key_id(k) for k in hot]), len(hot), hot_base)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+"""Store/lookup load generator and benchmark for a Chord ring.
+
+Drives either a running ring over HTTP (--target http --nodes ip:port,...),
+a ring of local api.py processes it starts itself (--target http --spawn N)
+or an in-process ring (--target sim, see simulator.py) with a number of
+client threads. Keys are drawn uniformly or from a Zipf distribution, with
+a configurable read/write mix and value size. Reports throughput, latency
+percentiles and lookup hop counts (from the chord_lookup_hops histogram of
+/metrics, so they include maintenance lookups made during the run), writes
+them as JSON and can compare them against an earlier result.
+
+Usage: python benchmark.py --target sim --nodes 200 --duration 10 --output run.json
+       python benchmark.py --spawn 5 --concurrency 16 --compare run.json
+"""
+import argparse
+import bisect
+import itertools
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from metrics import METRICS_FLUSH_INTERVAL, REGISTRY
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+class KeyChooser:
+    """Key indexes in [0, keys), uniform or Zipf(s) with key 0 the hottest."""
+
+    def __init__(self, keys, zipf=0.0):
+        self.keys = keys
+        self.cumulative = None
+        if zipf:
+            self.cumulative = list(itertools.accumulate(1 / (rank ** zipf) for rank in range(1, keys + 1)))
+
+    def __call__(self, rng):
+        if self.cumulative is None:
+            return rng.randrange(self.keys)
+        return bisect.bisect_left(self.cumulative, rng.random() * self.cumulative[-1])
+
+
+class HttpClient:
+    """Client operations against ring nodes over HTTP, one session per thread."""
+
+    def __init__(self, addresses, timeout=30):
+        self.addresses = addresses
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def entry(self, rng):
+        return rng.choice(self.addresses)
+
+    def store(self, entry, key, value):
+        resp = self._session().post(f"http://{entry}/store/{key}", data=value, timeout=self.timeout)
+        return resp.status_code == 200
+
+    def lookup(self, entry, key):
+        resp = self._session().get(f"http://{entry}/lookup/{key}", timeout=self.timeout)
+        return resp.status_code == 200
+
+    def preload(self, items, batch=500):
+        keys = list(items)
+        for i in range(0, len(keys), batch):
+            chunk = {key: items[key] for key in keys[i:i + batch]}
+            resp = self._session().post(f"http://{self.addresses[0]}/store_batch", json={"items": chunk},
+                                        timeout=self.timeout)
+            resp.raise_for_status()
+
+    def metrics(self):
+        # Workers of a node publish their samples every METRICS_FLUSH_INTERVAL
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        texts = []
+        for address in self.addresses:
+            try:
+                texts.append(requests.get(f"http://{address}/metrics", timeout=self.timeout).text)
+            except requests.RequestException as e:
+                print(f"Error reading metrics from {address}: {e}")
+        return texts
+
+
+class SimClient:
+    """Client operations against an in-process ring (simulator.Simulator)."""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self.vnodes = [vnode for _, vnode in sim.ring()]
+
+    def entry(self, rng):
+        return rng.choice(self.vnodes)
+
+    def store(self, entry, key, value):
+        return self.sim.store(entry, key, value) >= 1
+
+    def lookup(self, entry, key):
+        return self.sim.lookup(entry, key)[0] is not None
+
+    def preload(self, items):
+        entry = self.vnodes[0]
+        for key, value in items.items():
+            self.sim.store(entry, key, value)
+
+    def metrics(self):
+        return [REGISTRY.render()]
+
+
+class LocalRing:
+    """Start count api.py processes on consecutive ports and join them into one ring."""
+
+    def __init__(self, count, base_port=5401, m=32, settle=5.0, env=None):
+        self.count = count
+        self.base_port = base_port
+        self.m = m
+        self.settle = settle
+        self.env = env or {}
+        self.procs = []
+        self.addresses = [f"127.0.0.1:{base_port + i}" for i in range(count)]
+
+    def __enter__(self):
+        for i, address in enumerate(self.addresses):
+            env = dict(os.environ, NODE_IP="127.0.0.1", NODE_PORT=str(self.base_port + i), M_BITS=str(self.m),
+                       **self.env)
+            self.procs.append(subprocess.Popen([sys.executable, "api.py"], cwd=HERE, env=env,
+                                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+        for address in self.addresses:
+            for _ in range(100):
+                try:
+                    requests.get(f"http://{address}/health", timeout=1)
+                    break
+                except requests.RequestException:
+                    time.sleep(0.2)
+            else:
+                raise RuntimeError(f"{address} did not start")
+        for address in self.addresses[1:]:
+            requests.post(f"http://{address}/join", data=self.addresses[0], timeout=60).raise_for_status()
+        time.sleep(self.settle)
+        return self
+
+    def __exit__(self, *exc):
+        for proc in self.procs:
+            proc.terminate()
+        for proc in self.procs:
+            proc.wait()
+
+
+def hop_counts(texts, mode="recursive"):
+    """Summed chord_lookup_hops histogram of several /metrics scrapes: ({le: cumulative}, count, sum)."""
+    buckets, count, total = {}, 0.0, 0.0
+    label = f'mode="{mode}"'
+    for text in texts:
+        for line in text.splitlines():
+            if not line.startswith("chord_lookup_hops") or label not in line:
+                continue
+            value = float(line.rsplit(" ", 1)[1])
+            if line.startswith("chord_lookup_hops_bucket"):
+                le = line.split('le="', 1)[1].split('"', 1)[0]
+                buckets[le] = buckets.get(le, 0.0) + value
+            elif line.startswith("chord_lookup_hops_count"):
+                count += value
+            elif line.startswith("chord_lookup_hops_sum"):
+                total += value
+    return buckets, count, total
+
+
+def hop_summary(before, after, mode="recursive"):
+    buckets_before, count_before, sum_before = hop_counts(before, mode)
+    buckets_after, count_after, sum_after = hop_counts(after, mode)
+    count = count_after - count_before
+    if count <= 0:
+        return None
+    cumulative = sorted(((float(le), buckets_after[le] - buckets_before.get(le, 0.0)) for le in buckets_after))
+
+    def quantile(q):
+        for bound, seen in cumulative:
+            if seen >= q * count:
+                return bound
+        return float("inf")
+
+    return {"lookups": int(count), "mean": (sum_after - sum_before) / count,
+            "p50": quantile(0.5), "p99": quantile(0.99)}
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def summarize(latencies, errors, elapsed):
+    ordered = sorted(latencies)
+    return {
+        "ops": len(ordered),
+        "errors": errors,
+        "throughput": len(ordered) / elapsed if elapsed else 0.0,
+        "mean_ms": 1000 * sum(ordered) / len(ordered) if ordered else None,
+        "p50_ms": 1000 * percentile(ordered, 50) if ordered else None,
+        "p99_ms": 1000 * percentile(ordered, 99) if ordered else None,
+        "p999_ms": 1000 * percentile(ordered, 99.9) if ordered else None,
+        "max_ms": 1000 * ordered[-1] if ordered else None,
+    }
+
+
+def run_load(client, args):
+    """Run the client threads; returns (per-operation summaries, elapsed seconds)."""
+    choose = KeyChooser(args.keys, args.zipf)
+    value = "x" * args.value_size
+    deadline = time.perf_counter() + args.duration
+    budget = iter(range(args.ops)) if args.ops else None
+    budget_lock = threading.Lock()
+    results = []
+
+    def worker(index):
+        rng = random.Random(args.seed * 1000 + index)
+        latencies = {"store": [], "lookup": []}
+        errors = {"store": 0, "lookup": 0}
+        while True:
+            if budget is not None:
+                with budget_lock:
+                    if next(budget, None) is None:
+                        break
+            elif time.perf_counter() >= deadline:
+                break
+            op = "lookup" if rng.random() < args.read_ratio else "store"
+            key = f"bench-{choose(rng)}"
+            entry = client.entry(rng)
+            started = time.perf_counter()
+            try:
+                ok = client.store(entry, key, value) if op == "store" else client.lookup(entry, key)
+            except Exception as e:
+                ok = False
+                if errors[op] == 0:
+                    print(f"[worker {index}] {op} {key} failed: {e}")
+            latencies[op].append(time.perf_counter() - started)
+            errors[op] += not ok
+        results.append((latencies, errors))
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    summaries = {}
+    for op in ("store", "lookup"):
+        summaries[op] = summarize([t for latencies, _ in results for t in latencies[op]],
+                                  sum(errors[op] for _, errors in results), elapsed)
+    summaries["total"] = summarize([t for latencies, _ in results for op in latencies for t in latencies[op]],
+                                   sum(sum(errors.values()) for _, errors in results), elapsed)
+    return summaries, elapsed
+
+
+def compare(result, baseline, tolerance):
+    """Print the change against a baseline result; returns the regressions found."""
+    regressions = []
+    for op, current in result["results"].items():
+        base = baseline.get("results", {}).get(op)
+        if not base or not base["ops"] or not current["ops"]:
+            continue
+        throughput = current["throughput"] / base["throughput"]
+        p99 = current["p99_ms"] / base["p99_ms"] if base["p99_ms"] else 1.0
+        print(f"  {op:<7} throughput x{throughput:.2f}  p99 x{p99:.2f}")
+        if throughput < 1 - tolerance:
+            regressions.append(f"{op} throughput fell to x{throughput:.2f}")
+        if p99 > 1 + tolerance:
+            regressions.append(f"{op} p99 latency rose to x{p99:.2f}")
+    return regressions
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=HERE, capture_output=True,
+                              text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def benchmark(client, args):
+    items = {f"bench-{i}": "x" * args.value_size for i in range(args.keys)} if args.preload else {}
+    if items:
+        started = time.perf_counter()
+        client.preload(items)
+        print(f"preloaded {len(items)} keys in {time.perf_counter() - started:.1f}s")
+    before = client.metrics()
+    summaries, elapsed = run_load(client, args)
+    after = client.metrics()
+    return {
+        "config": {name: value for name, value in vars(args).items() if name not in ("output", "compare")},
+        "started": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "git": git_revision(),
+        "python": platform.python_version(),
+        "elapsed": elapsed,
+        "results": summaries,
+        "hops": hop_summary(before, after),
+    }
+
+
+def report(result):
+    print(f"{'op':<7} {'ops':>8} {'errors':>6} {'ops/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p99.9 ms':>9} {'max ms':>8}")
+    for op, s in result["results"].items():
+        if not s["ops"]:
+            continue
+        print(f"{op:<7} {s['ops']:>8} {s['errors']:>6} {s['throughput']:>9.1f} {s['p50_ms']:>8.2f} "
+              f"{s['p99_ms']:>8.2f} {s['p999_ms']:>9.2f} {s['max_ms']:>8.2f}")
+    hops = result["hops"]
+    if hops:
+        print(f"lookup hops: mean {hops['mean']:.2f}, p50 <= {hops['p50']:g}, p99 <= {hops['p99']:g} "
+              f"over {hops['lookups']} lookups")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--target", choices=("http", "sim"), default="http")
+    parser.add_argument("--nodes", default="127.0.0.1:5001",
+                        help="http: comma-separated ip:port of ring nodes; sim: number of hosts")
+    parser.add_argument("--spawn", type=int, default=0, help="http: start this many local api.py nodes")
+    parser.add_argument("--base-port", type=int, default=5401, help="first port of spawned nodes")
+    parser.add_argument("--m", type=int, default=32, help="identifier bits of spawned or simulated rings")
+    parser.add_argument("--vnodes", type=int, default=1, help="sim: virtual nodes per host")
+    parser.add_argument("--concurrency", type=int, default=8, help="client threads")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--ops", type=int, default=0, help="stop after this many operations instead")
+    parser.add_argument("--keys", type=int, default=10000, help="size of the key space")
+    parser.add_argument("--zipf", type=float, default=0.0, help="Zipf exponent of key popularity (0: uniform)")
+    parser.add_argument("--read-ratio", type=float, default=0.9, help="fraction of operations that are lookups")
+    parser.add_argument("--value-size", type=int, default=100, help="bytes per value")
+    parser.add_argument("--no-preload", dest="preload", action="store_false", help="do not store every key first")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the result as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON result to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed relative regression")
+    args = parser.parse_args()
+
+    if args.target == "sim":
+        from simulator import Simulator
+        sim = Simulator(m=args.m, vnodes=args.vnodes, seed=args.seed)
+        sim.build(int(args.nodes))
+        result = benchmark(SimClient(sim), args)
+    elif args.spawn:
+        with LocalRing(args.spawn, args.base_port, args.m) as ring:
+            result = benchmark(HttpClient(ring.addresses), args)
+    else:
+        result = benchmark(HttpClient(args.nodes.split(",")), args)
+
+    report(result)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"against {args.compare} ({baseline.get('git')}):")
+        regressions = compare(result, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+READ_CACHE_BYTES = int(os.getenv("READ_CACHE_BYTES", "0"))  # bytes of other nodes' values cached per process; 0 is off
+READ_CACHE_TTL = float(os.getenv("READ_CACHE_TTL", "5"))  # seconds an entry is served without hearing from the owner
+READ_CACHE_READERS = int(os.getenv("READ_CACHE_READERS", "65536"))  # keys whose caching nodes an owner tracks
+
+
+class ReadCache:
+    """Byte-bounded LRU cache of values read from other nodes on behalf of clients.
+
+    Entries expire after ttl seconds. invalidate() is called when the owner
+    reports a newer version of a key; it drops the entry and remembers that
+    version, so a lookup answered before the write but cached after the
+    invalidation arrived is not admitted.
+    """
+
+    def __init__(self, max_bytes=READ_CACHE_BYTES, ttl=READ_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (value, version, expires, size)
+        self._floors = OrderedDict()  # key -> lowest version that may be cached
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _size(key, value):
+        return len(key) + len(value) + 64
+
+    def get(self, key):
+        """Return (value, version) if key is cached and fresh, else None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] < time.monotonic():
+                self._drop(key)
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def put(self, key, value, version):
+        size = self._size(key, value)
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if version < self._floors.get(key, -1):
+                return False
+            self._drop(key)
+            self._entries[key] = (value, version, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, entry = self._entries.popitem(last=False)
+                self._bytes -= entry[3]
+                self.evictions += 1
+            return True
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[3]
+
+    def invalidate(self, key, version=None):
+        """Forget key; with a version, also refuse any older copy of it later."""
+        with self._lock:
+            if key in self._entries:
+                self.invalidations += 1
+            self._drop(key)
+            if version is not None:
+                self._floors[key] = max(version, self._floors.pop(key, -1))
+                if len(self._floors) > 4096:  # only lookups in flight during the write need a floor
+                    self._floors.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+            "expired": self.expired,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
+
+
+class CacheReaders:
+    """Owner-side record of which addresses may hold a key in their ReadCache.
+
+    Bounded to max_keys keys, least recently read first out; a forgotten
+    reader's copy still expires by its TTL.
+    """
+
+    def __init__(self, max_keys=READ_CACHE_READERS):
+        self.max_keys = max_keys
+        self._readers = OrderedDict()  # key -> set of "ip:port"
+        self._lock = threading.Lock()
+
+    def add(self, key, address):
+        with self._lock:
+            readers = self._readers.get(key)
+            if readers is None:
+                readers = self._readers[key] = set()
+                if len(self._readers) > self.max_keys:
+                    self._readers.popitem(last=False)
+            else:
+                self._readers.move_to_end(key)
+            readers.add(address)
+
+    def pop(self, keys):
+        """Forget and return {address: [keys]} for the readers of keys."""
+        by_address = {}
+        with self._lock:
+            for key in keys:
+                for address in self._readers.pop(key, ()):
+                    by_address.setdefault(address, []).append(key)
+        return by_address
+
+    def __len__(self):
+        return len(self._readers)
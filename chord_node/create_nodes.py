@@ -35,7 +35,9 @@ for i in range(START_INDEX, START_INDEX + NUM_NODES_TOTAL):
             f"NODE_IP={container_name}",
             "NODE_PORT=5000",
             f"M_BITS={M_BITS}",
-            "DEBUG_MODE=True"
+            "DEBUG_MODE=True",
+            "STORAGE_BACKEND=log",
+            "DATA_DIR=/data"
         ],
         "ports": [
             f"{port}:5000",
@@ -46,7 +48,7 @@ for i in range(START_INDEX, START_INDEX + NUM_NODES_TOTAL):
                 "aliases": [container_name]
             }
         },
-        "volumes": ["./chord_node:/app"],
+        "volumes": ["./chord_node:/app", f"./data/{node_name}:/data"],
         "command": [
             "sh", "-c",
             f"sleep {5 + i} && python3 -u api.py && curl -X POST -d '{join_target}:5000' http://localhost:5000/join"
@@ -0,0 +1,184 @@
+"""Node-to-node RPC handlers shared by every transport.
+
+The routes a ChordNode calls on its peers, as plain functions of (node,
+params, body) returning (status, payload). api.py and async_api.py serve
+them over HTTP through dispatch(), and the wire protocol (wire.py) and the
+simulator (simulator.py) deliver calls to them without HTTP. Client routes
+(/store, /lookup, batches, /join, /depart) live in the servers.
+/transfer_keys_stream answers with the list of chunks a streaming response
+would carry, one per line; the HTTP servers stream those chunks instead.
+"""
+from node import STATUS_DEPARTED, TRANSFER_CHUNK_SIZE
+from scan import slice_request
+
+# Routes a departed vnode still serves; everything else gets STATUS_DEPARTED
+DEPARTED_ROUTES = {"/join", "/health", "/node_info", "/finger_table", "/maintenance", "/data_store", "/metrics",
+                   "/invalidate"}
+
+ROUTES = {}
+
+
+def route(path):
+    def register(handler):
+        ROUTES[path] = handler
+        return handler
+    return register
+
+
+def dispatch(node, path, params=None, body=None):
+    """Run the handler for path on node; returns (status, payload)."""
+    params = params or {}
+    if path not in DEPARTED_ROUTES and node.successor is None:
+        return STATUS_DEPARTED, {"status": "error", "message": f"Node {node.node_id} has left the ring",
+                                 "node_id": node.node_id}
+    base, _, arg = path[1:].partition("/")
+    handler = ROUTES.get("/" + base)
+    if handler is None:
+        return 404, {"status": "error", "message": f"No route {path}"}
+    if arg:
+        params = dict(params, arg=arg)
+    return handler(node, params, body)
+
+
+@route("/health")
+def health(node, params, body):
+    return 200, {
+        "status": "ok",
+        "node_id": node.node_id,
+        "successor": node.successor["node_id"] if node.successor else None,
+        "predecessor": node.predecessor["node_id"] if node.predecessor else None
+    }
+
+
+@route("/node_info")
+def node_info(node, params, body):
+    return 200, node.info()
+
+
+@route("/successor")
+def successor(node, params, body):
+    return 200, node.successor
+
+
+@route("/successor_list")
+def successor_list(node, params, body):
+    return 200, list(node.successor_list)
+
+
+@route("/get_predecessor")
+def get_predecessor(node, params, body):
+    return 200, node.predecessor
+
+
+@route("/notify")
+def notify(node, params, body):
+    return 200, {"success": node.notify(body)}
+
+
+@route("/closest_preceding_finger")
+def closest_preceding_finger(node, params, body):
+    finger = node.closest_preceding_finger(int(params["key_id"]))
+    if str(params.get("with_successor", "0")) == "1":
+        return 200, {"finger": finger, "successor": node.successor}
+    return 200, finger
+
+
+@route("/find_successor")
+def find_successor(node, params, body):
+    key_id = int(params["key_id"])
+    if params.get("mode") == "iterative":
+        return 200, node.find_successor_iterative(key_id)
+    hops = str(params.get("hops", 0))
+    return 200, node.find_successor(key_id, int(hops) if hops.isdigit() else 0)
+
+
+@route("/find_predecessor")
+def find_predecessor(node, params, body):
+    return 200, node.find_predecessor(int(params["key_id"]))
+
+
+@route("/set_successor")
+def set_successor(node, params, body):
+    node.successor = {"node_id": body.get("node_id"), "ip": body.get("ip"), "port": body.get("port")}
+    return 200, {"message": f"Successor updated to {body.get('node_id')}"}
+
+
+@route("/update_finger_table")
+def update_finger_table(node, params, body):
+    return 200, {"success": node.update_finger_table(body.get("s"), body.get("i"))}
+
+
+@route("/transfer_keys")
+def transfer_keys(node, params, body):
+    return 200, {"keys": node.transfer_keys_to_predecessor(body.get("node_id"), body.get("lower_bound"))}
+
+
+@route("/transfer_keys_stream")
+def transfer_keys_stream(node, params, body):
+    chunks = list(node.transfer_chunks(body.get("node_id"), body.get("lower_bound"), body.get("cursor"),
+                                       body.get("chunk_size", TRANSFER_CHUNK_SIZE)))
+    return 200, chunks + [{"done": True}]
+
+
+@route("/transfer_ack")
+def transfer_ack(node, params, body):
+    keys = body.get("keys", [])
+    node.acknowledge_transfer(keys)
+    return 200, {"status": "success", "acknowledged": len(keys)}
+
+
+@route("/replicate")
+def replicate(node, params, body):
+    items = body.get("items", [])
+    for key, value, version in items:
+        node.store_replica(key, value, version)
+    return 200, {"status": "success", "node_id": node.node_id, "stored": len(items)}
+
+
+@route("/invalidate")
+def invalidate(node, params, body):
+    keys = body.get("keys", [])
+    node.invalidate_cached(keys, body.get("version"))
+    return 200, {"status": "success", "invalidated": len(keys)}
+
+
+@route("/replica_read")
+def replica_read(node, params, body):
+    key = params["arg"]
+    value = node.get_data(key)
+    return 200, {"key": key, "value": value,
+                 "version": node.versions.get(key, 0) if value is not None else -1}
+
+
+@route("/update_successor")
+def update_successor(node, params, body):
+    node.successor = body.get("successor")
+    return 200, {"status": "success"}
+
+
+@route("/update_predecessor")
+def update_predecessor(node, params, body):
+    node.predecessor = body.get("predecessor")
+    return 200, {"status": "success"}
+
+
+@route("/receive_keys")
+def receive_keys(node, params, body):
+    entries = body.get("entries", [])
+    node.store_transferred(entries)
+    return 200, {"status": "received", "count": len(entries)}
+
+
+@route("/scan")
+def scan(node, params, body):
+    from_id, after, limit, prefix, end, values = slice_request(params)
+    if not node.is_responsible(from_id):
+        return 409, {"status": "error", "message": f"Node {node.node_id} is not responsible for ID {from_id}",
+                     "node_id": node.node_id}
+    entries, position = node.scan_owned(from_id, after, limit, prefix, end, values)
+    return 200, {"node_id": node.node_id, "entries": entries, "next": position}
+
+
+@route("/finger_table")
+def finger_table(node, params, body):
+    return 200, {"node_id": node.node_id, "finger_table": node.finger_table.to_list()}
@@ -0,0 +1,120 @@
+from array import array
+
+
+class FingerTable:
+    """Immutable, compact finger table.
+
+    With m = 160 fingers but only a few dozen nodes, most fingers point at
+    the same handful of peers. The table keeps each distinct peer dict once
+    (peers) and, per finger, the index of its peer (slots, an unsigned short
+    array); starts are shared by every table of a node. Changes return a new
+    table, so one can be published inside a Routing snapshot as is.
+
+    closest_preceding scans each distinct peer once, in the order of its
+    highest finger, instead of testing all m entries: every finger of a peer
+    gives the same answer, so runs of identical successors are skipped.
+    Indexing still yields {"start", "successor"} dicts for the API and for
+    older callers.
+    """
+
+    __slots__ = ("node_id", "size", "starts", "slots", "peers", "_scan")
+
+    def __init__(self, node_id, size, starts, slots, peers):
+        self.node_id = node_id
+        self.size = size  # 2**m, the ring size
+        self.starts = starts
+        self.slots = slots
+        self.peers = peers
+        scan = []
+        seen = set()
+        for slot in reversed(slots):
+            if slot not in seen:
+                seen.add(slot)
+                peer = peers[slot]
+                scan.append((peer["node_id"], peer))
+        self._scan = tuple(scan)
+
+    @classmethod
+    def starts_for(cls, node_id, m):
+        size = 1 << m
+        return tuple((node_id + (1 << i)) % size for i in range(m))
+
+    @classmethod
+    def build(cls, node_id, m, successors, starts=None):
+        """Table whose finger i points at successors[i]."""
+        peers = []
+        index = {}
+        slots = array("H")
+        for peer in successors:
+            slot = index.get(peer["node_id"])
+            if slot is None:
+                slot = index[peer["node_id"]] = len(peers)
+                peers.append(peer)
+            slots.append(slot)
+        return cls(node_id, 1 << m, starts or cls.starts_for(node_id, m), slots, tuple(peers))
+
+    @classmethod
+    def decode(cls, node_id, m, data, starts=None):
+        """Inverse of encode()."""
+        return cls(node_id, 1 << m, starts or cls.starts_for(node_id, m),
+                   array("H", data["slots"]), tuple(data["peers"]))
+
+    def encode(self):
+        """JSON-friendly form: the distinct peers and one slot per finger."""
+        return {"peers": list(self.peers), "slots": self.slots.tolist()}
+
+    def __len__(self):
+        return len(self.slots)
+
+    def __getitem__(self, i):
+        return {"start": self.starts[i], "successor": self.peers[self.slots[i]]}
+
+    def __iter__(self):
+        for i in range(len(self.slots)):
+            yield self[i]
+
+    def __eq__(self, other):
+        if not isinstance(other, FingerTable):
+            return NotImplemented
+        return self.successor_ids() == other.successor_ids()
+
+    def to_list(self):
+        return list(self)
+
+    def start(self, i):
+        return self.starts[i]
+
+    def successor(self, i):
+        return self.peers[self.slots[i]]
+
+    def successor_ids(self):
+        ids = [peer["node_id"] for peer in self.peers]
+        return [ids[slot] for slot in self.slots]
+
+    def closest_preceding(self, key_id):
+        """The peer of the highest finger strictly between this node and
+        key_id on the ring, or None if no finger precedes it."""
+        node_id, size = self.node_id, self.size
+        # x is in (node_id, key_id) iff its clockwise distance from node_id
+        # is positive and below key_id's; key_id == node_id spans the ring
+        span = (key_id - node_id) % size or size
+        for peer_id, peer in self._scan:
+            if 0 < (peer_id - node_id) % size < span:
+                return peer
+        return None
+
+    def _rebuild(self, successors):
+        return FingerTable.build(self.node_id, self.size.bit_length() - 1, successors, self.starts)
+
+    def with_finger(self, i, peer):
+        """Copy of the table with finger i pointing at peer."""
+        successors = [self.peers[slot] for slot in self.slots]
+        successors[i] = peer
+        return self._rebuild(successors)
+
+    def replace_peer(self, node_id, peer):
+        """Copy of the table with every finger on node_id moved to peer."""
+        if all(p["node_id"] != node_id for p in self.peers):
+            return self
+        return self._rebuild([peer if self.peers[slot]["node_id"] == node_id else self.peers[slot]
+                              for slot in self.slots])
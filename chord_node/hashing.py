@@ -0,0 +1,35 @@
+import hashlib
+import os
+from functools import lru_cache
+
+HASH_CACHE_SIZE = int(os.getenv("HASH_CACHE_SIZE", "65536"))  # recently hashed keys kept per ring
+
+
+class RingHasher:
+    """SHA-1 ring IDs for a ring of 2**m positions.
+
+    Equivalent to int(sha1(key).hexdigest(), 16) % 2**m, but the digest is
+    converted with int.from_bytes (no hex round trip) and reduced with a
+    precomputed mask. key_id keeps a bounded LRU of recently hashed keys,
+    since the same key is usually hashed again on the next hop, on store
+    and by the key store; key_ids hashes a whole batch without touching
+    the cache, so bulk transfers do not evict the hot keys.
+    """
+
+    def __init__(self, m, cache_size=HASH_CACHE_SIZE):
+        self.m = m
+        self.modulus = 1 << m
+        self.mask = self.modulus - 1
+        self.key_id = lru_cache(maxsize=cache_size)(self.digest_id) if cache_size else self.digest_id
+
+    def digest_id(self, key):
+        """Uncached ring ID of a string key."""
+        return int.from_bytes(hashlib.sha1(key.encode()).digest(), "big") & self.mask
+
+    def key_ids(self, keys):
+        """Ring IDs of many keys, in order."""
+        sha1, from_bytes, mask = hashlib.sha1, int.from_bytes, self.mask
+        return [from_bytes(sha1(key.encode()).digest(), "big") & mask for key in keys]
+
+    def cache_info(self):
+        return self.key_id.cache_info() if hasattr(self.key_id, "cache_info") else None
@@ -0,0 +1,477 @@
+import bisect
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+
+from cache import READ_CACHE_READERS
+from locks import RWLock
+from storage import DATA_DIR, STORAGE_BACKEND, MemoryBackend, open_backend
+
+
+def _ring_id(entry):
+    return entry[0]
+
+
+class KeyStore:
+    """Local key-value store indexed by ring ID.
+
+    Alongside the key -> value dict, every key's ring ID is hashed once at
+    insert time and kept in a list of (key_id, key) pairs sorted by ID. A ring
+    interval (lower, upper] is then two bisects and a slice instead of
+    re-hashing and scanning every key.
+
+    Values live in a storage backend (see storage.py). Backends keep each
+    key's ring ID, so a persistent backend rebuilds this index at startup
+    without re-hashing.
+
+    Request threads, the stabilization thread and key transfers all use the
+    store at once, so every public method holds an RWLock: reads (including
+    whole range and chunk reads) share it, writes take it exclusively. A range
+    read therefore never sees the index half way through an insert, and
+    pop_range removes a range atomically with respect to concurrent stores.
+    """
+
+    def __init__(self, hasher, backend=None):
+        self._hasher = hasher  # hashing.RingHasher of the node's ring
+        self.backend = backend if backend is not None else MemoryBackend()
+        self._ids = dict(self.backend.entries())  # key -> ring ID, cached at insert
+        self._index = sorted((key_id, key) for key, key_id in self._ids.items())  # sorted (key_id, key)
+        self._lock = RWLock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, key):
+        return key in self._ids
+
+    def __iter__(self):
+        with self._lock.read():
+            return iter(list(self._ids))
+
+    def get(self, key, default=None):
+        with self._lock.read():
+            return self.backend.get(key, default)
+
+    def items(self):
+        with self._lock.read():
+            return list(self.backend.items())
+
+    def key_id(self, key):
+        """Ring ID of a stored key, without re-hashing it."""
+        return self._ids[key]
+
+    def _put(self, key, value, key_id=None):
+        if key not in self._ids:
+            if key_id is None:
+                key_id = self._hasher.key_id(key)
+            self._ids[key] = key_id
+            bisect.insort(self._index, (key_id, key))
+        self.backend.put(key, self._ids[key], value)
+
+    def put(self, key, value, key_id=None):
+        with self._lock.write():
+            self._put(key, value, key_id)
+
+    def update(self, mapping):
+        # New keys are hashed in one batch, before taking the lock
+        new = [key for key in mapping if key not in self._ids]
+        key_ids = dict(zip(new, self._hasher.key_ids(new)))
+        with self._lock.write():
+            for key, value in mapping.items():
+                self._put(key, value, key_ids.get(key))
+
+    def delete(self, key):
+        """Remove a key; returns its value or None if it was not stored."""
+        with self._lock.write():
+            if key not in self._ids:
+                return None
+            entry = (self._ids.pop(key), key)
+            del self._index[bisect.bisect_left(self._index, entry)]
+            return self.backend.delete(key)
+
+    def clear(self):
+        with self._lock.write():
+            self.backend.clear()
+            self._ids.clear()
+            self._index.clear()
+
+    def close(self):
+        with self._lock.write():
+            self.backend.close()
+
+    def to_dict(self):
+        with self._lock.read():
+            return dict(self.backend.items())
+
+    def stats(self):
+        return self.backend.stats()
+
+    def _range_slices(self, lower, upper):
+        """Index slices covering the ring interval (lower, upper].
+
+        Matches ChordNode.in_interval: when lower == upper the interval is
+        the whole ring except lower itself.
+        """
+        start = bisect.bisect_right(self._index, lower, key=_ring_id)
+        if lower < upper:
+            return [slice(start, bisect.bisect_right(self._index, upper, key=_ring_id))]
+        if lower == upper:
+            end = bisect.bisect_left(self._index, upper, key=_ring_id)
+        else:
+            end = bisect.bisect_right(self._index, upper, key=_ring_id)
+        return [slice(start, len(self._index)), slice(0, end)]
+
+    def _segments(self, lower, upper):
+        """The ring interval (lower, upper] as linear index segments, in ring
+        order, each given as (first_index, end_index) bounds."""
+        if lower is None:
+            return [(0, len(self._index))]
+        return [(s.start, s.stop) for s in self._range_slices(lower, upper)]
+
+    def chunk_after(self, lower, upper, after=None, limit=500):
+        """Up to limit (key_id, key, value) entries of (lower, upper] that come
+        strictly after the cursor after=(key_id, key) in ring order.
+
+        lower=None selects every stored key. The position is re-found by
+        bisecting on each call, so the store may change between chunks.
+        """
+        with self._lock.read():
+            return self._chunk_after(lower, upper, after, limit)
+
+    def _chunk_after(self, lower, upper, after, limit):
+        segments = self._segments(lower, upper)
+        if after is not None:
+            after = tuple(after)
+            # Only the wrapped interval has two segments; the cursor is in the
+            # second one if its ID is not above lower.
+            if len(segments) == 2 and not after[0] > lower:
+                segments = segments[1:]
+            first, end = segments[0]
+            segments[0] = (max(first, bisect.bisect_right(self._index, after)), end)
+
+        entries = []
+        for first, end in segments:
+            for key_id, key in self._index[first:min(end, first + limit - len(entries))]:
+                entries.append((key_id, key, self.backend.get(key)))
+            if len(entries) >= limit:
+                break
+        return entries
+
+    def iter_chunks(self, lower, upper, chunk_size=500, after=None):
+        """Yield lists of (key_id, key, value) covering (lower, upper] in ring
+        order, fetching one chunk at a time."""
+        while True:
+            chunk = self.chunk_after(lower, upper, after, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1][:2]
+
+    def range_keys(self, lower, upper):
+        """(key_id, key) pairs in (lower, upper], in ring order starting after lower."""
+        with self._lock.read():
+            return [entry for s in self._range_slices(lower, upper) for entry in self._index[s]]
+
+    def copy_range(self, lower, upper):
+        """{key: value} for every key whose ring ID is in (lower, upper]."""
+        with self._lock.read():
+            return {key: self.backend.get(key)
+                    for s in self._range_slices(lower, upper) for _, key in self._index[s]}
+
+    def count_range(self, lower, upper):
+        """Number of stored keys whose ring ID is in (lower, upper]."""
+        with self._lock.read():
+            return sum(s.stop - s.start for s in self._range_slices(lower, upper))
+
+    def pop_range(self, lower, upper):
+        """Remove and return every key whose ring ID is in (lower, upper]."""
+        with self._lock.write():
+            slices = self._range_slices(lower, upper)
+            popped = {}
+            for s in slices:
+                for _, key in self._index[s]:
+                    del self._ids[key]
+                    popped[key] = self.backend.delete(key)
+            # Delete the later slice first so the earlier one's bounds stay valid
+            for s in sorted(slices, key=lambda s: s.start, reverse=True):
+                del self._index[s]
+            return popped
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, key_id TEXT NOT NULL, value TEXT NOT NULL);
+CREATE INDEX IF NOT EXISTS kv_ring ON kv (key_id, key);
+CREATE TABLE IF NOT EXISTS versions (key TEXT PRIMARY KEY, version INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS readers (key TEXT NOT NULL, address TEXT NOT NULL, seen INTEGER NOT NULL,
+                                    PRIMARY KEY (key, address));
+CREATE INDEX IF NOT EXISTS readers_seen ON readers (seen);
+"""
+
+# Ring positions that sort after everything in (lower, upper] start after
+# lower; "key_id <= lower" is 0 for those and 1 for the wrapped part.
+_RING_ORDER = "key_id <= ?, key_id, key"
+
+
+def _hex_id(key_id):
+    """Ring ID as fixed-width hex, so text order is numeric order (SHA-1 IDs
+    fit in 160 bits)."""
+    return format(key_id, "040x")
+
+
+class SqliteKeyStore:
+    """KeyStore kept in a SQLite database.
+
+    Several worker processes of one node open the same file (see workers.py),
+    so every read sees writes made through any of them. It has KeyStore's
+    interface; ring IDs are stored as fixed-width hex, which makes the ring
+    interval queries plain range scans on an index. SQLite's WAL mode lets
+    readers run while one writer commits, in place of KeyStore's RWLock.
+    Replica versions and read-cache readers are kept in the same database
+    (self.versions, self.readers) because they must be shared between the
+    workers too.
+    """
+
+    def __init__(self, path, hasher):
+        self.path = path
+        self._hasher = hasher
+        self._pool = []  # idle connections of this process
+        self._pid = os.getpid()
+        self.versions = VersionTable(self)
+        self.readers = ReaderTable(self)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._db() as db:
+            db.executescript(_SCHEMA)
+
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    @contextmanager
+    def _db(self):
+        """A connection for one call; connections are never carried across a fork."""
+        if self._pid != os.getpid():
+            self._pool, self._pid = [], os.getpid()
+        try:
+            db = self._pool.pop()
+        except IndexError:
+            db = self._connect()
+        try:
+            yield db
+        finally:
+            self._pool.append(db)
+
+    @contextmanager
+    def _write(self):
+        with self._db() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            db.execute("COMMIT")
+
+    def _range_where(self, lower, upper):
+        """SQL condition and parameters for ring IDs in (lower, upper],
+        matching ChordNode.in_interval (lower == upper is the whole ring
+        except lower)."""
+        if lower is None:
+            return "1", []
+        lower, upper = _hex_id(lower), _hex_id(upper)
+        if lower < upper:
+            return "key_id > ? AND key_id <= ?", [lower, upper]
+        if lower == upper:
+            return "key_id != ?", [lower]
+        return "(key_id > ? OR key_id <= ?)", [lower, upper]
+
+    def __len__(self):
+        with self._db() as db:
+            return db.execute("SELECT COUNT(*) FROM kv").fetchone()[0]
+
+    def __contains__(self, key):
+        with self._db() as db:
+            return db.execute("SELECT 1 FROM kv WHERE key = ?", (key,)).fetchone() is not None
+
+    def __iter__(self):
+        with self._db() as db:
+            return iter([key for key, in db.execute("SELECT key FROM kv")])
+
+    def get(self, key, default=None):
+        with self._db() as db:
+            row = db.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def items(self):
+        with self._db() as db:
+            return db.execute("SELECT key, value FROM kv").fetchall()
+
+    def key_id(self, key):
+        with self._db() as db:
+            row = db.execute("SELECT key_id FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return int(row[0], 16)
+
+    def put(self, key, value, key_id=None):
+        self.update({key: value})
+
+    def update(self, mapping):
+        rows = [(key, _hex_id(key_id), value)
+                for (key, value), key_id in zip(mapping.items(), self._hasher.key_ids(mapping))]
+        with self._write() as db:
+            db.executemany("INSERT INTO kv (key, key_id, value) VALUES (?, ?, ?) "
+                           "ON CONFLICT (key) DO UPDATE SET value = excluded.value", rows)
+
+    def delete(self, key):
+        with self._write() as db:
+            row = db.execute("DELETE FROM kv WHERE key = ? RETURNING value", (key,)).fetchone()
+        return row[0] if row else None
+
+    def clear(self):
+        with self._write() as db:
+            db.execute("DELETE FROM kv")
+            db.execute("DELETE FROM versions")
+            db.execute("DELETE FROM readers")
+
+    def close(self):
+        """Close this process's connections; the store reopens them on next use."""
+        pool, self._pool = self._pool, []
+        for db in pool:
+            db.close()
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def stats(self):
+        return {"backend": type(self).__name__, "keys": len(self), "path": self.path}
+
+    def chunk_after(self, lower, upper, after=None, limit=500):
+        """Same as KeyStore.chunk_after."""
+        where, params = self._range_where(lower, upper)
+        pivot = _hex_id(lower) if lower is not None else ""
+        if after is not None:
+            after_id, after_key = _hex_id(after[0]), after[1]
+            where += f" AND ({_RING_ORDER}) > (?, ?, ?)"
+            params += [pivot, after_id <= pivot, after_id, after_key]
+        with self._db() as db:
+            rows = db.execute(f"SELECT key_id, key, value FROM kv WHERE {where} "
+                              f"ORDER BY {_RING_ORDER} LIMIT ?", params + [pivot, limit]).fetchall()
+        return [(int(key_id, 16), key, value) for key_id, key, value in rows]
+
+    def iter_chunks(self, lower, upper, chunk_size=500, after=None):
+        while True:
+            chunk = self.chunk_after(lower, upper, after, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+            after = chunk[-1][:2]
+
+    def range_keys(self, lower, upper):
+        where, params = self._range_where(lower, upper)
+        with self._db() as db:
+            rows = db.execute(f"SELECT key_id, key FROM kv WHERE {where} ORDER BY {_RING_ORDER}",
+                              params + [_hex_id(lower)]).fetchall()
+        return [(int(key_id, 16), key) for key_id, key in rows]
+
+    def copy_range(self, lower, upper):
+        where, params = self._range_where(lower, upper)
+        with self._db() as db:
+            return dict(db.execute(f"SELECT key, value FROM kv WHERE {where}", params).fetchall())
+
+    def count_range(self, lower, upper):
+        where, params = self._range_where(lower, upper)
+        with self._db() as db:
+            return db.execute(f"SELECT COUNT(*) FROM kv WHERE {where}", params).fetchone()[0]
+
+    def pop_range(self, lower, upper):
+        where, params = self._range_where(lower, upper)
+        with self._write() as db:
+            return dict(db.execute(f"DELETE FROM kv WHERE {where} RETURNING key, value", params).fetchall())
+
+
+class VersionTable:
+    """The dict-like slice of ChordNode.versions backed by a SqliteKeyStore."""
+
+    def __init__(self, store):
+        self._store = store
+
+    def get(self, key, default=None):
+        with self._store._db() as db:
+            row = db.execute("SELECT version FROM versions WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    def __setitem__(self, key, version):
+        with self._store._write() as db:
+            db.execute("INSERT OR REPLACE INTO versions (key, version) VALUES (?, ?)", (key, version))
+
+    def pop(self, key, default=None):
+        with self._store._write() as db:
+            row = db.execute("DELETE FROM versions WHERE key = ? RETURNING version", (key,)).fetchone()
+        return row[0] if row else default
+
+
+class ReaderTable:
+    """cache.CacheReaders backed by a SqliteKeyStore, so a reader registered
+    by one worker is invalidated by a write through any other.
+
+    Bounded to about max_entries (key, reader) pairs, least recently read
+    first out; the table is trimmed every TRIM_EVERY registrations.
+    """
+
+    TRIM_EVERY = 256
+    POP_CHUNK = 500  # keys per DELETE, well under SQLite's variable limit
+
+    def __init__(self, store, max_entries=READ_CACHE_READERS):
+        self._store = store
+        self.max_entries = max_entries
+        self._added = 0
+
+    def add(self, key, address):
+        with self._store._write() as db:
+            db.execute("INSERT OR REPLACE INTO readers (key, address, seen) VALUES (?, ?, ?)",
+                       (key, address, time.time_ns()))
+            self._added += 1
+            if self._added % self.TRIM_EVERY == 0:
+                db.execute("DELETE FROM readers WHERE seen <= (SELECT seen FROM readers "
+                           "ORDER BY seen DESC LIMIT 1 OFFSET ?)", (self.max_entries,))
+
+    def pop(self, keys):
+        """Forget and return {address: [keys]} for the readers of keys."""
+        keys = list(keys)
+        by_address = {}
+        with self._store._write() as db:
+            for i in range(0, len(keys), self.POP_CHUNK):
+                chunk = keys[i:i + self.POP_CHUNK]
+                rows = db.execute(f"DELETE FROM readers WHERE key IN ({','.join('?' * len(chunk))}) "
+                                  "RETURNING key, address", chunk).fetchall()
+                for key, address in rows:
+                    by_address.setdefault(address, []).append(key)
+        return by_address
+
+    def __len__(self):
+        with self._store._db() as db:
+            return db.execute("SELECT COUNT(DISTINCT key) FROM readers").fetchone()[0]
+
+
+def open_store(node_id, hasher, shared=False):
+    """The key store for a node: a KeyStore over the STORAGE_BACKEND backend,
+    or a SqliteKeyStore when STORAGE_BACKEND is "sqlite" or the store must be
+    shared between worker processes.
+
+    A shared store that stands in for the memory backend starts empty, as the
+    memory backend would. One that stands in for the log backend keeps its
+    keys across restarts in the same way.
+    """
+    if not shared and STORAGE_BACKEND != "sqlite":
+        return KeyStore(hasher, open_backend(node_id))
+    if STORAGE_BACKEND == "log":
+        print("[Storage] The log backend cannot be shared between workers; using sqlite")
+    path = os.path.join(DATA_DIR, str(node_id), "store.sqlite")
+    if STORAGE_BACKEND == "memory":
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    return SqliteKeyStore(path, hasher)
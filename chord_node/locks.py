@@ -0,0 +1,93 @@
+import threading
+import zlib
+from concurrent.futures import Future
+from contextlib import contextmanager
+
+
+class RWLock:
+    """Many readers or one writer.
+
+    Writers are preferred: once a writer is waiting, new readers queue behind
+    it, so a steady stream of lookups cannot starve a transfer or a store.
+    Not reentrant; a holder must not acquire it again.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
+
+
+class StripedLock:
+    """A fixed set of locks indexed by key, for per-key critical sections
+    (such as compare-and-set of a key's version) without one global lock.
+
+    factory=multiprocessing.Lock makes the stripes shared with forked
+    worker processes.
+    """
+
+    def __init__(self, stripes=64, factory=threading.Lock):
+        self._locks = [factory() for _ in range(stripes)]
+
+    def __call__(self, key):
+        return self._locks[zlib.crc32(key.encode()) % len(self._locks)]
+
+
+class SingleFlight:
+    """At most one call in flight per key: callers that arrive while it runs
+    wait for it and share its result (or its exception)."""
+
+    def __init__(self):
+        self._calls = {}  # key -> Future of the call in flight
+        self._lock = threading.Lock()
+
+    def run(self, key, fn):
+        """Return (fn() or the in-flight call's result, whether it was shared)."""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result, False
+        finally:
+            with self._lock:
+                del self._calls[key]
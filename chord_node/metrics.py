@@ -0,0 +1,274 @@
+import bisect
+import json
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"  # 0 turns recording off; /metrics then only has gauges
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "1"))  # seconds between a worker's metric snapshots
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)  # seconds
+HOP_BUCKETS = (0, 1, 2, 3, 4, 5, 6, 7, 8, 10, 12, 16, 24, 32)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    """A named family of samples, one per combination of label values."""
+
+    kind = "untyped"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self, values=None):
+        """Text lines for the metric; values replaces this process's own samples."""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.extend(self._samples(labels, value))
+        return lines
+
+    def _samples(self, labels, value):
+        return [f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        if not METRICS_ENABLED:
+            return
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """A value read when /metrics is scraped, from collect() -> {labels: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect
+
+    def render(self, values=None):
+        if self.collect is not None:
+            try:
+                values = self.collect()
+            except Exception as e:
+                print(f"Error collecting {self.name}: {e}")
+                values = {}
+            with self._lock:
+                self._values = dict(values)
+        return super().render()
+
+
+class Histogram(Metric):
+    """Cumulative-bucket histogram; each sample is [bucket counts..., count, sum]."""
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        if not METRICS_ENABLED:
+            return
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(labels)
+            if sample is None:
+                sample = self._values[labels] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                sample[index] += 1
+            sample[-2] += 1
+            sample[-1] += value
+
+    def time(self, *labels):
+        return _Timer(self, labels)
+
+    def _samples(self, labels, sample):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float("inf"),), sample[:-2] + [None]):
+            cumulative = sample[-2] if count is None else cumulative + count
+            le = 'le="%s"' % _number(bound)
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {sample[-2]}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(sample[-1])}")
+        return lines
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "started")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, *self.labels)
+
+
+class Registry:
+    """The metrics of this process.
+
+    With WORKERS > 1 (see share()), each worker process writes its counters
+    and histograms to its own file in a directory shared by the workers,
+    every METRICS_FLUSH_INTERVAL and whenever it serves a scrape. render()
+    sums the files, so whichever worker answers, a scrape covers the whole
+    node; other workers' samples may be one interval old. Files of workers
+    that exited are kept, so their counts are not lost on a restart. Gauges
+    are read from state the workers already share.
+    """
+
+    def __init__(self):
+        self.metrics = []
+        self.directory = None  # set by share() when several workers serve the node
+        self._flush_lock = threading.Lock()
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def share(self, directory):
+        """Aggregate the metrics of the worker processes forked after this call."""
+        self.directory = directory
+
+    def start_worker(self):
+        """Run in each forked worker: drop samples inherited from the parent
+        and start publishing this worker's own."""
+        for metric in self.metrics:
+            if not isinstance(metric, Gauge):
+                with metric._lock:
+                    metric._values = {}
+        threading.Thread(target=self._flush_loop, daemon=True).start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                self._flush()
+            except OSError as e:
+                print(f"Error publishing metrics: {e}")
+
+    def _flush(self):
+        snapshot = {}
+        for metric in self.metrics:
+            if not isinstance(metric, Gauge):
+                with metric._lock:
+                    snapshot[metric.name] = [[list(labels), value] for labels, value in metric._values.items()]
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        with self._flush_lock:
+            with open(path + ".tmp", "w") as f:
+                json.dump(snapshot, f)
+            os.replace(path + ".tmp", path)
+
+    def _merged(self):
+        """{metric name: {labels: value}} summed over every worker's file."""
+        merged = {}
+        for filename in os.listdir(self.directory):
+            if not filename.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, filename)) as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Error reading metrics of worker {filename}: {e}")
+                continue
+            for name, samples in snapshot.items():
+                values = merged.setdefault(name, {})
+                for labels, value in samples:
+                    labels = tuple(labels)
+                    total = values.get(labels)
+                    if total is None:
+                        values[labels] = value
+                    elif isinstance(value, list):  # histogram buckets, count and sum
+                        values[labels] = [a + b for a, b in zip(total, value)]
+                    else:
+                        values[labels] = total + value
+        return merged
+
+    def render(self, extra=()):
+        """The Prometheus text exposition of every metric, plus extra ones."""
+        merged = None
+        if self.directory is not None:
+            self._flush()
+            merged = self._merged()
+        lines = []
+        for metric in self.metrics:
+            if merged is None or isinstance(metric, Gauge):
+                lines.extend(metric.render())
+            else:
+                lines.extend(metric.render(merged.get(metric.name, {})))
+        for metric in extra:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "chord_http_requests_total", "HTTP requests served, by route, method and status.",
+    ("route", "method", "status")))
+HTTP_LATENCY = REGISTRY.register(Histogram(
+    "chord_http_request_seconds", "Time to serve an HTTP request, by route.", ("route",)))
+RPC_LATENCY = REGISTRY.register(Histogram(
+    "chord_rpc_seconds", "Outbound RPC latency, by peer address and call type.", ("peer", "kind")))
+RPC_ERRORS = REGISTRY.register(Counter(
+    "chord_rpc_errors_total", "Outbound RPCs that failed without a response, by peer and call type.",
+    ("peer", "kind")))
+LOOKUP_HOPS = REGISTRY.register(Histogram(
+    "chord_lookup_hops", "Hops taken by successor lookups resolved here, by mode.", ("mode",), HOP_BUCKETS))
+LOOKUP_COALESCED = REGISTRY.register(Counter(
+    "chord_lookup_coalesced_total", "Successor lookups answered without forwarding, from the recent-result "
+    "cache or by sharing a lookup in flight.", ("how",)))
+FIND_SUCCESSOR_LATENCY = REGISTRY.register(Histogram(
+    "chord_find_successor_seconds", "Time for this node to resolve a successor, by mode.", ("mode",)))
+CLOSEST_PRECEDING_FINGER = REGISTRY.register(Counter(
+    "chord_closest_preceding_finger_total", "Local closest-preceding-finger decisions."))
+TRANSFER_BYTES = REGISTRY.register(Counter(
+    "chord_transfer_bytes_total", "Key transfer payload bytes, by direction.", ("direction",)))
+TRANSFER_KEYS = REGISTRY.register(Counter(
+    "chord_transfer_keys_total", "Keys moved by transfers, by direction.", ("direction",)))
+MAINTENANCE_LATENCY = REGISTRY.register(Histogram(
+    "chord_maintenance_seconds", "Duration of stabilization tasks, by task.", ("task",)))
+
+
+def node_gauges(host):
+    """Gauges read from a VirtualNodeHost at scrape time."""
+    return [
+        Gauge("chord_data_store_keys", "Keys held by this process (own ranges and replicas).",
+              collect=lambda: {(): len(host.primary.data_store)}),
+        Gauge("chord_owned_keys", "Keys in the range owned by each virtual node.", ("vnode",),
+              collect=lambda: {(vnode.node_id,): vnode.owned_count() for vnode in host}),
+        Gauge("chord_routing_version", "Routing snapshot version of each virtual node.", ("vnode",),
+              collect=lambda: {(vnode.node_id,): vnode.routing.version for vnode in host}),
+    ]
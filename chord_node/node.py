@@ -1,43 +1,207 @@
-import hashlib
+import bisect
+import json
+import multiprocessing
 import os
 import requests
 import threading
 import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from cache import READ_CACHE_BYTES, CacheReaders, ReadCache
+from fingers import FingerTable
+from hashing import RingHasher
+from keystore import open_store
+from locks import SingleFlight, StripedLock
+from metrics import (CLOSEST_PRECEDING_FINGER, FIND_SUCCESSOR_LATENCY, LOOKUP_COALESCED, LOOKUP_HOPS,
+                     TRANSFER_BYTES, TRANSFER_KEYS)
+from proximity import PROXIMITY_ROUTING, ProximityRouter
+from route_cache import LOOKUP_CACHE_SIZE, LOOKUP_CACHE_TTL, LOOKUP_COALESCING, RouteCache, in_range
+from rpc import PeerClient
+from scan import SCAN_CHUNK, SCAN_MAX_EXAMINED, SCAN_PAGE_SIZE
+from scheduler import MaintenanceScheduler
+from snapshot import RingSnapshot
+from wire import WIRE_PROTOCOL, WireClient
+from workers import WORKERS
+
+TRANSFER_CHUNK_SIZE = int(os.getenv("TRANSFER_CHUNK_SIZE", "500"))  # keys per transfer chunk
+TRANSFER_RETRIES = int(os.getenv("TRANSFER_RETRIES", "3"))  # resumes per transfer / resends per chunk
+SUCCESSOR_LIST_SIZE = int(os.getenv("SUCCESSOR_LIST_SIZE", "4"))  # r: successors tracked for failover
+REPLICATION_FACTOR = int(os.getenv("REPLICATION_FACTOR", "1"))  # k: copies of each key (owner + k-1 successors)
+WRITE_QUORUM = int(os.getenv("WRITE_QUORUM", "1"))  # default copies a store waits for
+READ_QUORUM = int(os.getenv("READ_QUORUM", "1"))  # default copies a lookup consults
+JOIN_PARALLELISM = int(os.getenv("JOIN_PARALLELISM", "8"))  # concurrent lookups while joining
+JOIN_WARM_START = os.getenv("JOIN_WARM_START", "True").lower() == "true"  # seed fingers from the successor's table
+STATUS_DEPARTED = 410  # answered by a (virtual) node that has left the ring
+
+# One immutable view of a node's routing state. Writers build a new Routing
+# and swap it in under ChordNode._routing_lock; readers take self.routing once
+# and see a consistent successor / predecessor / fingers without locking.
+# Peer dicts and finger entries inside a published Routing are never mutated.
+# With WORKERS > 1 the snapshot lives in shared memory (workers.SharedRouting)
+# and the lock is shared by the worker processes.
+Routing = namedtuple("Routing", "successor predecessor successor_list finger_table version")
 
 
 class ChordNode:
     #AUTHOR: Harikrishnan Venkatesh
-    def __init__(self, ip, port, m=160):
+    def __init__(self, ip, port, m=160, vnode=0, primary=None):
         self.ip = ip
         self.port = port
         self.m = m  # number of bits in identifier space
-        self.node_id = self.hash_ip(ip, port)
+        # Virtual node index; vnodes other than 0 share the primary's process,
+        # storage and connections but have their own ring position (vnodes.py)
+        self.vnode = vnode
+        self.hasher = primary.hasher if primary is not None else RingHasher(m)
+        self.node_id = self.hash_ip(ip, port) if vnode == 0 else self.hash_key(f"{ip}:{port}#{vnode}")
         self.fix_finger_index = 0
-        self.successor = {"node_id": self.node_id, "ip": self.ip, "port": self.port}
-        self.predecessor = {"node_id": self.node_id, "ip": self.ip, "port": self.port}
-        self.data_store = {}
-        # Initialize finger table with self as all successors initially
-        self.finger_table = [{"start": (self.node_id + (2**i)) % (2**self.m),
-                            "successor": {"node_id": self.node_id, "ip": self.ip, "port": self.port}}
-                           for i in range(self.m)]
+        self.finger_starts = FingerTable.starts_for(self.node_id, m)
+        self._routing_lock = threading.RLock()
+        self.shared_routing = None  # set by share_routing in multi-process mode
+        self._shared_seq = None  # sequence of the shared snapshot held in _routing
+        self.routing = self._initial_routing()
+        self.successor_list_size = SUCCESSOR_LIST_SIZE
+        self.replication_factor = REPLICATION_FACTOR
+        self.join_parallelism = JOIN_PARALLELISM
+        if primary is None:
+            self.rpc = PeerClient(wire=WireClient() if WIRE_PROTOCOL else None)
+            self.route_cache = RouteCache()
+            # Recent find_successor results, as the (key - 1, successor] ranges they prove
+            self.lookup_cache = RouteCache(LOOKUP_CACHE_SIZE, ttl=LOOKUP_CACHE_TTL) if LOOKUP_COALESCING else None
+            self.replica_pool = ThreadPoolExecutor(max_workers=8)
+            self.background = ThreadPoolExecutor(max_workers=4)  # fire-and-forget maintenance RPCs
+            self.data_store = open_store(self.node_id, self.hasher, shared=WORKERS > 1)
+            if WORKERS > 1:
+                # Workers must agree on versions and on who cached our keys, so those live in the shared store
+                self.versions = self.data_store.versions
+                self.cache_readers = self.data_store.readers
+                self.key_locks = StripedLock(factory=multiprocessing.Lock)
+            else:
+                self.versions = {}  # key -> version of the locally stored value (0 if unknown)
+                self.cache_readers = CacheReaders()  # keys we own that other nodes have cached
+                self.key_locks = StripedLock()  # serialises version checks per key
+            self.siblings = {}  # node_id -> virtual nodes served by this process
+            self.snapshots = RingSnapshot(self)  # cached /network_state
+            # Workers share an address, so an owner's invalidation would reach only one of their caches
+            self.read_cache = ReadCache() if READ_CACHE_BYTES and WORKERS == 1 else None
+        else:
+            self.rpc = primary.rpc
+            self.route_cache = primary.route_cache
+            self.lookup_cache = primary.lookup_cache
+            self.versions = primary.versions
+            self.replica_pool = primary.replica_pool
+            self.background = primary.background
+            self.data_store = primary.data_store
+            self.key_locks = primary.key_locks
+            self.siblings = primary.siblings
+            self.snapshots = primary.snapshots
+            self.read_cache = primary.read_cache
+            self.cache_readers = primary.cache_readers
+        self.proximity = ProximityRouter(self) if PROXIMITY_ROUTING else None
+        # Per virtual node: a lookup may legitimately pass through two vnodes of this process
+        self.lookup_flights = SingleFlight()
+        self.maintenance = MaintenanceScheduler(self)
         ##print(f"Node initialized with ID: {self.node_id}")
 
+    def _initial_routing(self):
+        """Routing of a node alone on the ring: every pointer is ourselves."""
+        me = self.as_dict()
+        # Initialize finger table with self as all successors initially
+        fingers = FingerTable.build(self.node_id, self.m, [me] * self.m, self.finger_starts)
+        return Routing(successor=me, predecessor=me, successor_list=(me,), finger_table=fingers, version=0)
+
+    @property
+    def routing(self):
+        shared = self.shared_routing
+        if shared is not None and shared.sequence() != self._shared_seq:
+            seq, raw = shared.read()
+            successor, predecessor, successor_list, finger_table, version = json.loads(raw)
+            fingers = FingerTable.decode(self.node_id, self.m, finger_table, self.finger_starts)
+            self._routing = Routing(successor, predecessor, tuple(successor_list), fingers, version)
+            self._shared_seq = seq
+        return self._routing
+
+    @routing.setter
+    def routing(self, routing):
+        """Publish a snapshot; callers hold _routing_lock (except __init__)."""
+        self._routing = routing
+        if self.shared_routing is not None:
+            encoded = routing._replace(finger_table=routing.finger_table.encode())
+            self.shared_routing.publish(json.dumps(list(encoded)).encode())
+            self._shared_seq = self.shared_routing.sequence()
+
+    def share_routing(self, region, lock):
+        """Keep routing in a shared memory region so that forked worker
+        processes all see, and update, the same snapshot (workers.py)."""
+        with self._routing_lock:
+            self._routing_lock = lock
+            self.shared_routing = region
+            self.routing = self._routing
+
+    def update_routing(self, **changes):
+        """Publish a new routing snapshot with the given fields replaced."""
+        with self._routing_lock:
+            if "successor_list" in changes:
+                changes["successor_list"] = tuple(changes["successor_list"])
+            routing = self.routing
+            if all(getattr(routing, field) == value for field, value in changes.items()):
+                return
+            self.routing = routing._replace(version=routing.version + 1, **changes)
+
+    @property
+    def successor(self):
+        return self.routing.successor
+
+    @successor.setter
+    def successor(self, peer):
+        self.update_routing(successor=peer)
+
+    @property
+    def predecessor(self):
+        return self.routing.predecessor
+
+    @predecessor.setter
+    def predecessor(self, peer):
+        self.update_routing(predecessor=peer)
+
+    @property
+    def successor_list(self):
+        """Next r nodes clockwise, maintained by stabilize."""
+        return self.routing.successor_list
+
+    @successor_list.setter
+    def successor_list(self, peers):
+        self.update_routing(successor_list=peers)
+
+    @property
+    def finger_table(self):
+        return self.routing.finger_table
+
+    def set_finger(self, i, successor):
+        """Point finger i at successor (copy-on-write of the table)."""
+        with self._routing_lock:
+            fingers = self.routing.finger_table
+            if fingers.successor(i) != successor:
+                self.update_routing(finger_table=fingers.with_finger(i, successor))
+
     #AUTHOR: Harikrishnan Venkatesh
     def hash_ip(self, ip, port):
         """Hash the IP:port combination to get a node identifier in the Chord ring."""
-        h = hashlib.sha1(f"{ip}:{port}".encode()).hexdigest()
-        return int(h, 16) % (2**self.m)
+        return self.hasher.digest_id(f"{ip}:{port}")
 
     #AUTHOR: Harikrishnan Venkatesh
     def hash_key(self, key):
         """Hash a key to determine its position in the Chord ring."""
-        h = hashlib.sha1(key.encode()).hexdigest()
-        return int(h, 16) % (2**self.m)
+        return self.hasher.key_id(key)
+
+    def hash_keys(self, keys):
+        """Ring IDs of a list of keys, hashed in one call."""
+        return self.hasher.key_ids(keys)
         
     #AUTHOR: Harikrishnan Venkatesh
     def store_data(self, key, value):
         """Store data in the local key-value store."""
-        self.data_store[key] = value
+        self.data_store.put(key, value)
         ##print(f"Stored key '{key}' -> '{value}' at node {self.node_id}")
         return True
     #AUTHOR: Harikrishnan Venkatesh
@@ -70,55 +234,291 @@ class ChordNode:
     #AUTHOR: Harikrishnan Venkatesh
     def is_responsible(self, key_id):
         """Determine if this node is responsible for the given key_id."""
-        if self.predecessor is None:
-            return True  # Only node in network
-        return self.in_interval(key_id, self.predecessor["node_id"], self.node_id, inclusive_right=True)
+        routing = self.routing
+        if routing.predecessor is None:
+            # Only node in network; a node whose predecessor just failed waits
+            # for the next notify instead of claiming the whole ring
+            return routing.successor is None or routing.successor["node_id"] == self.node_id
+        return self.in_interval(key_id, routing.predecessor["node_id"], self.node_id, inclusive_right=True)
         
     #AUTHOR: Harikrishnan Venkatesh
     def closest_preceding_finger(self, key_id):
         """Find the closest preceding finger for a key_id."""
-        for i in range(self.m - 1, -1, -1):
-            if self.finger_table[i] is not None:
-                candidate = self.finger_table[i]["successor"]
-                if self.in_interval(candidate["node_id"], self.node_id, key_id, inclusive_right=False):
-                    return candidate
+        CLOSEST_PRECEDING_FINGER.inc()
+        candidate = self.finger_table.closest_preceding(key_id)
+        if candidate is not None:
+            return candidate
         return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
 
-    #AUTHOR: Harikrishnan Venkatesh
-    def find_successor(self, key_id):
-        """Find the successor node for a key_id."""
+    def next_hop(self, key_id):
+        """Decide locally how to resolve key_id.
+
+        Returns (successor, None) when this node can answer on its own, or
+        (None, n_prime) when the query has to be forwarded to n_prime.
+        """
+        successor = self.successor
         # If key_id is in (n, successor], return successor
-        if self.in_interval(key_id, self.node_id, self.successor["node_id"], inclusive_right=True):
-            return self.successor
-        
+        if self.in_interval(key_id, self.node_id, successor["node_id"], inclusive_right=True):
+            return successor, None
+
         # Otherwise, find the closest preceding finger and forward the query
         n_prime = self.closest_preceding_finger(key_id)
-        
-        # If n_prime is self, return immediate successor
+
+        # If no finger precedes the key (e.g. fingers not yet fixed after a
+        # join), the key lies beyond our successor: hand the query to it
         if n_prime["node_id"] == self.node_id:
-            return self.successor
-        
-        # Forward the query to n_prime
+            if successor["node_id"] == self.node_id:
+                return successor, None
+            return None, successor
+        if self.proximity is not None:
+            n_prime = self.proximity.choose(key_id, n_prime)
+        return None, n_prime
+
+    #AUTHOR: Harikrishnan Venkatesh
+    def find_successor(self, key_id, hops=0):
+        """Find the successor node for a key_id.
+
+        hops is the number of nodes the query was forwarded through before
+        reaching us; the node that answers records the total in LOOKUP_HOPS.
+        """
+        started = time.perf_counter()
         try:
-            url = f"http://{n_prime['ip']}:{n_prime['port']}/find_successor?key_id={key_id}"
-            resp = requests.get(url, timeout=30)
-            if resp.status_code == 200:
-                return resp.json()
-        except Exception as e:
-            ##print(f"Error finding successor via {n_prime}: {e}")
-            return self.successor  # Fallback
-        
+            return self._find_successor(key_id, hops)
+        finally:
+            FIND_SUCCESSOR_LATENCY.observe(time.perf_counter() - started, "recursive")
+
+    def _find_successor(self, key_id, hops):
+        successor, n_prime = self.next_hop(key_id)
+        if successor is not None:
+            LOOKUP_HOPS.observe(hops, "recursive")
+            return successor
+        sibling = self.sibling(n_prime)
+        if sibling is not None and sibling is not self:
+            # Another virtual node of this process: no need to go over HTTP
+            return sibling._find_successor(key_id, hops + 1)
+        if self.lookup_cache is None:
+            return self._forward_lookup(key_id, hops) or self.successor  # Fallback
+
+        cached = self.cached_successor(key_id, hops)
+        if cached is not None:
+            return cached
+        # Concurrent lookups forwarded to the same hop (a burst of joins asking
+        # their bootstrap node for nearby finger starts) share one query when
+        # its answer settles their key too
+        (lead_key, successor), shared = self.lookup_flights.run(
+            n_prime["node_id"], lambda: (key_id, self._forward_lookup(key_id, hops)))
+        if shared and not self.settles(lead_key, successor, key_id):
+            # The query in flight was for a key further along; ask for ours
+            successor, shared = self._forward_lookup(key_id, hops), False
+        if shared:
+            LOOKUP_COALESCED.inc("shared")
+        elif successor is not None:
+            self.remember_successor(key_id, successor)
+        return successor or self.successor  # Fallback
+
+    def cached_successor(self, key_id, hops):
+        """key_id's successor from a recent lookup, or None."""
+        cached = self.lookup_cache.get(key_id)
+        if cached is not None:
+            LOOKUP_COALESCED.inc("cache")
+            LOOKUP_HOPS.observe(hops, "recursive")
+        return cached
+
+    def settles(self, lead_key, successor, key_id):
+        """True if successor, the answer for lead_key, is key_id's successor
+        too: no node lies in [lead_key, successor)."""
+        return successor is not None and in_range(key_id, (lead_key - 1) % (1 << self.m), successor["node_id"])
+
+    def remember_successor(self, key_id, successor):
+        """Cache a lookup result: no node lies in [key_id, successor), so it is
+        the answer for that whole range until LOOKUP_CACHE_TTL runs out."""
+        self.lookup_cache.put((key_id - 1) % (1 << self.m), successor)
+
+    def _forward_lookup(self, key_id, hops):
+        """Resolve key_id through the next hop; None if no hop answered."""
+        # A hop that cannot be reached is dropped from our tables and the
+        # query is re-routed through the next best finger or successor.
+        for attempt in range(self.successor_list_size + 1):
+            successor, n_prime = self.next_hop(key_id)
+            if successor is not None:
+                LOOKUP_HOPS.observe(hops, "recursive")
+                return successor
+
+            sibling = self.sibling(n_prime)
+            if sibling is not None and sibling is not self:
+                return sibling._forward_lookup(key_id, hops + 1)
+
+            # Forward the query to n_prime
+            try:
+                resp = self.rpc.get(n_prime, "/find_successor",
+                                    params={"key_id": key_id, "hops": hops + 1}, kind="lookup")
+                if resp.status_code == 200:
+                    return resp.json()
+                if resp.status_code == STATUS_DEPARTED:
+                    self.peer_failed(n_prime)
+                    continue
+                break
+            except requests.RequestException as e:
+                ##print(f"Error finding successor via {n_prime}: {e}")
+                self.peer_failed(n_prime)
+            except Exception as e:
+                break
+        return None
+
+    def reset_routing(self):
+        """Point every routing entry back at ourselves, as on a fresh start."""
+        with self._routing_lock:
+            initial = self._initial_routing()
+            self.routing = initial._replace(version=self.routing.version + 1)
+
+    def is_local(self, peer):
+        """True if peer is served by this process (this or a sibling vnode)."""
+        return peer["ip"] == self.ip and peer["port"] == self.port
+
+    def sibling(self, peer):
+        """The in-process virtual node for peer, or None if it is remote."""
+        if not self.is_local(peer):
+            return None
+        return self.siblings.get(peer["node_id"])
+
+    def owned_count(self):
+        """Number of stored keys in this node's own range (predecessor, self]."""
+        if self.predecessor is None:
+            return len(self.data_store)
+        return self.data_store.count_range(self.predecessor["node_id"], self.node_id)
+
+    def peer_failed(self, peer):
+        """Forget a peer that did not answer an RPC.
+
+        It is removed from the successor list (failing over to the next live
+        successor if it was our successor), from the finger table and from the
+        predecessor pointer. stabilize and fix_fingers then repair the gaps.
+        """
+        dead = peer["node_id"]
+        if dead == self.node_id:
+            return
+        self.rpc.drop(peer)
+        self.route_cache.invalidate(dead)
+        if self.lookup_cache is not None:
+            self.lookup_cache.invalidate(dead)
+        if self.proximity is not None:
+            self.proximity.forget(dead)
+        with self._routing_lock:
+            routing = self.routing
+            successor_list = [p for p in routing.successor_list if p["node_id"] != dead]
+            successor = routing.successor
+            if successor is not None and successor["node_id"] == dead:
+                if successor_list:
+                    successor = successor_list[0]
+                else:
+                    # Every successor failed: stabilize walks back from the
+                    # nearest finger beyond them to the true successor
+                    others = [p for p in routing.finger_table.peers if p["node_id"] not in (dead, self.node_id)]
+                    successor = min(others, key=lambda p: (p["node_id"] - self.node_id) % (1 << self.m),
+                                    default=self.as_dict())
+                print(f"[{self.node_id}] Successor {dead} unreachable, failing over to {successor['node_id']}")
+            if not successor_list:
+                successor_list = [successor]
+            fingers = routing.finger_table.replace_peer(dead, successor)
+            predecessor = routing.predecessor
+            if predecessor is not None and predecessor["node_id"] == dead:
+                predecessor = None
+            self.update_routing(successor=successor, successor_list=successor_list,
+                                finger_table=fingers, predecessor=predecessor)
+
+    def iterative_steps(self, key_id):
+        """Drive an iterative lookup for key_id from this node.
+
+        This is a generator shared by the sync and async lookup paths: it
+        yields (peer, params) for each /closest_preceding_finger call it needs
+        and expects the decoded reply (or None on failure) to be sent back.
+        Its return value is the successor of key_id.
+        """
+        successor, n_prime = self.next_hop(key_id)
+        if successor is not None:
+            return successor
+
+        for _ in range(self.m):
+            hop = yield n_prime, {"key_id": key_id, "with_successor": 1}
+            if hop is None:
+                break
+            finger, n_succ = hop["finger"], hop["successor"]
+            if self.in_interval(key_id, n_prime["node_id"], n_succ["node_id"], inclusive_right=True):
+                self.route_cache.put(n_prime["node_id"], n_succ)
+                return n_succ
+            if finger["node_id"] == n_prime["node_id"]:
+                finger = n_succ  # No closer finger there; continue at its successor
+            n_prime = finger
         return self.successor  # Fallback
-        
+
+    def find_successor_iterative(self, key_id, use_cache=True):
+        """Find the successor of key_id by driving every hop from this node.
+
+        Unlike find_successor, intermediate nodes only answer one
+        /closest_preceding_finger call each instead of holding a request open
+        for the rest of the chain. Learned ranges are kept in route_cache.
+        """
+        if use_cache:
+            cached = self.route_cache.get(key_id)
+            if cached is not None:
+                return cached
+
+        started = time.perf_counter()
+        hops = 0
+        steps = self.iterative_steps(key_id)
+        reply = None
+        try:
+            while True:
+                peer, params = steps.send(reply)
+                hops += 1
+                try:
+                    resp = self.rpc.get(peer, "/closest_preceding_finger", params=params)
+                    reply = resp.json() if resp.status_code == 200 else None
+                    if resp.status_code == STATUS_DEPARTED:
+                        self.peer_failed(peer)
+                except requests.RequestException:
+                    self.peer_failed(peer)
+                    reply = None
+        except StopIteration as done:
+            LOOKUP_HOPS.observe(hops, "iterative")
+            FIND_SUCCESSOR_LATENCY.observe(time.perf_counter() - started, "iterative")
+            return done.value
+
+    def group_by_owner(self, keys):
+        """Group keys by the node responsible for them.
+
+        Keys are visited in ring order and find_successor is only called for
+        the first key of each run: once successor(k) is known, every key in
+        [k, successor(k)] belongs to the same node. Returns a dict of
+        node_id -> (owner, [keys]).
+        """
+        groups = {}
+        owner = None
+        run_start = None
+        for key_id, key in sorted(zip(self.hash_keys(keys), keys)):
+            if owner is None or not self.in_interval(key_id, run_start, owner["node_id"],
+                                                     inclusive_left=True, inclusive_right=True):
+                run_start = key_id
+                owner = self.as_dict() if self.is_responsible(key_id) else self.find_successor(key_id)
+            groups.setdefault(owner["node_id"], (owner, []))[1].append(key)
+        return groups
+
     #AUTHOR: Harikrishnan Venkatesh
     def find_predecessor(self, key_id):
         """Find the predecessor node for a key_id."""
+        return self.locate_predecessor(key_id)[0]
+
+    def locate_predecessor(self, key_id):
+        """(predecessor of key_id, that node's successor).
+
+        The successor is None when the walk stopped early on a failed hop.
+        """
         if self.successor["node_id"] == self.node_id:
-            return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+            return {"node_id": self.node_id, "ip": self.ip, "port": self.port}, self.successor
             
         # If key_id is in (n, successor], return self
         if self.in_interval(key_id, self.node_id, self.successor["node_id"], inclusive_right=True):
-            return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+            return {"node_id": self.node_id, "ip": self.ip, "port": self.port}, self.successor
         
         n_prime = {"node_id": self.node_id, "ip": self.ip, "port": self.port}
         n_succ = self.successor
@@ -127,31 +527,29 @@ class ChordNode:
             if n_prime["node_id"] == self.node_id:
                 n_prime = self.closest_preceding_finger(key_id)
                 if n_prime["node_id"] == self.node_id:
-                    return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+                    return {"node_id": self.node_id, "ip": self.ip, "port": self.port}, None
             else:
                 try:
-                    url = f"http://{n_prime['ip']}:{n_prime['port']}/closest_preceding_finger?key_id={key_id}"
-                    resp = requests.get(url, timeout=300)
+                    resp = self.rpc.get(n_prime, "/closest_preceding_finger", params={"key_id": key_id})
                     if resp.status_code == 200:
                         n_prime = resp.json()
                     else:
-                        return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+                        return {"node_id": self.node_id, "ip": self.ip, "port": self.port}, None
                 except Exception as e:
                     ##print(f"Error finding closest preceding finger: {e}")
-                    return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+                    return {"node_id": self.node_id, "ip": self.ip, "port": self.port}, None
             
             try:
-                url = f"http://{n_prime['ip']}:{n_prime['port']}/successor"
-                resp = requests.get(url, timeout=300)
+                resp = self.rpc.get(n_prime, "/successor", kind="ping")
                 if resp.status_code == 200:
                     n_succ = resp.json()
                 else:
-                    return n_prime
+                    return n_prime, None
             except Exception as e:
                 ##print(f"Error getting successor of {n_prime}: {e}")
-                return n_prime
+                return n_prime, None
                 
-        return n_prime
+        return n_prime, n_succ
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def join(self, bootstrap_address=None):
@@ -164,16 +562,16 @@ class ChordNode:
             
         try:
             # Find our successor through the bootstrap node
-            url = f"http://{bootstrap_address}/find_successor?key_id={self.node_id}"
-            resp = requests.get(url, timeout=300)
+            resp = self.rpc.get(bootstrap_address, "/find_successor", params={"key_id": self.node_id},
+                                kind="lookup")
             if resp.status_code == 200:
-                self.successor = resp.json()
+                successor = resp.json()
+                self.update_routing(successor=successor, successor_list=[successor])
                 ##print(f"Set successor to {self.successor}")
 
 
                 # *** New: Get the old predecessor from our successor ***
-                url_pred = f"http://{self.successor['ip']}:{self.successor['port']}/get_predecessor"
-                resp_pred = requests.get(url_pred, timeout=300)
+                resp_pred = self.rpc.get(self.successor, "/get_predecessor", kind="ping")
                 if resp_pred.status_code == 200 and resp_pred.json():
                     old_pred = resp_pred.json()
                 else:
@@ -206,15 +604,25 @@ class ChordNode:
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def init_finger_table(self, bootstrap_address):
-        """Initialize the finger table using entries from the bootstrap node."""
+        """Initialize the finger table using entries from the bootstrap node.
+
+        Lookups run join_parallelism at a time in rounds (see
+        _resolve_in_rounds). The answer for one finger also settles every
+        following finger whose start lies before that answer, so a round
+        only asks for the first finger of each unsettled stretch. With
+        JOIN_WARM_START the successor's own fingers first give an estimated
+        table, which is published at once and picks where to ask.
+        """
         
+        # The successors are collected here and published as one table at the end
+        fingers = [entry["successor"] for entry in self.finger_table]
+
         # Set the first finger's successor to our own successor
-        self.finger_table[0]["successor"] = self.successor
+        fingers[0] = self.successor
         
         try:
             # Get predecessor of our successor
-            url = f"http://{self.successor['ip']}:{self.successor['port']}/get_predecessor"
-            resp = requests.get(url, timeout=300)
+            resp = self.rpc.get(self.successor, "/get_predecessor", kind="ping")
             if resp.status_code == 200 and resp.json():
                 self.predecessor = resp.json()
             else:
@@ -222,26 +630,42 @@ class ChordNode:
         except Exception as e:
             print(f"Error getting predecessor: {e}")
         
-        # For each remaining finger
-        for i in range(1, self.m):
-            start = (self.node_id + (2**i)) % (2**self.m)
-            
-            # If start is in [n, finger[i-1].successor)
-            if self.in_interval(start, self.node_id, self.finger_table[i-1]["successor"]["node_id"], 
-                               inclusive_left=True, inclusive_right=False):
-                self.finger_table[i]["successor"] = self.finger_table[i-1]["successor"]
-            else:
-                # Otherwise, find the successor for this finger through the bootstrap
-                try:
-                    url = f"http://{bootstrap_address}/find_successor?key_id={start}"
-                    resp = requests.get(url, timeout=300)
-                    if resp.status_code == 200:
-                        self.finger_table[i]["successor"] = resp.json()
-                    else:
-                        print(f"Failed to find successor for finger {i}")
-                except Exception as e:
-                    print(f"Error finding successor for finger {i}: {e}")
+        estimate = self._warm_start_fingers() if JOIN_WARM_START else None
+        if estimate is not None:
+            fingers = estimate
+            self.update_routing(finger_table=FingerTable.build(self.node_id, self.m, fingers, self.finger_starts))
+
+        def lookup(i):
+            # Find the successor for this finger through the bootstrap
+            try:
+                resp = self.rpc.get(bootstrap_address, "/find_successor",
+                                    params={"key_id": self.finger_starts[i]}, kind="lookup")
+                if resp.status_code == 200:
+                    return resp.json()
+                print(f"Failed to find successor for finger {i}")
+            except Exception as e:
+                print(f"Error finding successor for finger {i}: {e}")
+            return None
+
+        def settled_by(i, successor):
+            # Fingers i.. whose start is in [start_i, successor] share it
+            start = self.finger_starts[i]
+            settled = [i]
+            for j in range(i + 1, self.m):
+                if successor["node_id"] == start or not self.in_interval(
+                        self.finger_starts[j], start, successor["node_id"]):
+                    break
+                settled.append(j)
+            return settled
+
+        known = {0: self.successor}
+        known.update((i, self.successor) for i in settled_by(0, self.successor))
+        groups = [fingers[i]["node_id"] for i in range(self.m)] if estimate is not None else None
+        found = self._resolve_in_rounds(range(self.m), lookup, settled_by, known, groups)
+        for i, successor in found.items():
+            fingers[i] = successor
         
+        self.update_routing(finger_table=FingerTable.build(self.node_id, self.m, fingers, self.finger_starts))
         # print(f"Finger table initialized: {self.finger_table}")
         
         # Update other nodes that should point to us
@@ -249,57 +673,150 @@ class ChordNode:
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def update_others(self):
-        """Update all nodes whose finger tables should point to us."""
-        
-        for i in range(self.m):
-            # Find the last node p whose i-th finger might be us
-            # p = find_predecessor((n - 2^(i-1)) mod 2^m)
-            p_id = (self.node_id - (2**i)) % (2**self.m)
-            p = self.find_predecessor(p_id)
-            
+        """Update all nodes whose finger tables should point to us.
+
+        The m predecessor lookups are resolved in parallel rounds like
+        init_finger_table's: locating p for one target also gives p's
+        successor, which settles every other target in (p, successor(p)].
+        Each distinct p then gets all of its entries in one call, different
+        nodes in parallel.
+        """
+        ring = 2 ** self.m
+        # Find the last node p whose i-th finger might be us
+        # p = find_predecessor((n - 2^(i-1)) mod 2^m)
+        targets = [(self.node_id - (2**i)) % ring for i in range(self.m)]
+
+        def lookup(i):
+            return self.locate_predecessor(targets[i])
+
+        def settled_by(i, located):
+            p, p_succ = located
+            if p_succ is None:
+                return [i]
+            return [j for j in range(self.m) if j == i or self.in_interval(targets[j], p["node_id"], p_succ["node_id"])]
+
+        # Group targets by the closest node before them that we know of
+        known_ids = sorted({peer["node_id"] for peer in self.finger_table.peers} | {self.node_id})
+        groups = [known_ids[bisect.bisect_left(known_ids, target) - 1] for target in targets]
+        located = self._resolve_in_rounds(range(self.m), lookup, settled_by, groups=groups)
+        updates = {}
+        for i, (p, _) in sorted(located.items()):
             if p["node_id"] != self.node_id:
-                try:
-                    # Tell p to update its finger table with us as the i-th finger successor
-                    url = f"http://{p['ip']}:{p['port']}/update_finger_table"
-                    data = {
-                        "i": i,
-                        "s": {"node_id": self.node_id, "ip": self.ip, "port": self.port}
-                    }
-                    resp = requests.post(url, json=data, timeout=300)
-                    if resp.status_code == 200:
-                        print(f"Updated node {p['node_id']} finger table entry {i}")
-                    else:
-                        print(f"Failed to update node {p['node_id']} finger table: {resp.status_code}")
-                except Exception as e:
-                    print(f"Error updating other node's finger table: {e}")
+                updates.setdefault(p["node_id"], (p, []))[1].append(i)
+
+        def push(p, indexes):
+            try:
+                # Tell p to update its finger table with us as the i-th finger successor
+                data = {
+                    "i": indexes,
+                    "s": {"node_id": self.node_id, "ip": self.ip, "port": self.port}
+                }
+                resp = self.rpc.post(p, "/update_finger_table", json=data)
+                if resp.status_code == 200:
+                    print(f"Updated node {p['node_id']} finger table entries {indexes[0]}..{indexes[-1]}")
+                else:
+                    print(f"Failed to update node {p['node_id']} finger table: {resp.status_code}")
+            except Exception as e:
+                print(f"Error updating other node's finger table: {e}")
+
+        if updates:
+            with ThreadPoolExecutor(max_workers=min(self.join_parallelism, len(updates))) as pool:
+                for p, indexes in updates.values():
+                    pool.submit(push, p, indexes)
+
+    def _resolve_in_rounds(self, indexes, lookup, settled_by, known=None, groups=None):
+        """Resolve lookup(i) for every index with few, concurrent calls.
+
+        settled_by(i, answer) lists the indexes whose answer is known once
+        i's is. Each round looks up the first unresolved index of every
+        stretch (of consecutive indexes, split further where groups, an
+        estimate per index, changes), topped up with the highest unresolved
+        indexes, at most join_parallelism at a time. A failed lookup (None)
+        resolves only its own index and is left out of the result.
+        """
+        known = dict(known or {})
+        failed = set()
+        pending = [i for i in indexes if i not in known]
+        with ThreadPoolExecutor(max_workers=self.join_parallelism) as pool:
+            while pending:
+                heads = [i for n, i in enumerate(pending)
+                         if n == 0 or pending[n - 1] != i - 1
+                         or (groups is not None and groups[i] != groups[i - 1])]
+                for i in reversed(pending):
+                    if len(heads) >= self.join_parallelism:
+                        break
+                    if i not in heads:
+                        heads.append(i)
+                batch = heads[:self.join_parallelism]
+                for i, answer in zip(batch, pool.map(lookup, batch)):
+                    if answer is None:
+                        failed.add(i)
+                    elif i not in known:
+                        known.update((j, answer) for j in settled_by(i, answer) if j not in known)
+                pending = [i for i in pending if i not in known and i not in failed]
+        return known
+
+    def _warm_start_fingers(self):
+        """An estimated finger table built from the peers our successor
+        knows (its successor list and fingers), or None if it cannot be read."""
+        try:
+            resp = self.rpc.get(self.successor, "/finger_table", kind="ping")
+            if resp.status_code != 200:
+                return None
+            peers = {entry["successor"]["node_id"]: entry["successor"] for entry in resp.json()["finger_table"]}
+        except Exception as e:
+            print(f"Error reading successor's finger table: {e}")
+            return None
+        peers[self.successor["node_id"]] = self.successor
+        peers.pop(self.node_id, None)
+        ring = sorted(peers)
+        estimate = []
+        for start in self.finger_starts:
+            # First known peer at or after start, clockwise
+            position = bisect.bisect_left(ring, start)
+            estimate.append(peers[ring[position % len(ring)]])
+        return estimate
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def update_finger_table(self, s, i):
-        """Update the i-th finger table entry to s if appropriate."""
-        if (self.finger_table[i]["successor"]["node_id"] == self.node_id or 
-            self.in_interval(s["node_id"], self.node_id, self.finger_table[i]["successor"]["node_id"], inclusive_right=False)):
-            
-            self.finger_table[i]["successor"] = s
-            
-            # Propagate update to predecessor if needed
-            if self.predecessor and self.predecessor["node_id"] != s["node_id"]:
-                try:
-                    url = f"http://{self.predecessor['ip']}:{self.predecessor['port']}/update_finger_table"
-                    data = {"i": i, "s": s}
-                    requests.post(url, json=data, timeout=300)
-                except Exception as e:
-                    print(f"Error propagating finger update to predecessor: {e}")
+        """Update the i-th finger table entry to s if appropriate.
+
+        i may also be a list of entries (update_others sends one call per
+        node); only the entries that changed are passed on to the predecessor.
+        """
+        indexes = i if isinstance(i, list) else [i]
+        updated = []
+        with self._routing_lock:
+            for index in indexes:
+                current = self.finger_table.successor(index)["node_id"]
+                if (current == self.node_id or
+                        self.in_interval(s["node_id"], self.node_id, current, inclusive_right=False)):
+                    self.set_finger(index, s)
+                    updated.append(index)
+
+        if updated:
+            # Propagate update to predecessor if needed, in the background so
+            # the caller does not wait for the whole chain of predecessors
+            predecessor = self.predecessor
+            if predecessor and predecessor["node_id"] != s["node_id"]:
+                data = {"i": updated if isinstance(i, list) else i, "s": s}
+                self.background.submit(self._propagate_finger_update, predecessor, data)
             
             return True
         return False
 
+    def _propagate_finger_update(self, predecessor, data):
+        try:
+            self.rpc.post(predecessor, "/update_finger_table", json=data)
+        except Exception as e:
+            print(f"Error propagating finger update to predecessor: {e}")
+
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def notify_successor(self):
         """Notify our successor that we might be its predecessor."""
         try:
-            url = f"http://{self.successor['ip']}:{self.successor['port']}/notify"
             data = {"node_id": self.node_id, "ip": self.ip, "port": self.port}
-            resp = requests.post(url, json=data, timeout=300)
+            resp = self.rpc.post(self.successor, "/notify", json=data)
             if resp.status_code == 200:
                 return True
             else:
@@ -310,11 +827,14 @@ class ChordNode:
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def notify(self, node):
         """Process notification from another node that it might be our predecessor."""
-        if (self.predecessor is None or 
-            self.in_interval(node["node_id"], self.predecessor["node_id"], self.node_id, inclusive_right=False)):
-            
-            self.predecessor = node
-            return True
+        with self._routing_lock:
+            if (self.predecessor is None or 
+                self.in_interval(node["node_id"], self.predecessor["node_id"], self.node_id, inclusive_right=False)):
+                
+                self.predecessor = node
+                return True
+        if self.proximity is not None:
+            self.proximity.learn([node])
         return False
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
@@ -323,9 +843,8 @@ class ChordNode:
         if self.predecessor is None:
             return False
         try:
-            url = f"http://{self.predecessor['ip']}:{self.predecessor['port']}/set_successor"
             data = {"node_id": self.node_id, "ip": self.ip, "port": self.port}
-            resp = requests.post(url, json=data, timeout=300)
+            resp = self.rpc.post(self.predecessor, "/set_successor", json=data)
             if resp.status_code == 200:
                 return True
             else:
@@ -338,97 +857,430 @@ class ChordNode:
         """Request keys from successor that should now belong to us."""
         if self.successor["node_id"] == self.node_id:
             return  # We are the only node
+        if self.is_local(self.successor):
+            return True  # A sibling vnode: the keys are already in our shared store
             
-        try:
-            url = f"http://{self.successor['ip']}:{self.successor['port']}/transfer_keys"
-            data = {"node_id": self.node_id}
+        # Keys arrive as a newline-delimited JSON stream of chunks. Each chunk is
+        # stored and then acknowledged so the successor can drop those keys; if
+        # the stream breaks we resume after the last acknowledged cursor.
+        successor = self.successor
+        cursor = None
+        for attempt in range(TRANSFER_RETRIES):
+            data = {"node_id": self.node_id, "chunk_size": TRANSFER_CHUNK_SIZE}
             if lower_bound is not None:
                 data["lower_bound"] = lower_bound
-            resp = requests.post(url, json=data, timeout=300)
-            if resp.status_code == 200:
-                keys = resp.json().get("keys", {})
-                for k, v in keys.items():
-                    self.store_data(k, v)
-                return True
+            if cursor is not None:
+                data["cursor"] = cursor
+            try:
+                with self.rpc.post(successor, "/transfer_keys_stream", json=data,
+                                   kind="transfer", stream=True) as resp:
+                    if resp.status_code != 200:
+                        return False
+                    for line in resp.iter_lines():
+                        if not line:
+                            continue
+                        TRANSFER_BYTES.inc("in", amount=len(line))
+                        chunk = json.loads(line)
+                        if chunk.get("done"):
+                            return True
+                        TRANSFER_KEYS.inc("in", amount=len(chunk["entries"]))
+                        self.store_transferred(chunk["entries"])
+                        ack = self.rpc.post(successor, "/transfer_ack", kind="transfer",
+                                            json={"keys": [entry[1] for entry in chunk["entries"]]})
+                        ack.raise_for_status()
+                        cursor = chunk["cursor"]
+            except (requests.RequestException, ValueError) as e:
+                print(f"[Node {self.node_id}] Key transfer interrupted at {cursor}, resuming: {e}")
+        return False
+
+    def transfer_chunks(self, new_pred_id, lower_bound=None, cursor=None, chunk_size=TRANSFER_CHUNK_SIZE):
+        """Yield the keys that belong to a new predecessor as transfer chunks.
+
+        Each chunk is {"cursor": [key_id, key], "entries": [[key_id, key, value, version], ...]}
+        in ring order, starting after cursor if given. Nothing is removed here;
+        keys are dropped once the receiver acknowledges them (acknowledge_transfer).
+        """
+        if lower_bound is None:
+            lower_bound = self.predecessor["node_id"] if self.predecessor else self.node_id
+        for chunk in self.data_store.iter_chunks(lower_bound, new_pred_id, chunk_size, after=cursor):
+            yield {"cursor": list(chunk[-1][:2]), "entries": self.with_versions(chunk)}
+
+    def with_versions(self, chunk):
+        """[key_id, key, value, version] entries for a chunk of the store."""
+        return [[key_id, key, value, self.versions.get(key, 0)] for key_id, key, value in chunk]
+
+    def store_transferred(self, entries):
+        """Store [key_id, key, value, version] entries handed over by another
+        node, unless we already hold a newer version of a key."""
+        for key_id, key, value, version in entries:
+            with self.key_locks(key):
+                if version >= self.versions.get(key, 0):
+                    self.data_store.put(key, value, key_id=key_id)
+                    self.versions[key] = version
+
+    def scan_owned(self, from_id, after=None, limit=SCAN_PAGE_SIZE, prefix="", end=None, values=True):
+        """Our keys with ring IDs from from_id up to end, in (ring ID, key) order.
+
+        from_id must be in our range; the slice ends at our own ID (or the top
+        of the ID space for the part of our range that wraps past it). Keys
+        after the cursor after=(key_id, key) that start with prefix are read
+        from the store index one chunk at a time, stopping at limit matches or
+        SCAN_MAX_EXAMINED keys looked at. Returns (entries, next): entries are
+        [key_id, key, value, version] ([key_id, key, version] without values),
+        next is the position to continue from ({"from", "after"}) or None once
+        end is reached.
+        """
+        end = (1 << self.m) - 1 if end is None else end
+        upper = min(end, self.node_id if from_id <= self.node_id else (1 << self.m) - 1)
+        entries = []
+        examined = 0
+        cursor = tuple(after) if after is not None else None
+        while len(entries) < limit and examined < SCAN_MAX_EXAMINED:
+            chunk = self.data_store.chunk_after(from_id - 1, upper, cursor, SCAN_CHUNK)
+            if not chunk:
+                return entries, ({"from": upper + 1, "after": None} if upper < end else None)
+            for key_id, key, value in chunk:
+                examined += 1
+                cursor = (key_id, key)
+                if key.startswith(prefix):
+                    version = self.versions.get(key, 0)
+                    entries.append([key_id, key, value, version] if values else [key_id, key, version])
+                    if len(entries) >= limit:
+                        break
+        return entries, {"from": cursor[0], "after": list(cursor)}
+
+    def acknowledge_transfer(self, keys):
+        """Drop keys that a peer has confirmed it now stores.
+
+        With replication the old owner becomes the new owner's first replica,
+        so it keeps its copies.
+        """
+        if self.replication_factor > 1:
+            return
+        for key in keys:
+            self.data_store.delete(key)
+            self.versions.pop(key, None)
+
+    def push_keys(self, peer, lower=None, upper=None):
+        """Hand the keys in (lower, upper] (all stored keys if lower is None)
+        to peer in acknowledged chunks.
+
+        A chunk is deleted locally only after the peer accepted it, and a failed
+        chunk is resent up to TRANSFER_RETRIES times. Returns False if a chunk
+        could not be delivered; the undelivered keys are kept.
+        """
+        for chunk in self.data_store.iter_chunks(lower, upper, TRANSFER_CHUNK_SIZE):
+            payload = {"entries": self.with_versions(chunk)}
+            for attempt in range(TRANSFER_RETRIES):
+                try:
+                    resp = self.rpc.post(peer, "/receive_keys", json=payload, kind="transfer")
+                    if resp.status_code == 200:
+                        TRANSFER_BYTES.inc("out", amount=len(resp.request.body or b""))
+                        TRANSFER_KEYS.inc("out", amount=len(chunk))
+                        break
+                except requests.RequestException as e:
+                    print(f"[Node {self.node_id}] Failed to hand off chunk at {chunk[0][:2]}: {e}")
             else:
                 return False
-        except Exception as e:
-            return False
+            self.acknowledge_transfer([key for _, key, _ in chunk])
+        return True
 
     #AUTHOR: Kruthik Jonnagaddala Thyagaraja
     def transfer_keys_to_predecessor(self, new_pred_id, lower_bound=None):
         """Transfer keys that should belong to a new predecessor.
         If lower_bound is provided, use it as the lower bound of the interval;
         otherwise, use the current predecessor's node_id."""
-        keys_to_transfer = {}
-        keys_to_remove = []
         if lower_bound is None:
             lower_bound = self.predecessor["node_id"] if self.predecessor else self.node_id
 
-        for k, v in self.data_store.items():
-            key_id = self.hash_key(k)
-            if self.in_interval(key_id, lower_bound, new_pred_id, inclusive_right=True):
-                keys_to_transfer[k] = v
-                keys_to_remove.append(k)
-        
-        for k in keys_to_remove:
-            del self.data_store[k]
-            
-        return keys_to_transfer
+        # The store is indexed by ring ID, so this is a seek and a slice
+        if self.replication_factor > 1:
+            # We stay on as the new predecessor's first replica
+            return self.data_store.copy_range(lower_bound, new_pred_id)
+        return self.data_store.pop_range(lower_bound, new_pred_id)
+
+    def quorum(self, requested, default):
+        """Clamp a requested read/write quorum to [1, k]."""
+        try:
+            q = int(requested) if requested is not None else default
+        except ValueError:
+            q = default
+        return max(1, min(q, self.replication_factor))
+
+    def replicas(self):
+        """The successors holding copies of the keys this node owns.
+
+        These are the first k-1 successors on distinct processes: virtual
+        nodes of one process share a store, so a copy there adds nothing.
+        """
+        peers = []
+        addresses = {(self.ip, self.port)}
+        for peer in self.successor_list:
+            if len(peers) >= self.replication_factor - 1:
+                break
+            if (peer["ip"], peer["port"]) not in addresses:
+                addresses.add((peer["ip"], peer["port"]))
+                peers.append(peer)
+        return peers
+
+    def store_replica(self, key, value, version):
+        """Apply a replicated write unless we already hold a newer version."""
+        with self.key_locks(key):
+            if version >= self.versions.get(key, 0):
+                self.store_data(key, value)
+                self.versions[key] = version
+
+    def _push_replica(self, peer, items):
+        try:
+            resp = self.rpc.post(peer, "/replicate", json={"items": items})
+            return resp.status_code == 200
+        except requests.RequestException:
+            return False
+
+    def store_owned(self, items, w=1):
+        """Store keys this node owns and copy them to its replicas.
+
+        items is a {key: value} dict. Every replica is sent the write, but only
+        w copies (counting ours) are waited for; the rest complete in the
+        background. Returns the number of copies acknowledged.
+        """
+        version = time.time_ns()
+        payload = []
+        for key, value in items.items():
+            with self.key_locks(key):
+                self.store_data(key, value)
+                self.versions[key] = version
+            payload.append([key, value, version])
+        self.invalidate_readers(items, version)
+
+        acks = 1
+        futures = [self.replica_pool.submit(self._push_replica, peer, payload) for peer in self.replicas()]
+        if acks >= w:
+            return acks
+        for future in as_completed(futures):
+            if future.result():
+                acks += 1
+                if acks >= w:
+                    break
+        return acks
+
+    def address(self):
+        return f"{self.ip}:{self.port}"
+
+    def invalidate_readers(self, keys, version):
+        """Tell the nodes that may have cached keys (see ReadCache) that they
+        now have version, in the background."""
+        for address, stale in self.cache_readers.pop(keys).items():
+            self.background.submit(self._send_invalidate, address, stale, version)
+
+    def _send_invalidate(self, address, keys, version):
+        try:
+            self.rpc.post(address, "/invalidate", json={"keys": keys, "version": version})
+        except requests.RequestException as e:
+            print(f"[{self.node_id}] Could not invalidate {len(keys)} cached keys at {address}: {e}")
+
+    def invalidate_cached(self, keys, version=None):
+        """Drop keys from our read cache (an owner reported a newer version)."""
+        if self.read_cache is not None:
+            for key in keys:
+                self.read_cache.invalidate(key, version)
+
+    def _read_replica(self, peer, key):
+        try:
+            resp = self.rpc.get(peer, f"/replica_read/{key}", kind="ping")
+            if resp.status_code == 200:
+                body = resp.json()
+                return peer, body["value"], body["version"]
+        except requests.RequestException:
+            pass
+        return None
+
+    def quorum_read(self, key, r=1):
+        """Read key from r copies (ours first) and return (value, version, copies_read).
+
+        The newest version wins; replicas that returned an older version are
+        repaired in the background.
+        """
+        value = self.get_data(key)
+        responses = [(None, value, self.versions.get(key, 0) if value is not None else -1)]
+        if r > 1:
+            futures = [self.replica_pool.submit(self._read_replica, peer, key) for peer in self.replicas()]
+            for future in as_completed(futures):
+                result = future.result()
+                if result is not None:
+                    responses.append(result)
+                    if len(responses) >= r:
+                        break
+
+        _, value, version = max(responses, key=lambda response: response[2])
+        if value is not None:
+            for peer, stale_value, stale_version in responses:
+                if stale_version < version:
+                    if peer is None:
+                        self.store_replica(key, value, version)
+                    else:
+                        self.replica_pool.submit(self._push_replica, peer, [[key, value, version]])
+        return value, version, len(responses)
 
 #AUTHOR: Apurv Choudhari 
     def as_dict(self):
         return {"node_id": self.node_id, "ip": self.ip, "port": self.port}
 
+    def info(self):
+        """Debug view of this vnode, as served by /node_info."""
+        routing = self.routing
+
+        def pointer(peer):
+            return {"node_id": peer["node_id"], "ip": peer["ip"], "port": peer["port"]} if peer else None
+
+        return {
+            "node_id": self.node_id,
+            "ip": self.ip,
+            "port": self.port,
+            "successor": pointer(routing.successor),
+            "predecessor": pointer(routing.predecessor),
+            "successor_list": [peer["node_id"] for peer in routing.successor_list],
+            "vnodes": sorted(self.siblings),
+            "finger_peers": list(routing.finger_table.peers),
+            "finger_table": [
+                {"start": entry["start"], "successor_id": entry["successor"]["node_id"]}
+                for entry in routing.finger_table
+            ],
+            "data_count": len(self.data_store),
+            "owned_count": self.owned_count(),
+            "storage": self.data_store.stats(),
+            "read_cache": self.read_cache.stats() if self.read_cache is not None else None,
+            "cache_readers": len(self.cache_readers),
+            "m": self.m
+        }
+
 #AUTHOR: Apurv Choudhari 
     def stabilize(self):
-        """Verify your immediate successor and tell it about yourself."""
+        """Verify your immediate successor and tell it about yourself.
+
+        Also refreshes the successor list from the successor's own list. If the
+        successor cannot be reached, fail over to the next entry of the list
+        and try again.
+        """
+        for attempt in range(self.successor_list_size):
+            successor = self.successor
+            try:
+                response = self.rpc.get(successor, "/get_predecessor", kind="ping")
+                if response.status_code == 200:
+                    x = response.json()
+                    if x is not None and self.in_interval(x["node_id"], self.node_id, successor["node_id"]):
+                        with self._routing_lock:
+                            # A join or failover may have moved the successor while we asked
+                            if self.successor == successor:
+                                self.successor = x
+                self.update_successor_list()
+
+                ## notify successor that I can be your pred
+                self.rpc.post(self.successor, "/notify", json=self.as_dict())
+                return
+            except requests.RequestException:
+                if successor["node_id"] == self.node_id:
+                    return
+                self.peer_failed(successor)
+        print(f"[{self.node_id}] Could not contact any successor, keeping {self.successor['node_id']}")
+
+    def update_successor_list(self):
+        """Rebuild the successor list as our successor followed by its list."""
+        successor = self.successor
+        if successor["node_id"] == self.node_id:
+            self.successor_list = [successor]
+            return
+        resp = self.rpc.get(successor, "/successor_list", kind="ping")
+        successors = [successor]
+        if resp.status_code == 200:
+            for peer in resp.json():
+                # A ring smaller than r wraps back around to us
+                if peer["node_id"] == self.node_id or len(successors) >= self.successor_list_size:
+                    break
+                if peer["node_id"] != successor["node_id"]:
+                    successors.append(peer)
+        self.successor_list = successors
+        if self.proximity is not None:
+            self.proximity.learn(successors)
+
+    def check_predecessor(self):
+        """Clear the predecessor pointer if it no longer answers."""
+        predecessor = self.predecessor
+        if predecessor is None or predecessor["node_id"] == self.node_id:
+            return
         try:
-            url = f"http://{self.successor['ip']}:{self.successor['port']}/get_predecessor"
-            response = requests.get(url, timeout=5)
-            if response.status_code == 200:
-                x = response.json()
-                if x is not None and self.in_interval(x["node_id"], self.node_id, self.successor["node_id"]):
-                    self.successor = x
-
-            ## notify successor that I can be your pred
-            url = f"http://{self.successor['ip']}:{self.successor['port']}/notify"
-            requests.post(url, json=self.as_dict(), timeout=5)
+            self.rpc.get(predecessor, "/health", kind="ping")
         except requests.RequestException:
-            print(f"[{self.node_id}] Could not contact successor {self.successor['node_id']}, keeping current")
+            print(f"[{self.node_id}] Predecessor {predecessor['node_id']} unreachable, clearing it")
+            self.peer_failed(predecessor)
 
 #AUTHOR: Apurv Choudhari 
-    def fix_fingers(self):
-        """Periodically refresh finger table entries."""
-        self.fix_finger_index = (self.fix_finger_index + 1) % self.m
-        start = (self.node_id + 2 ** self.fix_finger_index) % (2 ** self.m)
-        self.finger_table[self.fix_finger_index]["start"] = start
-        self.finger_table[self.fix_finger_index]["successor"] = self.find_successor(start)
+    def fix_fingers(self, count=1):
+        """Periodically refresh finger table entries.
+
+        Looks up the next count entries after the last one fixed. The entries
+        that follow a looked-up one and whose start is still at or before the
+        successor found collapse to that same successor, so they are set
+        without a lookup of their own. Returns the number of lookups made.
+        """
+        lookups = 0
+        index = self.fix_finger_index
+        for _ in range(count):
+            index = (index + 1) % self.m
+            start = self.finger_starts[index]
+            successor = self.find_successor(start)
+            lookups += 1
+            self.set_finger(index, successor)
+            if self.proximity is not None:
+                self.proximity.learn([successor])
+            while (index + 1) % self.m != 0 and successor["node_id"] != start:
+                following = self.finger_starts[index + 1]
+                if not self.in_interval(following, start, successor["node_id"]):
+                    break
+                index += 1
+                self.set_finger(index, successor)
+            if index == self.m - 1:
+                break  # one full pass per run is enough
+        self.fix_finger_index = index
+        return lookups
 
 #AUTHOR: Apurv Choudhari 
-    def depart(self):
+    def depart(self, all_keys=True):
+        """Leave the ring, handing our keys to the successor.
 
+        all_keys=False hands over only this node's own range and keeps the
+        rest of the (shared) store; VirtualNodeHost uses it for every vnode
+        but the last one to leave.
+        """
         try:
             if self.successor:
-                url = f"http://{self.successor['ip']}:{self.successor['port']}/receive_keys"
-                requests.post(url, json={"data": self.data_store})
+                if not self.is_local(self.successor):
+                    lower = None if all_keys or self.predecessor is None else self.predecessor["node_id"]
+                    if not self.push_keys(self.successor, lower, self.node_id):
+                        return False
             else:
                 print(f"[Node {self.node_id}] No successor to transfer keys to.")
 
+            # The keys are handed over; a neighbour that cannot be told is
+            # repaired by stabilization like any other failed peer
             if self.predecessor:
-                url = f"http://{self.predecessor['ip']}:{self.predecessor['port']}/update_successor"
-                requests.post(url, json={"successor": self.successor})
+                try:
+                    self.rpc.post(self.predecessor, "/update_successor", json={"successor": self.successor})
+                except requests.RequestException as e:
+                    print(f"[Node {self.node_id}] Could not update predecessor: {e}")
             else:
                 print(f"[Node {self.node_id}] No predecessor to update.")
 
             if self.successor:
                 print(f"[Node {self.node_id}] Updating successor's predecessor to {self.predecessor['node_id']}")
-                url = f"http://{self.successor['ip']}:{self.successor['port']}/update_predecessor"
-                requests.post(url, json={"predecessor": self.predecessor})
+                try:
+                    self.rpc.post(self.successor, "/update_predecessor", json={"predecessor": self.predecessor})
+                except requests.RequestException as e:
+                    print(f"[Node {self.node_id}] Could not update successor: {e}")
 
-            self.successor = None
-            self.predecessor = None
-            self.data_store = {}
+            self.update_routing(successor=None, predecessor=None)
+            if all_keys:
+                self.data_store.clear()
 
             return True
 
@@ -0,0 +1,142 @@
+import math
+import os
+import threading
+
+import requests
+
+from rpc import peer_address
+
+PROXIMITY_ROUTING = os.getenv("PROXIMITY_ROUTING", "True").lower() == "true"  # pick next hops by RTT as well as ID
+PROXIMITY_CANDIDATES = int(os.getenv("PROXIMITY_CANDIDATES", "4"))  # peers kept per finger interval
+PROXIMITY_PROBES = int(os.getenv("PROXIMITY_PROBES", "4"))  # RTT probes per maintenance run
+PROXIMITY_PROBE_AGE = float(os.getenv("PROXIMITY_PROBE_AGE", "60"))  # seconds before a peer's RTT is re-probed
+PROXIMITY_SCAN = 3  # finger intervals below the key's that are searched for a next hop
+
+
+class ProximityRouter:
+    """Next-hop choice by expected remaining latency (proximity route selection).
+
+    Any peer between this node and the key is a correct next hop; the finger
+    table only offers the one with the most ID progress. The router keeps up
+    to PROXIMITY_CANDIDATES peers per finger interval [n + 2**i, n + 2**(i+1)),
+    learned from fix_fingers, successor lists, notify and the successor's
+    finger table, and picks the candidate (or the finger) with the lowest
+
+        rtt(peer) + mean_rtt * hops_left(peer)
+
+    where hops_left is half the log2 of the remaining ID distance in units of
+    the average node gap, the expected length of a Chord lookup. A peer that
+    has not been measured costs the mean RTT, so with no measurements the
+    choice is the peer closest to the key, as before. Each candidate list is
+    an immutable tuple, replaced on change, so readers need no lock.
+    """
+
+    def __init__(self, node, size=PROXIMITY_CANDIDATES):
+        self.node = node
+        self.size = size
+        self.ring = 1 << node.m
+        self.buckets = [()] * node.m
+        self._lock = threading.Lock()
+
+    def _bucket(self, node_id):
+        distance = (node_id - self.node.node_id) % self.ring
+        return distance.bit_length() - 1 if distance else None
+
+    def _cost(self, peer, rtt, mean):
+        own = rtt.get(peer_address(peer))
+        return own if own is not None else mean
+
+    def learn(self, peers):
+        """Offer peers as candidates; each interval keeps its lowest-RTT ones."""
+        rtt = self.node.rpc.rtt
+        mean = rtt.mean() or 0.0
+        with self._lock:
+            for peer in peers:
+                if not peer or peer.get("node_id") is None:
+                    continue
+                i = self._bucket(peer["node_id"])
+                if i is None:
+                    continue
+                bucket = [p for p in self.buckets[i] if p["node_id"] != peer["node_id"]]
+                if len(bucket) == len(self.buckets[i]) and len(bucket) >= self.size:
+                    # Full: replace the slowest known candidate if the new peer is not slower
+                    worst = max(bucket, key=lambda p: self._cost(p, rtt, mean))
+                    if self._cost(worst, rtt, mean) <= self._cost(peer, rtt, mean):
+                        continue
+                    bucket.remove(worst)
+                bucket.append(dict(peer))
+                self.buckets[i] = tuple(bucket)
+
+    def forget(self, node_id):
+        i = self._bucket(node_id)
+        if i is None:
+            return
+        with self._lock:
+            self.buckets[i] = tuple(p for p in self.buckets[i] if p["node_id"] != node_id)
+
+    def candidates(self):
+        return [peer for bucket in self.buckets for peer in bucket]
+
+    def _node_gap(self):
+        """Average ID distance between neighbouring nodes, from the successor list."""
+        successors = self.node.successor_list
+        span = (successors[-1]["node_id"] - self.node.node_id) % self.ring if successors else 0
+        return span / len(successors) if span else self.ring
+
+    def choose(self, key_id, default):
+        """The next hop towards key_id: default (the closest preceding finger)
+        or a candidate that is expected to reach the key sooner."""
+        rtt = getattr(self.node.rpc, "rtt", None)
+        mean = rtt.mean() if rtt is not None else None
+        if mean is None:
+            return default
+        node_id = self.node.node_id
+        span = (key_id - node_id) % self.ring or self.ring
+        gap = self._node_gap()
+
+        def cost(peer):
+            left = (key_id - peer["node_id"]) % self.ring
+            hops = 0.5 * math.log2(left / gap) if left > gap else 0.0
+            return self._cost(peer, rtt, mean) + mean * hops
+
+        best, best_cost = default, cost(default)
+        top = min((span - 1).bit_length() - 1, self.node.m - 1)
+        for i in range(top, max(top - PROXIMITY_SCAN, -1), -1):
+            for peer in self.buckets[i]:
+                if 0 < (peer["node_id"] - node_id) % self.ring < span:
+                    peer_cost = cost(peer)
+                    if peer_cost < best_cost:
+                        best, best_cost = peer, peer_cost
+        return best
+
+    def refresh(self, probes=PROXIMITY_PROBES):
+        """Learn candidates from the successor's finger table and measure the
+        RTT of up to probes candidates not sampled for PROXIMITY_PROBE_AGE.
+        Returns the number of RPCs made."""
+        node = self.node
+        rpcs = 0
+        successor = node.successor
+        if successor is not None and successor["node_id"] != node.node_id and not node.is_local(successor):
+            try:
+                resp = node.rpc.get(successor, "/finger_table", kind="ping")
+                rpcs += 1
+                if resp.status_code == 200:
+                    self.learn(entry["successor"] for entry in resp.json()["finger_table"])
+            except requests.RequestException as e:
+                print(f"[{node.node_id}] Could not read successor's finger table: {e}")
+        rtt = node.rpc.rtt
+        stale = []
+        for peer in self.candidates():
+            if node.is_local(peer):
+                continue
+            age = rtt.age(peer_address(peer))
+            if age is None or age > PROXIMITY_PROBE_AGE:
+                stale.append((age is not None, age or 0.0, peer))
+        stale.sort(key=lambda item: (item[0], -item[1]))  # never measured first, then oldest
+        for _, _, peer in stale[:probes]:
+            try:
+                node.rpc.get(peer, "/health", kind="ping")
+            except requests.RequestException:
+                node.peer_failed(peer)
+            rpcs += 1
+        return rpcs
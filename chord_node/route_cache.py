@@ -0,0 +1,93 @@
+import bisect
+import os
+import threading
+import time
+from collections import OrderedDict
+
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "1024"))
+LOOKUP_COALESCING = os.getenv("LOOKUP_COALESCING", "True").lower() == "true"  # share concurrent and recent find_successor results
+LOOKUP_CACHE_TTL = float(os.getenv("LOOKUP_CACHE_TTL", "1"))  # seconds a find_successor result is reused
+LOOKUP_CACHE_SIZE = int(os.getenv("LOOKUP_CACHE_SIZE", "256"))  # ranges kept per node
+
+
+def in_range(x, lower, upper):
+    """True if x is in the ring interval (lower, upper]; lower == upper is the whole ring."""
+    if lower == upper:
+        return True
+    if lower < upper:
+        return lower < x <= upper
+    return x > lower or x <= upper
+
+
+class RouteCache:
+    """LRU cache of learned key ranges: (lower, owner_id] -> owner.
+
+    A range is learned whenever an iterative lookup ends at a node n whose
+    successor s covers the key: every key in (n, s] belongs to s. Owners are
+    kept in a sorted list so a lookup is a bisect plus one interval check.
+
+    With a ttl, ranges are forgotten ttl seconds after they were learned
+    (ChordNode keeps such a cache of recent find_successor results).
+    """
+
+    def __init__(self, capacity=ROUTE_CACHE_SIZE, ttl=None):
+        self.capacity = capacity
+        self.ttl = ttl
+        self._ranges = OrderedDict()  # owner_id -> (lower, owner, expiry or None)
+        self._owner_ids = []
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key_id):
+        """Return the cached owner of key_id, or None."""
+        with self._lock:
+            if self._owner_ids:
+                i = bisect.bisect_left(self._owner_ids, key_id) % len(self._owner_ids)
+                owner_id = self._owner_ids[i]
+                lower, owner, expiry = self._ranges[owner_id]
+                if expiry is not None and expiry < time.monotonic():
+                    del self._ranges[owner_id]
+                    del self._owner_ids[i]
+                elif in_range(key_id, lower, owner_id):
+                    self._ranges.move_to_end(owner_id)
+                    self.hits += 1
+                    return owner
+            self.misses += 1
+            return None
+
+    def put(self, lower, owner):
+        """Remember that owner is responsible for (lower, owner.node_id].
+
+        A range already known for owner that covers the new one is kept as it
+        is; one the new range covers is replaced.
+        """
+        owner_id = owner["node_id"]
+        now = time.monotonic()
+        expiry = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            known = self._ranges.get(owner_id)
+            if known is None:
+                bisect.insort(self._owner_ids, owner_id)
+            elif lower != owner_id and in_range(lower, known[0], owner_id) and (known[2] or now) >= now:
+                self._ranges.move_to_end(owner_id)
+                return
+            self._ranges[owner_id] = (lower, owner, expiry)
+            self._ranges.move_to_end(owner_id)
+            if len(self._ranges) > self.capacity:
+                evicted, _ = self._ranges.popitem(last=False)
+                del self._owner_ids[bisect.bisect_left(self._owner_ids, evicted)]
+
+    def invalidate(self, owner_id):
+        """Forget the range of an owner that turned out to be stale."""
+        with self._lock:
+            if self._ranges.pop(owner_id, None) is not None:
+                del self._owner_ids[bisect.bisect_left(self._owner_ids, owner_id)]
+
+    def clear(self):
+        with self._lock:
+            self._ranges.clear()
+            self._owner_ids.clear()
+
+    def stats(self):
+        return {"size": len(self._ranges), "hits": self.hits, "misses": self.misses}
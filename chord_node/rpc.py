@@ -0,0 +1,190 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import RPC_ERRORS, RPC_LATENCY
+
+
+def _timeout(kind, connect, read):
+    """Read a (connect, read) timeout pair for a call type from the environment."""
+    prefix = f"RPC_TIMEOUT_{kind.upper()}"
+    return (float(os.getenv(f"{prefix}_CONNECT", connect)),
+            float(os.getenv(f"{prefix}_READ", read)))
+
+
+# Timeouts per call type, as (connect, read) seconds.
+#   ping        - liveness and pointer reads (get_predecessor, successor, health)
+#   maintenance - notify / finger updates issued by stabilization and joins
+#   routing     - one hop of a lookup (closest_preceding_finger)
+#   lookup      - recursive find_successor / store / lookup chains
+#   transfer    - bulk key movement on join and depart
+#   state       - dashboard and debug reads (node_info)
+TIMEOUTS = {
+    "ping": _timeout("ping", 2, 5),
+    "maintenance": _timeout("maintenance", 2, 10),
+    "routing": _timeout("routing", 2, 10),
+    "lookup": _timeout("lookup", 2, 30),
+    "transfer": _timeout("transfer", 2, 120),
+    "state": _timeout("state", 1, 2),
+}
+
+POOL_MAXSIZE = int(os.getenv("RPC_POOL_MAXSIZE", "16"))  # connections kept per peer
+MAX_PEERS = int(os.getenv("RPC_MAX_PEERS", "256"))  # peers with an open session
+RTT_ALPHA = float(os.getenv("RTT_ALPHA", "0.2"))  # weight of a new sample in a peer's smoothed RTT
+RTT_MAX_PEERS = int(os.getenv("RTT_MAX_PEERS", "4096"))  # peers whose RTT is remembered
+# Call types that measure the network: their handlers answer from local state.
+# lookup/transfer/state calls include remote work (whole lookup chains), so are not sampled.
+RTT_KINDS = frozenset(("ping", "routing"))
+
+
+def peer_address(peer):
+    """Return the "ip:port" address of a peer dict (or pass an address through)."""
+    if isinstance(peer, str):
+        return peer
+    return f"{peer['ip']}:{peer['port']}"
+
+
+def peer_params(peer, params):
+    """Query parameters for a call to peer, addressed to its virtual node.
+
+    Several virtual nodes can share one address; the receiving process picks
+    the one named by the vnode parameter. Plain addresses go to its primary.
+    """
+    if isinstance(peer, str) or peer.get("node_id") is None:
+        return params
+    params = dict(params) if params else {}
+    params.setdefault("vnode", peer["node_id"])
+    return params
+
+
+class RttTable:
+    """Smoothed round-trip time per peer address (EWMA of sampled calls)."""
+
+    def __init__(self, alpha=RTT_ALPHA, max_peers=RTT_MAX_PEERS):
+        self.alpha = alpha
+        self.max_peers = max_peers
+        self._rtt = OrderedDict()  # address -> (smoothed seconds, time of last sample)
+        self._lock = threading.Lock()
+
+    def observe(self, address, seconds):
+        with self._lock:
+            previous = self._rtt.pop(address, None)
+            if previous is not None:
+                seconds = previous[0] + self.alpha * (seconds - previous[0])
+            self._rtt[address] = (seconds, time.monotonic())
+            if len(self._rtt) > self.max_peers:
+                self._rtt.popitem(last=False)
+
+    def get(self, address):
+        """Smoothed RTT of address in seconds, or None if never sampled."""
+        entry = self._rtt.get(address)
+        return entry[0] if entry else None
+
+    def age(self, address):
+        """Seconds since address was last sampled, or None."""
+        entry = self._rtt.get(address)
+        return time.monotonic() - entry[1] if entry else None
+
+    def mean(self):
+        """Mean smoothed RTT over known peers, or None if there are none."""
+        with self._lock:
+            values = [entry[0] for entry in self._rtt.values()]
+        return sum(values) / len(values) if values else None
+
+    def forget(self, address):
+        with self._lock:
+            self._rtt.pop(address, None)
+
+
+class PeerClient:
+    """Outbound RPC to other nodes over pooled keep-alive HTTP sessions.
+
+    One requests.Session is kept per peer address so consecutive calls to the
+    same node reuse its TCP connections. Sessions are evicted least recently
+    used once more than max_peers peers have been contacted. The latency of
+    RTT_KINDS calls is folded into rtt, per peer. With a wire client
+    (wire.WireClient), the calls it carries skip HTTP.
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE, max_peers=MAX_PEERS, timeouts=None, wire=None):
+        self.pool_maxsize = pool_maxsize
+        self.max_peers = max_peers
+        self.rtt = RttTable()
+        self.wire = wire
+        self.timeouts = dict(TIMEOUTS)
+        if timeouts:
+            self.timeouts.update(timeouts)
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _new_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize,
+                              max_retries=0, pool_block=False)
+        session.mount("http://", adapter)
+        return session
+
+    def session(self, peer):
+        """Return the pooled session for a peer, creating it on first use."""
+        address = peer_address(peer)
+        evicted = None
+        with self._lock:
+            session = self._sessions.get(address)
+            if session is not None:
+                self._sessions.move_to_end(address)
+                return session
+            session = self._new_session()
+            self._sessions[address] = session
+            if len(self._sessions) > self.max_peers:
+                _, evicted = self._sessions.popitem(last=False)
+        if evicted is not None:
+            evicted.close()
+        return session
+
+    def request(self, method, peer, path, kind="routing", **kwargs):
+        address = peer_address(peer)
+        url = f"http://{address}{path}"
+        kwargs.setdefault("timeout", self.timeouts[kind])
+        kwargs["params"] = peer_params(peer, kwargs.get("params"))
+        started = time.perf_counter()
+        try:
+            resp = self.wire.request(peer, path, kwargs) if self.wire is not None else None
+            if resp is None:
+                resp = self.session(peer).request(method, url, **kwargs)
+        except requests.RequestException:
+            RPC_ERRORS.inc(address, kind)
+            raise
+        elapsed = time.perf_counter() - started
+        RPC_LATENCY.observe(elapsed, address, kind)
+        if kind in RTT_KINDS:
+            self.rtt.observe(address, elapsed)
+        return resp
+
+    def get(self, peer, path, params=None, kind="routing", **kwargs):
+        return self.request("GET", peer, path, kind=kind, params=params, **kwargs)
+
+    def post(self, peer, path, json=None, data=None, params=None, kind="maintenance", **kwargs):
+        return self.request("POST", peer, path, kind=kind, json=json, data=data,
+                            params=params, **kwargs)
+
+    def drop(self, peer):
+        """Close the session to a peer, e.g. after it departed or failed."""
+        with self._lock:
+            session = self._sessions.pop(peer_address(peer), None)
+        if session is not None:
+            session.close()
+        if self.wire is not None:
+            self.wire.drop(peer)
+
+    def close(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+        if self.wire is not None:
+            self.wire.close()
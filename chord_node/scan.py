@@ -0,0 +1,89 @@
+"""Paginated scans over every key on the ring, in ring-ID order.
+
+GET /scan on any node returns a page of entries and a continuation token.
+The entry node asks the owner of the current position for the keys it owns
+from there on (GET /scan?forwarded=1, answered by ChordNode.scan_owned from
+the store's sorted index), then moves on to the owner of the next ID, until
+the page is full. The token holds the position, so a scan can be resumed
+through any node and survives joins and departures in between: keys are
+ordered by (ring ID, key), which does not depend on who owns them.
+"""
+import base64
+import json
+import os
+
+SCAN_PAGE_SIZE = int(os.getenv("SCAN_PAGE_SIZE", "500"))  # entries per page unless ?limit= is given
+SCAN_MAX_PAGE = int(os.getenv("SCAN_MAX_PAGE", "5000"))  # largest ?limit= accepted
+SCAN_MAX_NODES = int(os.getenv("SCAN_MAX_NODES", "16"))  # owners asked per page; sparse prefixes return early
+SCAN_MAX_EXAMINED = int(os.getenv("SCAN_MAX_EXAMINED", "20000"))  # keys one owner examines per request
+SCAN_CHUNK = 256  # entries read from the store index at a time
+
+
+def encode_token(state, position):
+    body = {"from": position["from"], "after": position["after"], "end": state["end"],
+            "prefix": state["prefix"], "values": state["values"]}
+    return base64.urlsafe_b64encode(json.dumps(body, separators=(",", ":")).encode()).decode()
+
+
+def decode_token(token):
+    try:
+        body = json.loads(base64.urlsafe_b64decode(token.encode()))
+        position = {"from": int(body["from"]), "after": body["after"]}
+        if position["after"] is not None:
+            position["after"] = [int(body["after"][0]), str(body["after"][1])]
+        return {"end": int(body["end"]), "prefix": str(body["prefix"]), "values": bool(body["values"])}, position
+    except (ValueError, KeyError, TypeError, IndexError) as e:
+        raise ValueError(f"Invalid scan token: {e}")
+
+
+def scan_request(args, m):
+    """(state, position, limit) of a client /scan request; raises ValueError.
+
+    args are the query parameters: token, or start/end (inclusive ring IDs),
+    prefix and values=0 (keys only) for a new scan; limit on either.
+    """
+    limit = min(int(args.get("limit", SCAN_PAGE_SIZE)), SCAN_MAX_PAGE)
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if args.get("token"):
+        state, position = decode_token(args["token"])
+        return state, position, limit
+    start = int(args.get("start", 0))
+    end = int(args.get("end", (1 << m) - 1))
+    if not 0 <= start <= end < 1 << m:
+        raise ValueError(f"start and end must satisfy 0 <= start <= end < 2**{m}")
+    state = {"end": end, "prefix": args.get("prefix", ""),
+             "values": str(args.get("values", "1")).lower() not in ("0", "false")}
+    return state, {"from": start, "after": None}, limit
+
+
+def slice_params(state, position, limit):
+    """Query parameters asking the owner of position for its part of a page."""
+    params = {"forwarded": 1, "from": position["from"], "end": state["end"], "limit": limit,
+              "prefix": state["prefix"], "values": int(state["values"])}
+    if position["after"] is not None:
+        params["after_id"], params["after_key"] = position["after"]
+    return params
+
+
+def slice_request(args):
+    """(from_id, after, limit, prefix, end, values) of a forwarded /scan request."""
+    after = (int(args["after_id"]), args["after_key"]) if "after_id" in args else None
+    return (int(args["from"]), after, min(int(args.get("limit", SCAN_PAGE_SIZE)), SCAN_MAX_PAGE),
+            args.get("prefix", ""), int(args["end"]), str(args.get("values", "1")) != "0")
+
+
+def page(node, state, position, entries, nodes, error=None):
+    """The /scan response body: entries so far and the token to continue from
+    (None once the scan is complete)."""
+    body = {
+        "status": "success" if error is None else "partial",
+        "node_id": node.node_id,
+        "count": len(entries),
+        "entries": entries,
+        "nodes": nodes,
+        "next": encode_token(state, position) if position is not None else None,
+    }
+    if error is not None:
+        body["message"] = error
+    return body
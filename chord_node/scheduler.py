@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+
+from metrics import MAINTENANCE_LATENCY
+
+STABILIZE_INTERVAL_MIN = float(os.getenv("STABILIZE_INTERVAL_MIN", "0.5"))  # seconds, right after churn
+STABILIZE_INTERVAL_MAX = float(os.getenv("STABILIZE_INTERVAL_MAX", "8"))  # seconds, on a quiet ring
+FIX_FINGERS_INTERVAL_MIN = float(os.getenv("FIX_FINGERS_INTERVAL_MIN", "0.5"))
+FIX_FINGERS_INTERVAL_MAX = float(os.getenv("FIX_FINGERS_INTERVAL_MAX", "30"))
+FINGERS_PER_TICK = int(os.getenv("FINGERS_PER_TICK", "8"))  # finger lookups per fix_fingers run
+MAINTENANCE_BACKOFF = float(os.getenv("MAINTENANCE_BACKOFF", "1.5"))  # interval growth per quiet run
+MAINTENANCE_POLL = min(STABILIZE_INTERVAL_MIN, FIX_FINGERS_INTERVAL_MIN)  # longest sleep between churn checks
+
+
+class Task:
+    """One periodic maintenance job whose interval adapts to churn."""
+
+    def __init__(self, name, run, low, high):
+        self.name = name
+        self.run = run
+        self.low = low
+        self.high = high
+        self.interval = low
+        self.due = 0.0
+        self.runs = 0
+        self.last_run = None
+        self.last_duration = 0.0
+        self.rpcs = 0  # lookups made by the job, when it reports them
+
+    def accelerate(self, now):
+        self.interval = self.low
+        self.due = min(self.due, now)
+
+    def stats(self, now):
+        return {
+            "interval": round(self.interval, 3),
+            "next_in": round(max(0.0, self.due - now), 3),
+            "last_run_ago": round(now - self.last_run, 3) if self.last_run else None,
+            "last_duration": round(self.last_duration, 4),
+            "runs": self.runs,
+            "rpcs": self.rpcs,
+        }
+
+
+class MaintenanceScheduler:
+    """Decides when a node runs stabilize / check_predecessor and fix_fingers.
+
+    Churn is read from the node's routing version, which only moves when
+    routing actually changes (a join or departure seen through notify or
+    stabilize, a failed RPC handled by peer_failed, a finger that now points
+    elsewhere). A run that leaves the version where it was backs its task
+    off by MAINTENANCE_BACKOFF up to the task's maximum interval; any change,
+    including one made by a request thread between runs, drops every task
+    back to its minimum interval and makes it due at once. fix_fingers
+    refreshes FINGERS_PER_TICK entries per run (see ChordNode.fix_fingers).
+    """
+
+    def __init__(self, node, fingers_per_tick=FINGERS_PER_TICK):
+        self.node = node
+        self.fingers_per_tick = fingers_per_tick
+        self.tasks = [
+            Task("stabilize", self._stabilize, STABILIZE_INTERVAL_MIN, STABILIZE_INTERVAL_MAX),
+            Task("fix_fingers", self._fix_fingers, FIX_FINGERS_INTERVAL_MIN, FIX_FINGERS_INTERVAL_MAX),
+        ]
+        if getattr(node, "proximity", None) is not None:
+            # Candidate discovery and RTT probes for proximity routing ride on the finger schedule
+            self.tasks.append(Task("proximity", node.proximity.refresh, FIX_FINGERS_INTERVAL_MIN,
+                                   FIX_FINGERS_INTERVAL_MAX))
+        self.seen_version = None
+        self.churn_events = 0
+        self._lock = threading.Lock()
+
+    def _stabilize(self):
+        self.node.stabilize()
+        self.node.check_predecessor()
+        return 0
+
+    def _fix_fingers(self):
+        return self.node.fix_fingers(self.fingers_per_tick)
+
+    def _check_churn(self, now):
+        """Make every task due at its minimum interval if routing changed
+        since the last check."""
+        version = self.node.routing.version
+        if version == self.seen_version:
+            return False
+        if self.seen_version is not None:
+            self.churn_events += 1
+        self.seen_version = version
+        for task in self.tasks:
+            task.accelerate(now)
+        return True
+
+    def run_due(self):
+        """Run every task that is due; returns seconds until the next one."""
+        with self._lock:
+            now = time.time()
+            self._check_churn(now)
+            for task in self.tasks:
+                if task.due > now:
+                    continue
+                started = time.time()
+                try:
+                    task.rpcs += task.run() or 0
+                except Exception as e:
+                    print(f"[Background Thread Error] {task.name}: {e}")
+                now = time.time()
+                task.runs += 1
+                task.last_run = now
+                task.last_duration = now - started
+                MAINTENANCE_LATENCY.observe(task.last_duration, task.name)
+                if not self._check_churn(now):
+                    task.interval = min(task.high, task.interval * MAINTENANCE_BACKOFF)
+                task.due = now + task.interval
+            return max(0.0, min(task.due for task in self.tasks) - time.time())
+
+    def stats(self):
+        now = time.time()
+        return {
+            "routing_version": self.seen_version,
+            "churn_events": self.churn_events,
+            "fingers_per_tick": self.fingers_per_tick,
+            **{task.name: task.stats(now) for task in self.tasks},
+        }
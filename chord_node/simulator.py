@@ -0,0 +1,480 @@
+"""In-process ring simulator: many ChordNodes in one process, no HTTP.
+
+Every node's PeerClient is replaced by a transport that hands the call to
+the addressed node's handler (dispatch.py): DirectTransport delivers it at
+once, SimulatedNetwork adds a seeded latency and loss and keeps a virtual
+clock. Runs are repeatable for a given seed: peers, keys and maintenance
+order come from one random.Random, background work runs inline and joins
+resolve one lookup at a time.
+
+Usage: python simulator.py [--nodes 1000] [--churn 10] [--latency 0.02] ...
+"""
+import argparse
+import bisect
+import contextlib
+import io
+import json
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Executor, Future
+from types import SimpleNamespace
+
+import requests
+
+from dispatch import dispatch
+from fingers import FingerTable
+from hashing import RingHasher
+from rpc import RTT_KINDS, RttTable, peer_address, peer_params
+from vnodes import VirtualNodeHost
+
+
+class InlineExecutor(Executor):
+    """Runs submitted work immediately, in the caller's thread."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+        return future
+
+
+class SimResponse:
+    """The parts of requests.Response that ChordNode uses."""
+
+    request = SimpleNamespace(body=None)  # push_keys reads the sent body for metrics
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    @property
+    def text(self):
+        return json.dumps(self._payload)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code}: {self.text}", response=self)
+
+    def iter_lines(self):
+        # A streamed answer (/transfer_keys_stream) is a list of chunks, one per line
+        for chunk in self._payload:
+            yield json.dumps(chunk).encode()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _copy(payload):
+    """Round-trip through JSON, as a real call would: no shared dicts, tuples become lists."""
+    return json.loads(json.dumps(payload)) if payload is not None else None
+
+
+class DirectTransport:
+    """PeerClient stand-in that calls the addressed node in-process.
+
+    Calls to a crashed host raise requests.ConnectionError, like a refused
+    connection. calls counts delivered RPCs by path. rtt is shared by every
+    node on the transport, which is exact while latency depends only on the
+    callee (see SimulatedNetwork).
+    """
+
+    def __init__(self):
+        self.network = None
+        self.calls = Counter()
+        self.clock = 0.0  # simulated seconds spent on the network
+        self.rtt = RttTable()
+        self._lock = threading.Lock()
+
+    def attach(self, network):
+        self.network = network
+
+    def _deliver(self, address, kind):
+        """Hook for network effects; raises to drop the call, else returns
+        the simulated round trip in seconds (None when there is none)."""
+
+    def request(self, method, peer, path, kind="routing", params=None, **kwargs):
+        address = peer_address(peer)
+        host = self.network.hosts.get(address)
+        if host is None or address in self.network.down:
+            raise requests.ConnectionError(f"{address} is unreachable")
+        elapsed = self._deliver(address, kind)
+        if elapsed is not None and kind in RTT_KINDS:
+            self.rtt.observe(address, elapsed)
+        params = peer_params(peer, params)
+        vnode = host.resolve(params.get("vnode") if params else None)
+        body = kwargs.get("json")
+        if body is None and kwargs.get("data") is not None:
+            body = kwargs["data"]
+        with self._lock:
+            self.calls[path.split("/")[1]] += 1
+        status, payload = dispatch(vnode, path, dict(params or {}), _copy(body))
+        return SimResponse(status, _copy(payload))
+
+    def get(self, peer, path, params=None, kind="routing", **kwargs):
+        return self.request("GET", peer, path, kind=kind, params=params, **kwargs)
+
+    def post(self, peer, path, json=None, data=None, params=None, kind="maintenance", **kwargs):
+        return self.request("POST", peer, path, kind=kind, json=json, data=data, params=params, **kwargs)
+
+    def drop(self, peer):
+        pass
+
+    def close(self):
+        pass
+
+    def total_calls(self):
+        with self._lock:
+            return sum(self.calls.values())
+
+
+class SimulatedNetwork(DirectTransport):
+    """DirectTransport with a per-call round trip of latency + U(0, jitter)
+    simulated seconds and a loss probability (a lost call raises
+    requests.ConnectionError, as a timeout would). A seeded slow_fraction of
+    hosts add slow_latency to every call they receive, which gives proximity
+    routing something to avoid."""
+
+    def __init__(self, latency=0.02, jitter=0.0, loss=0.0, seed=0, slow_fraction=0.0, slow_latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.seed = seed
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.rng = random.Random(seed)
+        self.lost = 0
+
+    def is_slow(self, address):
+        return random.Random(f"{self.seed}:{address}").random() < self.slow_fraction
+
+    def _deliver(self, address, kind):
+        with self._lock:
+            if self.loss and self.rng.random() < self.loss:
+                self.lost += 1
+                raise requests.ConnectionError(f"call to {address} lost")
+            elapsed = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0.0)
+            if self.slow_fraction and self.is_slow(address):
+                elapsed += self.slow_latency
+            self.clock += elapsed
+            return elapsed
+
+
+class Simulator:
+    """A ring of VirtualNodeHosts wired to one transport.
+
+    build() puts hosts on the ring with their routing set directly to the
+    correct state, which is how large rings are started; join(), fail() and
+    depart() then change membership through the real protocol, and
+    converge() runs maintenance rounds (each vnode's scheduler tasks, once
+    per round) until routing is correct again.
+    """
+
+    def __init__(self, m=32, vnodes=1, transport=None, seed=0, quiet=True):
+        self.m = m
+        self.vnodes = vnodes
+        self.rng = random.Random(seed)
+        self.quiet = quiet
+        self.transport = transport or DirectTransport()
+        self.transport.attach(self)
+        self.hosts = {}  # address -> VirtualNodeHost, every host ever created
+        self.members = []  # addresses currently on the ring, in join order
+        self.down = set()  # addresses of crashed hosts
+        self._vnodes = {}  # node_id -> vnode of every host ever created
+        self._next_index = 0
+        self.inline = InlineExecutor()
+
+    @contextlib.contextmanager
+    def _running(self):
+        """Run protocol code: quietly unless asked otherwise, and with room
+        for the deep call chains of in-process RPCs. The recursion limit is
+        restored afterwards."""
+        limit = sys.getrecursionlimit()
+        sys.setrecursionlimit(max(limit, 20000))
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) if self.quiet else contextlib.nullcontext():
+                yield
+        finally:
+            sys.setrecursionlimit(limit)
+
+    def add_host(self):
+        """Create a host (not yet on the ring) whose IDs collide with no other host's."""
+        while True:
+            index = self._next_index
+            self._next_index += 1
+            ip = f"10.{index >> 16 & 255}.{index >> 8 & 255}.{index & 255}"
+            host = VirtualNodeHost(ip, 5000, self.m, count=self.vnodes)
+            if not self._vnodes.keys() & host.vnodes.keys():
+                break
+        self._vnodes.update(host.vnodes)
+        for vnode in host:
+            vnode.rpc = self.transport
+            vnode.background = vnode.replica_pool = self.inline
+            vnode.lookup_cache = None  # its wall-clock TTL would make runs differ between machines
+            vnode.join_parallelism = 1  # joins resolve their lookups one at a time so that runs repeat exactly
+        self.hosts[host.address()] = host
+        return host
+
+    def ring(self):
+        """(node_id, vnode) of every vnode on the ring, in ring order."""
+        return sorted((vnode.node_id, vnode) for address in self.members for vnode in self.hosts[address]
+                      if vnode.successor is not None)
+
+    def _expected(self, ring):
+        """Correct (successor_list, predecessor, fingers) per node ID for a ring."""
+        ids = [node_id for node_id, _ in ring]
+        peers = [vnode.as_dict() for _, vnode in ring]
+        count = len(ring)
+        expected = {}
+        for position, (node_id, vnode) in enumerate(ring):
+            successors = [peers[(position + k) % count] for k in range(1, min(vnode.successor_list_size, count - 1) + 1)]
+            fingers = [peers[bisect.bisect_left(ids, start) % count] for start in vnode.finger_starts]
+            expected[node_id] = (successors or [peers[position]], peers[position - 1], fingers)
+        return expected
+
+    def build(self, count):
+        """Put count new hosts on the ring with correct routing, without any RPC."""
+        for _ in range(count):
+            self.members.append(self.add_host().address())
+        for node_id, (successors, predecessor, fingers) in self._expected(self.ring()).items():
+            vnode = self.node(node_id)
+            vnode.update_routing(successor=successors[0], predecessor=predecessor, successor_list=successors,
+                                 finger_table=FingerTable.build(node_id, self.m, fingers, vnode.finger_starts))
+
+    def node(self, node_id):
+        return self._vnodes.get(node_id)
+
+    def owner(self, entry, key):
+        """The vnode responsible for key, as resolved from entry."""
+        key_id = entry.hash_key(key)
+        if entry.is_responsible(key_id):
+            return entry
+        with self._running():
+            return self.node(entry.find_successor(key_id)["node_id"])
+
+    def store(self, entry, key, value, w=1):
+        """What POST /store/<key> does when sent to entry; returns the copies written."""
+        owner = self.owner(entry, key)
+        with self._running():
+            if owner is not entry:
+                entry.invalidate_cached([key])
+            return owner.store_owned({key: value}, w)
+
+    def lookup(self, entry, key, r=1):
+        """What GET /lookup/<key> does when sent to entry; returns (value, version, copies)."""
+        cache = entry.read_cache if r == 1 and not entry.is_responsible(entry.hash_key(key)) else None
+        if cache is None:
+            return self.owner(entry, key).quorum_read(key, r)
+        cached = cache.get(key)
+        if cached is not None:
+            return cached[0], cached[1], 1
+        owner = self.owner(entry, key)
+        owner.cache_readers.add(key, entry.address())
+        value, version, copies = owner.quorum_read(key, r)
+        if value is not None:
+            cache.put(key, value, version)
+        return value, version, copies
+
+    def join(self, count):
+        """Join count new hosts through the protocol, each via a random member."""
+        joined = 0
+        for _ in range(count):
+            host = self.add_host()
+            bootstrap = self.rng.choice(self.members) if self.members else None
+            with self._running():
+                ok = host.join(bootstrap)
+            if ok or host.stranded:
+                # A host whose rollback failed still has vnodes on the ring to maintain
+                self.members.append(host.address())
+            joined += ok
+        return joined
+
+    def fail(self, count):
+        """Crash count random members: they stop answering at once."""
+        for address in self.rng.sample(self.members, min(count, len(self.members) - 1)):
+            self.members.remove(address)
+            self.down.add(address)
+
+    def depart(self, count):
+        """Make count random members leave gracefully."""
+        for address in self.rng.sample(self.members, min(count, len(self.members) - 1)):
+            with self._running():
+                self.hosts[address].depart()
+            self.members.remove(address)
+
+    def run_round(self):
+        """Run every maintenance task of every vnode once, in a seeded order."""
+        vnodes = [vnode for _, vnode in self.ring()]
+        self.rng.shuffle(vnodes)
+        with self._running():
+            for vnode in vnodes:
+                for task in vnode.maintenance.tasks:
+                    try:
+                        task.run()
+                    except Exception as e:
+                        print(f"[Simulator] {task.name} on {vnode.node_id}: {e}")
+
+    def accuracy(self):
+        """Fraction of correct successors, predecessors and finger entries."""
+        expected = self._expected(self.ring())
+        successors = predecessors = fingers = 0
+        for node_id, (successor_list, predecessor, finger_peers) in expected.items():
+            routing = self.node(node_id).routing
+            successors += routing.successor is not None and routing.successor["node_id"] == successor_list[0]["node_id"]
+            predecessors += routing.predecessor is not None and routing.predecessor["node_id"] == predecessor["node_id"]
+            fingers += sum(actual == wanted["node_id"]
+                           for actual, wanted in zip(routing.finger_table.successor_ids(), finger_peers))
+        count = len(expected) or 1
+        return {
+            "successors": successors / count,
+            "predecessors": predecessors / count,
+            "fingers": fingers / (count * self.m),
+        }
+
+    def converge(self, max_rounds=100):
+        """Run rounds until routing is correct; returns the rounds it took.
+
+        ring_rounds is when every successor and predecessor was right,
+        finger_rounds when every finger entry was too (None if not reached).
+        """
+        calls = self.transport.total_calls()
+        ring_rounds = finger_rounds = None
+        state = self.accuracy()
+        rounds = 0
+        while rounds < max_rounds:
+            if ring_rounds is None and state["successors"] == state["predecessors"] == 1:
+                ring_rounds = rounds
+            if state["fingers"] == 1 and ring_rounds is not None:
+                finger_rounds = rounds
+                break
+            self.run_round()
+            rounds += 1
+            state = self.accuracy()
+        if ring_rounds is None and state["successors"] == state["predecessors"] == 1:
+            ring_rounds = rounds
+        if finger_rounds is None and state["fingers"] == 1 and ring_rounds is not None:
+            finger_rounds = rounds
+        return {"ring_rounds": ring_rounds, "finger_rounds": finger_rounds, "rounds": rounds,
+                "rpcs": self.transport.total_calls() - calls, **state}
+
+    def lookups(self, samples=1000, mode="recursive"):
+        """Resolve random ring IDs from random vnodes; hop counts are RPCs per lookup."""
+        ring = self.ring()
+        ids = [node_id for node_id, _ in ring]
+        hops, latencies = [], []
+        correct = 0
+        for _ in range(samples):
+            key_id = self.rng.randrange(1 << self.m)
+            origin = self.rng.choice(ring)[1]
+            calls, clock = self.transport.total_calls(), self.transport.clock
+            with self._running():
+                if mode == "iterative":
+                    owner = origin.find_successor_iterative(key_id, use_cache=False)
+                else:
+                    owner = origin.find_successor(key_id)
+            hops.append(self.transport.total_calls() - calls)
+            latencies.append(self.transport.clock - clock)
+            correct += owner["node_id"] == ids[bisect.bisect_left(ids, key_id) % len(ids)]
+        return {
+            "samples": samples,
+            "correct": correct / samples,
+            "hops_mean": statistics.fmean(hops),
+            "hops_p50": _percentile(hops, 50),
+            "hops_p99": _percentile(hops, 99),
+            "hops_max": max(hops),
+            "latency_mean": statistics.fmean(latencies),
+        }
+
+    def key_balance(self, keys=100000):
+        """How evenly keys key0..keyN would spread over the member hosts."""
+        ring = self.ring()
+        ids = [node_id for node_id, _ in ring]
+        owners = [vnode for _, vnode in ring]
+        per_host = Counter({address: 0 for address in self.members})
+        for key_id in RingHasher(self.m).key_ids([f"key{i}" for i in range(keys)]):
+            owner = owners[bisect.bisect_left(ids, key_id) % len(ids)]
+            per_host[f"{owner.ip}:{owner.port}"] += 1
+        counts = list(per_host.values())
+        mean = statistics.fmean(counts)
+        return {
+            "keys": keys,
+            "hosts": len(counts),
+            "mean": mean,
+            "min": min(counts),
+            "max": max(counts),
+            "max_over_mean": max(counts) / mean,
+            "stdev_over_mean": statistics.pstdev(counts) / mean,
+        }
+
+
+def _percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def report(title, values):
+    print(title)
+    for name, value in values.items():
+        print(f"  {name:<16} {value:.4g}" if isinstance(value, float) else f"  {name:<16} {value}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=1000, help="hosts on the initial ring")
+    parser.add_argument("--m", type=int, default=32, help="identifier bits")
+    parser.add_argument("--vnodes", type=int, default=1, help="virtual nodes per host")
+    parser.add_argument("--lookups", type=int, default=1000, help="random lookups to sample")
+    parser.add_argument("--mode", choices=("recursive", "iterative"), default="recursive")
+    parser.add_argument("--keys", type=int, default=100000, help="keys for the balance report")
+    parser.add_argument("--churn", type=int, default=0, help="hosts to crash and to join after the first report")
+    parser.add_argument("--max-rounds", type=int, default=100, help="maintenance rounds allowed to converge")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated seconds per call")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra U(0, jitter) seconds per call")
+    parser.add_argument("--loss", type=float, default=0.0, help="probability that a call is lost")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="fraction of hosts that answer slowly")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="extra seconds per call to a slow host")
+    parser.add_argument("--warmup", type=int, default=0,
+                        help="maintenance rounds before the first report (lets proximity routing measure peers)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.latency or args.jitter or args.loss or args.slow_fraction:
+        transport = SimulatedNetwork(args.latency, args.jitter, args.loss, args.seed,
+                                     args.slow_fraction, args.slow_latency)
+    else:
+        transport = DirectTransport()
+    sim = Simulator(m=args.m, vnodes=args.vnodes, transport=transport, seed=args.seed)
+
+    started = time.perf_counter()
+    sim.build(args.nodes)
+    print(f"{args.nodes} hosts x {args.vnodes} vnodes, m={args.m}, built in {time.perf_counter() - started:.1f}s")
+    for _ in range(args.warmup):
+        sim.run_round()
+    report("key balance", sim.key_balance(args.keys))
+    report(f"{args.mode} lookups", sim.lookups(args.lookups, args.mode))
+
+    if args.churn:
+        started = time.perf_counter()
+        sim.fail(args.churn)
+        joined = sim.join(args.churn)
+        print(f"churn: {args.churn} crashed, {joined} joined in {time.perf_counter() - started:.1f}s")
+        report("convergence", sim.converge(args.max_rounds))
+        report(f"{args.mode} lookups after churn", sim.lookups(args.lookups, args.mode))
+    print(f"simulated network time {transport.clock:.1f}s, {transport.total_calls()} RPCs, "
+          f"wall time {time.process_time():.1f}s CPU")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "2"))  # seconds a gathered snapshot is served from cache
+SNAPSHOT_PARALLELISM = int(os.getenv("SNAPSHOT_PARALLELISM", "16"))  # concurrent /node_info calls
+SNAPSHOT_HISTORY = int(os.getenv("SNAPSHOT_HISTORY", "32"))  # past versions kept for diffs
+
+# The /node_info fields that make a node count as changed; counters such as
+# data_count or cache stats move with every request and are left out
+TOPOLOGY_FIELDS = ("successor", "predecessor", "successor_list", "finger_table", "vnodes")
+
+
+def fingerprint(state):
+    return json.dumps([state.get(field) for field in TOPOLOGY_FIELDS], sort_keys=True)
+
+
+class RingSnapshot:
+    """The /node_info of every node reachable from one node, gathered in
+    parallel and cached.
+
+    Discovery is breadth first: each wave fetches every newly seen node at
+    once (SNAPSHOT_PARALLELISM calls at a time) and learns further nodes from
+    their successor, predecessor and finger peers, so a ring of N nodes takes
+    about log N waves and a slow node delays only its own wave. There is no
+    cap on the ring size.
+
+    A gathered snapshot is reused for SNAPSHOT_TTL seconds, and concurrent
+    callers share one gather. Every snapshot whose topology differs from the
+    previous one gets a new version; the fingerprints of the last
+    SNAPSHOT_HISTORY versions are kept so that a caller can ask for only the
+    nodes whose routing changed since the version it already has.
+    """
+
+    def __init__(self, node, ttl=SNAPSHOT_TTL, parallelism=SNAPSHOT_PARALLELISM, history=SNAPSHOT_HISTORY):
+        self.node = node
+        self.ttl = ttl
+        self.parallelism = parallelism
+        self.version = 0
+        self.taken_at = 0.0
+        self.states = {}  # node_id -> node_info of the current version
+        self.unreachable = []
+        self._history = OrderedDict()  # version -> {node_id: fingerprint}
+        self._history_size = history
+        self._lock = threading.Lock()
+
+    def _fetch(self, peer):
+        try:
+            resp = self.node.rpc.get(peer, "/node_info", kind="state")
+            if resp.status_code == 200:
+                return resp.json()
+        except requests.RequestException as e:
+            print(f"Error fetching node state: {e}")
+        return None
+
+    def gather(self):
+        """Fetch the state of every reachable node; returns (states, unreachable)."""
+        states = {}
+        unreachable = []
+        seen = {self.node.node_id}
+        wave = [self.node.as_dict()]
+        with ThreadPoolExecutor(max_workers=self.parallelism) as pool:
+            while wave:
+                found = []
+                for peer, state in zip(wave, pool.map(self._fetch, wave)):
+                    if state is None:
+                        unreachable.append(peer["node_id"])
+                        continue
+                    states[state["node_id"]] = state
+                    neighbours = [state.get("successor"), state.get("predecessor")]
+                    neighbours.extend(state.get("finger_peers", []))
+                    for neighbour in neighbours:
+                        if neighbour and neighbour.get("node_id") is not None and neighbour["node_id"] not in seen:
+                            seen.add(neighbour["node_id"])
+                            found.append(neighbour)
+                wave = found
+        return states, unreachable
+
+    def refresh(self, force=False):
+        """Gather a new snapshot unless the cached one is younger than the TTL."""
+        with self._lock:
+            if not force and time.time() - self.taken_at < self.ttl:
+                return
+            states, unreachable = self.gather()
+            prints = {node_id: fingerprint(state) for node_id, state in states.items()}
+            previous = self._history.get(self.version)
+            if prints != previous:
+                self.version += 1
+                self._history[self.version] = prints
+                while len(self._history) > self._history_size:
+                    self._history.popitem(last=False)
+            self.states = states
+            self.unreachable = unreachable
+            self.taken_at = time.time()
+
+    def view(self, since=None, force=False):
+        """The current snapshot as a JSON-ready dict.
+
+        With since=<version> still in the history, only the nodes that were
+        added or whose routing changed after it are listed, plus the IDs of
+        removed ones and every node's current data_count.
+        """
+        self.refresh(force)
+        with self._lock:
+            result = {
+                "version": self.version,
+                "age": round(time.time() - self.taken_at, 3),
+                "unreachable": self.unreachable,
+            }
+            old = self._history.get(since) if since is not None else None
+            if old is None:
+                result["nodes"] = [self.states[node_id] for node_id in sorted(self.states)]
+                return result
+            current = self._history[self.version]
+            result["since"] = since
+            result["nodes"] = [self.states[node_id] for node_id in sorted(current)
+                               if old.get(node_id) != current[node_id]]
+            result["removed"] = sorted(node_id for node_id in old if node_id not in current)
+            # Key counts are not in the fingerprint, so every node's is sent along
+            result["data_counts"] = {node_id: self.states[node_id].get("data_count") for node_id in sorted(current)}
+            return result
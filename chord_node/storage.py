@@ -0,0 +1,375 @@
+import os
+import struct
+import threading
+import time
+import zlib
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "memory")  # "memory", "log" or "sqlite" (keystore.SqliteKeyStore)
+DATA_DIR = os.getenv("DATA_DIR", "data")
+COMPACT_INTERVAL = float(os.getenv("COMPACT_INTERVAL", "30"))  # seconds between compaction checks
+COMPACT_RATIO = float(os.getenv("COMPACT_RATIO", "0.5"))  # dead fraction of the log that triggers compaction
+COMPACT_MIN_BYTES = int(os.getenv("COMPACT_MIN_BYTES", str(4 * 1024 * 1024)))
+STORAGE_FSYNC = os.getenv("STORAGE_FSYNC", "False").lower() == "true"
+
+
+class StorageBackend:
+    """Where a KeyStore keeps its values.
+
+    Backends store each value together with the key's ring ID so that the
+    KeyStore's ring index can be rebuilt at startup without re-hashing.
+    """
+
+    def get(self, key, default=None):
+        raise NotImplementedError
+
+    def put(self, key, key_id, value):
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove key; returns its value or None if it was not stored."""
+        raise NotImplementedError
+
+    def entries(self):
+        """(key, key_id) for every stored key, used to rebuild the ring index."""
+        raise NotImplementedError
+
+    def items(self):
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def clear(self):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def stats(self):
+        return {"backend": type(self).__name__, "keys": len(self)}
+
+
+class MemoryBackend(StorageBackend):
+    """Plain in-memory dict; nothing survives a restart."""
+
+    def __init__(self):
+        self._values = {}
+        self._ids = {}
+
+    def get(self, key, default=None):
+        return self._values.get(key, default)
+
+    def put(self, key, key_id, value):
+        self._values[key] = value
+        self._ids[key] = key_id
+
+    def delete(self, key):
+        self._ids.pop(key, None)
+        return self._values.pop(key, None)
+
+    def entries(self):
+        return list(self._ids.items())
+
+    def items(self):
+        return self._values.items()
+
+    def __len__(self):
+        return len(self._values)
+
+    def clear(self):
+        self._values.clear()
+        self._ids.clear()
+
+
+# Log record: crc32, op, id length, key length, value length, then the ring ID,
+# key and value bytes. The crc covers everything after itself.
+_RECORD = struct.Struct(">IBBHI")
+_OP_PUT = 1
+_OP_DELETE = 2
+
+# Hint file: magic, inode of the log it describes, log offset it covers, crc of
+# the body; then per key the value offset and length, id length, key length,
+# ring ID and key bytes.
+_HINT_MAGIC = b"CHH1"
+_HINT_HEADER = struct.Struct(">4sQQI")
+_HINT_ENTRY = struct.Struct(">QIBH")
+
+
+def _id_bytes(key_id):
+    return key_id.to_bytes((key_id.bit_length() + 7) // 8 or 1, "big")
+
+
+class LogBackend(StorageBackend):
+    """Append-only log with an in-memory index, Bitcask style.
+
+    Every put or delete appends a record to data.log; the index maps each key
+    to (key_id, value offset, value length) and reads are a single pread.
+    Overwritten and deleted records become dead bytes that a background thread
+    compacts away once they exceed COMPACT_RATIO of the log.
+
+    index.hint snapshots the index and the log offset it covers. It is written
+    after every compaction, periodically, and on close, so startup loads the
+    hint and only replays the log tail written after it.
+    """
+
+    def __init__(self, directory, compact_interval=COMPACT_INTERVAL, compact_ratio=COMPACT_RATIO,
+                 compact_min_bytes=COMPACT_MIN_BYTES, fsync=STORAGE_FSYNC):
+        self.directory = directory
+        self.compact_ratio = compact_ratio
+        self.compact_min_bytes = compact_min_bytes
+        self.fsync = fsync
+        os.makedirs(directory, exist_ok=True)
+        self.log_path = os.path.join(directory, "data.log")
+        self.hint_path = os.path.join(directory, "index.hint")
+
+        self._lock = threading.RLock()
+        self._index = {}  # key -> (key_id, value_offset, value_length)
+        self._dead_bytes = 0
+        self._hinted_size = 0
+        self.compactions = 0
+
+        self._fd = os.open(self.log_path, os.O_RDWR | os.O_CREAT | os.O_APPEND, 0o644)
+        start = time.time()
+        covered = self._load_hint()
+        self._size = self._replay(covered)
+        self.startup_seconds = time.time() - start
+
+        self._stop = threading.Event()
+        self._compactor = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compaction_loop, args=(compact_interval,),
+                                               daemon=True)
+            self._compactor.start()
+
+    # -- reading the log --------------------------------------------------
+
+    def _load_hint(self):
+        """Load index.hint into the index; returns the log offset it covers."""
+        try:
+            with open(self.hint_path, "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return 0
+        if len(blob) < _HINT_HEADER.size:
+            return 0
+        magic, inode, covered, crc = _HINT_HEADER.unpack_from(blob)
+        body = memoryview(blob)[_HINT_HEADER.size:]
+        log_stat = os.fstat(self._fd)
+        # A hint left behind by a compaction that crashed before rewriting it
+        # describes the previous log file; the inode check catches that.
+        if (magic != _HINT_MAGIC or inode != log_stat.st_ino or zlib.crc32(body) != crc
+                or covered > log_stat.st_size):
+            print(f"[Storage] Ignoring unusable hint file {self.hint_path}, replaying full log")
+            return 0
+
+        index = {}
+        live = 0
+        pos = 0
+        while pos < len(body):
+            offset, length, id_len, key_len = _HINT_ENTRY.unpack_from(body, pos)
+            pos += _HINT_ENTRY.size
+            key_id = int.from_bytes(body[pos:pos + id_len], "big")
+            pos += id_len
+            key = bytes(body[pos:pos + key_len]).decode()
+            pos += key_len
+            index[key] = (key_id, offset, length)
+            live += _RECORD.size + id_len + key_len + length
+        self._index = index
+        self._dead_bytes = max(0, covered - live)
+        self._hinted_size = covered
+        return covered
+
+    def _replay(self, offset):
+        """Apply log records from offset onwards to the index and return the
+        end of the last good record. A torn tail from a crash is truncated."""
+        end = os.fstat(self._fd).st_size
+        while offset + _RECORD.size <= end:
+            header = os.pread(self._fd, _RECORD.size, offset)
+            crc, op, id_len, key_len, value_len = _RECORD.unpack(header)
+            body_len = id_len + key_len + value_len
+            body = os.pread(self._fd, body_len, offset + _RECORD.size)
+            if len(body) < body_len or zlib.crc32(body, zlib.crc32(header[4:])) != crc:
+                break
+            key_id = int.from_bytes(body[:id_len], "big")
+            key = body[id_len:id_len + key_len].decode()
+            self._forget(key)
+            record_len = _RECORD.size + body_len
+            if op == _OP_PUT:
+                self._index[key] = (key_id, offset + _RECORD.size + id_len + key_len, value_len)
+            else:
+                self._dead_bytes += record_len
+            offset += record_len
+        if offset < end:
+            print(f"[Storage] Truncating {end - offset} bytes of incomplete log tail")
+            os.ftruncate(self._fd, offset)
+        return offset
+
+    def _forget(self, key):
+        """Drop key from the index, counting its old record as dead."""
+        old = self._index.pop(key, None)
+        if old is not None:
+            key_id, _, length = old
+            self._dead_bytes += _RECORD.size + len(_id_bytes(key_id)) + len(key.encode()) + length
+        return old
+
+    # -- StorageBackend ---------------------------------------------------
+
+    def _append(self, op, key, key_id, value=b""):
+        id_raw = _id_bytes(key_id)
+        key_raw = key.encode()
+        header = _RECORD.pack(0, op, len(id_raw), len(key_raw), len(value))
+        body = id_raw + key_raw + value
+        crc = zlib.crc32(body, zlib.crc32(header[4:]))
+        os.write(self._fd, _RECORD.pack(crc, op, len(id_raw), len(key_raw), len(value)) + body)
+        if self.fsync:
+            os.fsync(self._fd)
+        offset = self._size
+        self._size += _RECORD.size + len(body)
+        return offset + _RECORD.size + len(id_raw) + len(key_raw)
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._index.get(key)
+            if entry is None:
+                return default
+            _, offset, length = entry
+            return os.pread(self._fd, length, offset).decode()
+
+    def put(self, key, key_id, value):
+        raw = value.encode()
+        with self._lock:
+            self._forget(key)
+            self._index[key] = (key_id, self._append(_OP_PUT, key, key_id, raw), len(raw))
+
+    def delete(self, key):
+        with self._lock:
+            value = self.get(key)
+            old = self._forget(key)
+            if old is None:
+                return None
+            self._append(_OP_DELETE, key, old[0])
+            self._dead_bytes += _RECORD.size + len(_id_bytes(old[0])) + len(key.encode())
+            return value
+
+    def entries(self):
+        with self._lock:
+            return [(key, entry[0]) for key, entry in self._index.items()]
+
+    def items(self):
+        with self._lock:
+            keys = list(self._index)
+        for key in keys:
+            value = self.get(key)
+            if value is not None:
+                yield key, value
+
+    def __len__(self):
+        return len(self._index)
+
+    def clear(self):
+        with self._lock:
+            self._index.clear()
+            os.ftruncate(self._fd, 0)
+            self._size = 0
+            self._dead_bytes = 0
+            self._write_hint()
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            if self._fd is not None:
+                self._write_hint()
+                os.close(self._fd)
+                self._fd = None
+
+    def stats(self):
+        return {
+            "backend": "LogBackend",
+            "keys": len(self._index),
+            "log_bytes": self._size,
+            "dead_bytes": self._dead_bytes,
+            "compactions": self.compactions,
+            "startup_seconds": round(self.startup_seconds, 4)
+        }
+
+    # -- hint and compaction ----------------------------------------------
+
+    def _write_hint(self):
+        parts = []
+        for key, (key_id, offset, length) in self._index.items():
+            id_raw = _id_bytes(key_id)
+            key_raw = key.encode()
+            parts.append(_HINT_ENTRY.pack(offset, length, len(id_raw), len(key_raw)) + id_raw + key_raw)
+        body = b"".join(parts)
+        tmp = self.hint_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(_HINT_HEADER.pack(_HINT_MAGIC, os.fstat(self._fd).st_ino, self._size, zlib.crc32(body)))
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.hint_path)
+        self._hinted_size = self._size
+
+    def should_compact(self):
+        return self._size >= self.compact_min_bytes and self._dead_bytes >= self._size * self.compact_ratio
+
+    def compact(self):
+        """Rewrite the log with only live records.
+
+        Live values are copied to a new file without holding the lock; records
+        appended meanwhile are copied over and replayed under the lock just
+        before the files are swapped.
+        """
+        with self._lock:
+            snapshot = dict(self._index)
+            copied_until = self._size
+            old_fd = self._fd
+
+        tmp_path = self.log_path + ".compact"
+        new_fd = os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+        new_index = {}
+        pos = 0
+        for key, (key_id, offset, length) in snapshot.items():
+            id_raw = _id_bytes(key_id)
+            key_raw = key.encode()
+            value = os.pread(old_fd, length, offset)
+            header = _RECORD.pack(0, _OP_PUT, len(id_raw), len(key_raw), length)
+            body = id_raw + key_raw + value
+            crc = zlib.crc32(body, zlib.crc32(header[4:]))
+            os.write(new_fd, _RECORD.pack(crc, _OP_PUT, len(id_raw), len(key_raw), length) + body)
+            new_index[key] = (key_id, pos + _RECORD.size + len(id_raw) + len(key_raw), length)
+            pos += _RECORD.size + len(body)
+
+        with self._lock:
+            tail = os.pread(old_fd, self._size - copied_until, copied_until)
+            os.write(new_fd, tail)
+            os.fsync(new_fd)
+            os.replace(tmp_path, self.log_path)
+            self._fd = new_fd
+            self._index = new_index
+            self._dead_bytes = 0
+            self._size = self._replay(pos)
+            os.close(old_fd)
+            self._write_hint()
+            self.compactions += 1
+
+    def _compaction_loop(self, interval):
+        while not self._stop.wait(interval):
+            try:
+                if self.should_compact():
+                    self.compact()
+                elif self._size != self._hinted_size:
+                    with self._lock:
+                        self._write_hint()
+            except Exception as e:
+                print(f"[Storage] Compaction error: {e}")
+
+
+def open_backend(node_id, kind=None, data_dir=None):
+    """Create the storage backend selected by STORAGE_BACKEND for a node."""
+    kind = kind or STORAGE_BACKEND
+    if kind == "memory":
+        return MemoryBackend()
+    if kind == "log":
+        return LogBackend(os.path.join(data_dir or DATA_DIR, str(node_id)))
+    raise ValueError(f"Unknown storage backend: {kind}")
@@ -0,0 +1,16 @@
+import asyncio
+
+from async_node import AsyncChordNode
+from vnodes import VirtualNodeHost
+
+
+def test_lookup_hops_to_sibling_in_process(monkeypatch):
+    host = VirtualNodeHost("127.0.0.1", 5000, m=16, count=2, node_class=AsyncChordNode)
+    primary = host.primary
+    sibling = next(vnode for vnode in host if vnode is not primary)
+    owner = {"node_id": 7, "ip": "10.0.0.1", "port": 5000}
+    monkeypatch.setattr(primary, "next_hop", lambda key_id: (None, sibling.as_dict()))
+    monkeypatch.setattr(sibling, "next_hop", lambda key_id: (owner, None))
+    # The client session is never started, so a loopback HTTP call would fail
+    assert asyncio.run(primary.find_successor_async(5)) == owner
+    assert asyncio.run(primary._forward_lookup_async(5, 0)) == owner
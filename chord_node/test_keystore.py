@@ -0,0 +1,40 @@
+import pytest
+
+import keystore
+from hashing import RingHasher
+from keystore import SqliteKeyStore, open_store
+
+
+def test_readers_are_shared_between_workers(tmp_path):
+    # Each worker process opens the node's database on its own
+    path = str(tmp_path / "store.sqlite")
+    first = SqliteKeyStore(path, RingHasher(16))
+    second = SqliteKeyStore(path, RingHasher(16))
+    first.readers.add("a", "10.0.0.1:5000")
+    first.readers.add("b", "10.0.0.1:5000")
+    second.readers.add("a", "10.0.0.2:5000")
+    assert len(second.readers) == 2
+    popped = second.readers.pop(["a"])
+    assert {address: sorted(keys) for address, keys in popped.items()} == {
+        "10.0.0.1:5000": ["a"], "10.0.0.2:5000": ["a"]}
+    assert first.readers.pop(["a"]) == {}
+    assert first.readers.pop(["b"]) == {"10.0.0.1:5000": ["b"]}
+
+
+def test_readers_are_bounded(tmp_path):
+    store = SqliteKeyStore(str(tmp_path / "store.sqlite"), RingHasher(16))
+    store.readers.max_entries = 10
+    for i in range(store.readers.TRIM_EVERY):
+        store.readers.add(f"key{i}", "10.0.0.1:5000")
+    assert len(store.readers) == 10
+    # The most recently read keys are the ones kept
+    last = f"key{store.readers.TRIM_EVERY - 1}"
+    assert store.readers.pop([last]) == {"10.0.0.1:5000": [last]}
+
+
+@pytest.mark.parametrize("backend, kept", [("log", True), ("sqlite", True), ("memory", False)])
+def test_shared_store_survives_restart(tmp_path, monkeypatch, backend, kept):
+    monkeypatch.setattr(keystore, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(keystore, "STORAGE_BACKEND", backend)
+    open_store(7, RingHasher(16), shared=True).put("a", "1")
+    assert open_store(7, RingHasher(16), shared=True).get("a") == ("1" if kept else None)
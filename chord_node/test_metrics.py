@@ -0,0 +1,23 @@
+import os
+
+from metrics import Counter, Histogram, Registry
+
+
+def test_workers_are_summed(tmp_path):
+    registry = Registry()
+    requests = registry.register(Counter("requests_total", "Requests.", ("route",)))
+    latency = registry.register(Histogram("latency_seconds", "Latency.", buckets=(0.1, 1)))
+    registry.share(str(tmp_path))
+    # Another worker's snapshot, as its _flush would have written it
+    (tmp_path / "1.json").write_text('{"requests_total": [[["/lookup"], 3]], '
+                                     '"latency_seconds": [[[], [1, 0, 1, 0.05]]]}')
+    requests.inc("/lookup")
+    requests.inc("/store")
+    latency.observe(0.5)
+    text = registry.render()
+    assert 'requests_total{route="/lookup"} 4' in text
+    assert 'requests_total{route="/store"} 1' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1"} 2' in text
+    assert "latency_seconds_count 2" in text
+    assert os.path.exists(tmp_path / f"{os.getpid()}.json")
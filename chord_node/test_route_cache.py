@@ -0,0 +1,43 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from node import ChordNode
+from route_cache import RouteCache
+
+OWNER = {"node_id": 300, "ip": "10.0.0.2", "port": 5000}
+
+
+def test_ranges_of_one_owner_widen():
+    cache = RouteCache(ttl=60)
+    cache.put(199, OWNER)
+    cache.put(249, OWNER)  # inside the known range
+    assert cache.get(200) == OWNER
+    cache.put(99, OWNER)  # covers the known range
+    assert cache.get(150) == OWNER
+    assert cache.get(99) is None
+
+
+def test_nearby_lookups_share_one_query(monkeypatch):
+    node = ChordNode("127.0.0.1", 5000, m=16)
+    hop = {"node_id": 100, "ip": "10.0.0.1", "port": 5000}
+    monkeypatch.setattr(node, "next_hop", lambda key_id: (None, hop))
+    forwarded = []
+    release = threading.Event()
+
+    def forward(key_id, hops):
+        forwarded.append(key_id)
+        release.wait(5)
+        return OWNER
+
+    monkeypatch.setattr(node, "_forward_lookup", forward)
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        lead = pool.submit(node.find_successor, 200)
+        while not forwarded:
+            time.sleep(0.01)
+        # 250 is settled by the answer for 200; 150 may belong to a node before 200
+        followers = [pool.submit(node.find_successor, key_id) for key_id in (250, 150)]
+        time.sleep(0.2)
+        release.set()
+        assert [future.result() for future in [lead] + followers] == [OWNER] * 3
+    assert forwarded == [200, 150]
@@ -0,0 +1,32 @@
+import sys
+
+import pytest
+
+import node
+from simulator import Simulator
+
+node_parallelism = node.JOIN_PARALLELISM
+
+
+@pytest.mark.parametrize("seed", [1, 5])
+def test_vnodes_converge_after_churn(seed):
+    # With these seeds some joins run into crashed peers and are rolled back
+    sim = Simulator(m=24, vnodes=4, seed=seed)
+    sim.build(40)
+    sim.fail(8)
+    assert sim.join(8) < 8
+    result = sim.converge(max_rounds=30)
+    assert result["ring_rounds"] is not None
+    assert result["finger_rounds"] is not None
+    assert sim.lookups(200)["correct"] == 1
+
+
+def test_leaves_process_settings_alone():
+    limit = sys.getrecursionlimit()
+    sim = Simulator(m=16, seed=0)
+    sim.build(4)
+    sim.join(2)
+    sim.converge(max_rounds=5)
+    assert node.JOIN_PARALLELISM == node_parallelism
+    assert sys.getrecursionlimit() == limit
+    assert node.ChordNode("127.0.0.1", 5000, m=16).join_parallelism == node.JOIN_PARALLELISM
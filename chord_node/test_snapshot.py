@@ -0,0 +1,15 @@
+from node import ChordNode
+from snapshot import RingSnapshot
+
+
+def test_counters_do_not_change_the_version(monkeypatch):
+    snapshots = RingSnapshot(ChordNode("127.0.0.1", 5000, m=16), ttl=0)
+    state = {"node_id": 1, "successor": {"node_id": 2}, "data_count": 0}
+    monkeypatch.setattr(snapshots, "gather", lambda: ({1: dict(state)}, []))
+    first = snapshots.view()["version"]
+    state["data_count"] = 10
+    unchanged = snapshots.view(since=first)
+    assert (unchanged["version"], unchanged["nodes"], unchanged["data_counts"]) == (first, [], {1: 10})
+    state["successor"] = {"node_id": 3}
+    changed = snapshots.view(since=first)
+    assert (changed["version"], changed["nodes"]) == (first + 1, [state])
@@ -0,0 +1,18 @@
+from dispatch import dispatch
+from node import ChordNode
+
+
+def test_transfers_carry_versions():
+    owner = ChordNode("127.0.0.1", 5000, m=16)
+    owner.store_data("a", "new")
+    owner.versions["a"] = 7
+    chunk = next(owner.transfer_chunks((owner.node_id - 1) % (1 << 16), lower_bound=owner.node_id))
+    assert [entry[1:] for entry in chunk["entries"]] == [["a", "new", 7]]
+
+    receiver = ChordNode("127.0.0.1", 5001, m=16)
+    status, _ = dispatch(receiver, "/receive_keys", body={"entries": chunk["entries"]})
+    assert status == 200
+    assert (receiver.get_data("a"), receiver.versions["a"]) == ("new", 7)
+    # An older copy arriving later does not overwrite the newer one
+    dispatch(receiver, "/receive_keys", body={"entries": [[chunk["entries"][0][0], "a", "old", 3]]})
+    assert (receiver.get_data("a"), receiver.versions["a"]) == ("new", 7)
@@ -0,0 +1,19 @@
+import multiprocessing
+
+from vnodes import VirtualNodeHost
+
+
+def test_workers_share_the_joined_flag():
+    host = VirtualNodeHost("127.0.0.1", 5000, m=16, count=3)
+    host.share_join_state(multiprocessing.Lock(), multiprocessing.RawValue("b", 0))
+
+    def join_in_other_worker():
+        with host._join_lock:
+            host._joined.value = True
+
+    worker = multiprocessing.get_context("fork").Process(target=join_in_other_worker)
+    worker.start()
+    worker.join()
+    # Worker 0 starting up afterwards leaves the joined vnodes alone
+    host.join_siblings(wait=0)
+    assert all(vnode.successor["node_id"] == vnode.node_id for vnode in host)
@@ -0,0 +1,38 @@
+import socket
+
+from dispatch import dispatch
+from rpc import PeerClient
+from vnodes import VirtualNodeHost
+from wire import WIRE_PORT_OFFSET, WireClient, WireServer
+
+
+def unused_port():
+    """An HTTP port with nothing listening on it whose wire port is free too."""
+    while True:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        if port + WIRE_PORT_OFFSET < 65536:
+            with socket.socket() as sock:
+                try:
+                    sock.bind(("127.0.0.1", port + WIRE_PORT_OFFSET))
+                    return port
+                except OSError:
+                    continue
+
+
+def test_post_travels_over_wire():
+    # Nothing serves the HTTP port, so a fallback to HTTP would raise
+    port = unused_port()
+    host = VirtualNodeHost("127.0.0.1", port, m=16, count=1)
+    server = WireServer(host, port + WIRE_PORT_OFFSET, dispatch).start()
+    client = PeerClient(wire=WireClient())
+    try:
+        peer = {"node_id": (host.primary.node_id - 1) % (1 << 16), "ip": "127.0.0.2", "port": 5000}
+        resp = client.post(host.primary.as_dict(), "/notify", json=peer)
+        assert resp.status_code == 200
+        assert resp.json() == {"success": True}
+        assert host.primary.predecessor["node_id"] == peer["node_id"]
+    finally:
+        client.close()
+        server.close()
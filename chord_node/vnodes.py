@@ -0,0 +1,154 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import requests
+
+from node import ChordNode
+from rpc import peer_address
+
+VNODES = int(os.getenv("VNODES", "1"))  # ring positions served by this process
+
+
+class VirtualNodeHost:
+    """The virtual nodes served by one process.
+
+    Each vnode is a ChordNode with its own ring position, finger table and
+    key range; all of them share the process's HTTP endpoint, key store and
+    peer connections. Incoming requests name their vnode with a vnode query
+    parameter (added by PeerClient from the peer's node_id); requests
+    without one, e.g. from clients, go to the primary vnode. A process with
+    more vnodes owns more, smaller ranges, so VNODES can be raised on bigger
+    machines to give them a proportional share of the keys.
+    """
+
+    def __init__(self, ip, port, m=160, count=VNODES, node_class=ChordNode):
+        self.primary = node_class(ip, port, m)
+        self.vnodes = {self.primary.node_id: self.primary}
+        index = 1
+        # IDs are hashed, so with a small ring two vnodes may collide; skip those
+        while len(self.vnodes) < count and index < 4 * count:
+            vnode = node_class(ip, port, m, vnode=index, primary=self.primary)
+            self.vnodes.setdefault(vnode.node_id, vnode)
+            index += 1
+        self.primary.siblings.update(self.vnodes)
+        # Held while vnodes join; the flag says they have (on the ring, or on
+        # the primary's own ring at startup). Both are shared by worker processes
+        # after share_join_state, since a /join can reach any of them.
+        self._join_lock = threading.Lock()
+        self._joined = SimpleNamespace(value=False)
+        self.join_error = None  # why the last join failed, for /join
+        self.stranded = []  # vnodes a failed join could not take off the ring again
+
+    def __iter__(self):
+        return iter(list(self.vnodes.values()))
+
+    def __len__(self):
+        return len(self.vnodes)
+
+    def resolve(self, vnode_id):
+        """The vnode a request is addressed to; unknown or missing IDs get the primary."""
+        try:
+            return self.vnodes.get(int(vnode_id), self.primary)
+        except (TypeError, ValueError):
+            return self.primary
+
+    def share_join_state(self, lock, joined):
+        """Use a process-shared lock and flag (a multiprocessing value) for
+        joins, so that forked workers do not join the vnodes at the same time."""
+        joined.value = self._joined.value
+        self._join_lock = lock
+        self._joined = joined
+
+    def address(self):
+        return f"{self.primary.ip}:{self.primary.port}"
+
+    def join(self, bootstrap_address=None):
+        """Join every vnode to the ring through bootstrap_address.
+
+        The primary joins first; the other vnodes then join through the same
+        bootstrap node (or through the primary when this is the first node).
+        A vnode that fails is retried through the primary and the primary's
+        successors. If it still cannot join, the vnodes already on the ring
+        depart again, so the host is either fully on the ring or off it.
+        join_error says what happened when this returns False.
+        """
+        with self._join_lock:
+            self.join_error = None
+            self.stranded = []
+            if bootstrap_address is not None:
+                for vnode in self:
+                    vnode.reset_routing()
+            if not self.primary.join(bootstrap_address):
+                reason = f"Could not join through {bootstrap_address}"
+                if self.primary.successor["node_id"] == self.primary.node_id:
+                    self.join_error = reason  # got nowhere; still a ring of its own
+                else:
+                    self._leave([self.primary], reason)  # other nodes may already point at it
+                return False
+            joined = [self.primary]
+            for vnode in self:
+                if vnode is self.primary:
+                    continue
+                if not self._join_vnode(vnode, bootstrap_address):
+                    self._leave(joined, f"Virtual node {vnode.node_id} could not join")
+                    return False
+                joined.append(vnode)
+            self._joined.value = True
+            return True
+
+    def _join_vnode(self, vnode, bootstrap_address):
+        """Join one non-primary vnode, trying each entry point in turn."""
+        entries = [bootstrap_address or self.address(), self.address()]
+        entries += [peer_address(peer) for peer in self.primary.successor_list if not self.primary.is_local(peer)]
+        for entry in dict.fromkeys(entries):
+            if vnode.join(entry):
+                return True
+            vnode.reset_routing()
+        return False
+
+    def _leave(self, joined, reason):
+        """Take the vnodes of a failed join off the ring again; the others
+        are marked departed, as if they had left too."""
+        self.stranded = [vnode for vnode in reversed(joined) if not vnode.depart(all_keys=vnode is self.primary)]
+        for vnode in self:
+            if vnode not in self.stranded:
+                vnode.update_routing(successor=None, predecessor=None)
+        if self.stranded:
+            stuck = [vnode.node_id for vnode in self.stranded]
+            self.join_error = f"{reason}; virtual nodes {stuck} could not leave again and are still on the ring"
+        else:
+            self.join_error = f"{reason}; the host left the ring again"
+        print(f"[Host {self.address()}] {self.join_error}")
+
+    def join_siblings(self, wait=30):
+        """Put the other vnodes on the primary's ring once the server is up.
+
+        Used at startup so a first node, which never receives /join, still
+        spreads its vnodes around the ring. A later /join re-joins them all.
+        """
+        if len(self) == 1:
+            return
+        deadline = time.time() + wait
+        while time.time() < deadline:
+            try:
+                self.primary.rpc.get(self.address(), "/health", kind="ping")
+                break
+            except requests.RequestException:
+                time.sleep(0.5)
+        with self._join_lock:
+            if self._joined.value:
+                return
+            for vnode in self:
+                if vnode is not self.primary:
+                    vnode.join(self.address())
+            self._joined.value = True
+
+    def depart(self):
+        """Leave the ring with every vnode; the last one hands over what is left."""
+        vnodes = [vnode for vnode in self if vnode is not self.primary] + [self.primary]
+        for vnode in vnodes:
+            if not vnode.depart(all_keys=vnode is self.primary):
+                return False
+        return True
@@ -0,0 +1,474 @@
+"""Binary RPC channel for node-to-node routing and maintenance calls.
+
+With WIRE_PROTOCOL on, every node also listens on its HTTP port plus
+WIRE_PORT_OFFSET, and PeerClient sends the calls in WIRE_ROUTES there
+instead of over HTTP. The public HTTP API is unchanged.
+
+A connection is one persistent TCP socket per peer carrying length-prefixed
+frames:
+
+    length (4 bytes) | request ID (4 bytes) | kind (1 byte) | body
+
+length counts everything after itself. Requests (kind 0) carry
+[route, params, body] and responses (kind 1) carry [status, payload]. The
+request ID ties a response to its request, so many calls share a socket at
+once and may complete out of order. Bodies use a small tagged binary
+encoding of JSON-like values. Peer dicts ({"node_id", "ip", "port"}) get
+their own compact tag, since they are most of what routing calls send.
+
+The server hands each request to dispatch.py (the node-to-node handlers that
+the simulator also uses) on a thread pool. A peer without a wire listener is
+reached over HTTP instead, and probed again after WIRE_RETRY seconds.
+"""
+import itertools
+import os
+import socket
+import struct
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+import requests
+
+from metrics import HTTP_LATENCY, HTTP_REQUESTS
+from rpc import MAX_PEERS, TIMEOUTS, peer_address
+
+WIRE_PROTOCOL = os.getenv("WIRE_PROTOCOL", "False").lower() == "true"  # binary RPC between nodes
+WIRE_PORT_OFFSET = int(os.getenv("WIRE_PORT_OFFSET", "10000"))  # wire port = HTTP port + offset
+WIRE_WORKERS = int(os.getenv("WIRE_WORKERS", "64"))  # threads serving wire requests per process
+WIRE_RETRY = float(os.getenv("WIRE_RETRY", "30"))  # seconds before retrying a peer without a wire listener
+WIRE_MAX_FRAME = 64 << 20  # bytes; a longer frame means a corrupt stream
+
+# Calls that go over the wire, by route code (index + 1). Append only: the
+# codes are part of the protocol.
+WIRE_ROUTES = (
+    "/find_successor", "/closest_preceding_finger", "/successor", "/get_predecessor", "/notify",
+    "/update_finger_table", "/successor_list", "/find_predecessor", "/health", "/set_successor",
+    "/update_successor", "/update_predecessor", "/finger_table", "/invalidate",
+)
+ROUTE_CODES = {path: code for code, path in enumerate(WIRE_ROUTES, 1)}
+
+REQUEST, RESPONSE = 0, 1
+_HEADER = struct.Struct("!IIB")  # length, request ID, kind
+_LENGTH = struct.Struct("!I")
+_DOUBLE = struct.Struct("!d")
+_PORT = struct.Struct("!H")
+_NONE, _FALSE, _TRUE, _UINT, _NINT, _FLOAT, _STR, _LIST, _DICT, _PEER4, _PEER = range(11)
+_PEER_KEYS = frozenset(("node_id", "ip", "port"))
+
+
+def _varint(n, out):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _read_varint(buf, pos):
+    n = shift = 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+
+def _uint(n, out):
+    raw = n.to_bytes((n.bit_length() + 7) // 8, "big")
+    out.append(len(raw))
+    out += raw
+
+
+def _str(text, out):
+    raw = text.encode()
+    _varint(len(raw), out)
+    out += raw
+
+
+def _encode_peer(peer, out):
+    node_id, ip, port = peer["node_id"], peer["ip"], peer["port"]
+    if not (type(node_id) is int and node_id >= 0 and type(port) is int and 0 <= port < 65536
+            and isinstance(ip, str)):
+        return False
+    try:
+        packed = socket.inet_aton(ip)
+        ipv4 = socket.inet_ntoa(packed) == ip
+    except OSError:
+        ipv4 = False
+    out.append(_PEER4 if ipv4 else _PEER)
+    _uint(node_id, out)
+    if ipv4:
+        out += packed
+    else:
+        _str(ip, out)
+    out += _PORT.pack(port)
+    return True
+
+
+def encode(value, out=None):
+    """Append the binary form of a JSON-like value to out (a bytearray)."""
+    out = bytearray() if out is None else out
+    if value is None:
+        out.append(_NONE)
+    elif value is True:
+        out.append(_TRUE)
+    elif value is False:
+        out.append(_FALSE)
+    elif isinstance(value, int):
+        out.append(_UINT if value >= 0 else _NINT)
+        _uint(abs(value), out)
+    elif isinstance(value, float):
+        out.append(_FLOAT)
+        out += _DOUBLE.pack(value)
+    elif isinstance(value, str):
+        out.append(_STR)
+        _str(value, out)
+    elif isinstance(value, dict):
+        if not (len(value) == 3 and value.keys() == _PEER_KEYS and _encode_peer(value, out)):
+            out.append(_DICT)
+            _varint(len(value), out)
+            for key, item in value.items():
+                _str(key, out)
+                encode(item, out)
+    elif isinstance(value, (list, tuple)):
+        out.append(_LIST)
+        _varint(len(value), out)
+        for item in value:
+            encode(item, out)
+    else:
+        raise TypeError(f"Cannot encode {type(value).__name__} for the wire")
+    return out
+
+
+def _decode(buf, pos):
+    tag = buf[pos]
+    pos += 1
+    if tag == _NONE:
+        return None, pos
+    if tag == _TRUE:
+        return True, pos
+    if tag == _FALSE:
+        return False, pos
+    if tag in (_UINT, _NINT):
+        size = buf[pos]
+        n = int.from_bytes(buf[pos + 1:pos + 1 + size], "big")
+        return (n if tag == _UINT else -n), pos + 1 + size
+    if tag == _FLOAT:
+        return _DOUBLE.unpack_from(buf, pos)[0], pos + 8
+    if tag == _STR:
+        size, pos = _read_varint(buf, pos)
+        return str(buf[pos:pos + size], "utf-8"), pos + size
+    if tag == _LIST:
+        count, pos = _read_varint(buf, pos)
+        items = []
+        for _ in range(count):
+            item, pos = _decode(buf, pos)
+            items.append(item)
+        return items, pos
+    if tag == _DICT:
+        count, pos = _read_varint(buf, pos)
+        result = {}
+        for _ in range(count):
+            size, pos = _read_varint(buf, pos)
+            key = str(buf[pos:pos + size], "utf-8")
+            result[key], pos = _decode(buf, pos + size)
+        return result, pos
+    if tag in (_PEER4, _PEER):
+        size = buf[pos]
+        node_id = int.from_bytes(buf[pos + 1:pos + 1 + size], "big")
+        pos += 1 + size
+        if tag == _PEER4:
+            ip = socket.inet_ntoa(bytes(buf[pos:pos + 4]))
+            pos += 4
+        else:
+            size, pos = _read_varint(buf, pos)
+            ip = str(buf[pos:pos + size], "utf-8")
+            pos += size
+        return {"node_id": node_id, "ip": ip, "port": _PORT.unpack_from(buf, pos)[0]}, pos + 2
+    raise ValueError(f"Unknown wire tag {tag}")
+
+
+def decode(buf):
+    value, pos = _decode(memoryview(buf), 0)
+    if pos != len(buf):
+        raise ValueError("Trailing bytes in wire frame")
+    return value
+
+
+def frame(request_id, kind, value):
+    body = encode(value, bytearray(_HEADER.size))
+    _HEADER.pack_into(body, 0, len(body) - _LENGTH.size, request_id, kind)
+    return body
+
+
+def read_frame(stream):
+    """(request ID, kind, decoded body) of the next frame, or None at end of stream."""
+    head = stream.read(_HEADER.size)
+    if len(head) < _HEADER.size:
+        return None
+    length, request_id, kind = _HEADER.unpack(head)
+    if length > WIRE_MAX_FRAME:
+        raise ValueError(f"Wire frame of {length} bytes")
+    body = stream.read(length - (_HEADER.size - _LENGTH.size))
+    if len(body) < length - (_HEADER.size - _LENGTH.size):
+        return None
+    return request_id, kind, decode(body)
+
+
+class WireResponse:
+    """The parts of requests.Response that callers of PeerClient use."""
+
+    __slots__ = ("status_code", "payload")
+
+    def __init__(self, status_code, payload):
+        self.status_code = status_code
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+    @property
+    def text(self):
+        return str(self.payload)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} from wire call", response=self)
+
+
+class WireConnection:
+    """One multiplexed socket to a peer's wire listener."""
+
+    def __init__(self, address, connect_timeout):
+        host, port = address.rsplit(":", 1)
+        self.address = address
+        self.sock = socket.create_connection((host, int(port) + WIRE_PORT_OFFSET), timeout=connect_timeout)
+        self.sock.settimeout(None)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._stream = self.sock.makefile("rb")
+        self._ids = itertools.count(1)
+        self._pending = {}  # request ID -> Future
+        self._lock = threading.Lock()  # guards _pending and whole-frame writes
+        self.closed = False
+        threading.Thread(target=self._read_loop, daemon=True).start()
+
+    def submit(self, route, params, body):
+        """Send a request; the Future resolves to (status, payload)."""
+        future = Future()
+        with self._lock:
+            if self.closed:
+                raise requests.ConnectionError(f"Wire connection to {self.address} is closed")
+            request_id = next(self._ids) & 0xFFFFFFFF
+            self._pending[request_id] = future
+            try:
+                self.sock.sendall(frame(request_id, REQUEST, [route, params or {}, body]))
+            except OSError as e:
+                self._pending.pop(request_id, None)
+                error = e
+            else:
+                error = None
+        if error is not None:
+            self.close(error)
+            raise requests.ConnectionError(f"Wire send to {self.address} failed: {error}")
+        # A caller that gives up (timeout, cancelled task) no longer waits for the answer
+        future.add_done_callback(lambda _: self._forget(request_id))
+        return future
+
+    def _forget(self, request_id):
+        with self._lock:
+            self._pending.pop(request_id, None)
+
+    def _read_loop(self):
+        error = None
+        try:
+            while True:
+                message = read_frame(self._stream)
+                if message is None:
+                    break
+                request_id, _, (status, payload) = message
+                with self._lock:
+                    future = self._pending.pop(request_id, None)
+                if future is not None and future.set_running_or_notify_cancel():
+                    future.set_result((status, payload))
+        except (OSError, ValueError) as e:
+            error = e
+        self.close(error)
+
+    def close(self, error=None):
+        with self._lock:
+            if self.closed:
+                return
+            self.closed = True
+            pending = list(self._pending.values())
+            self._pending.clear()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+        reason = f": {error}" if error else ""
+        for future in pending:
+            if future.set_running_or_notify_cancel():
+                future.set_exception(requests.ConnectionError(f"Wire connection to {self.address} lost{reason}"))
+
+
+class WireClient:
+    """Wire connections of one process, one per peer address, least recently
+    used closed beyond max_peers. Shared by PeerClient and AsyncPeerClient."""
+
+    def __init__(self, max_peers=MAX_PEERS):
+        self.max_peers = max_peers
+        self._connections = OrderedDict()  # address -> WireConnection
+        self._unavailable = {}  # address -> monotonic time to try its wire port again
+        self._lock = threading.Lock()
+
+    def connection(self, address, connect_timeout, connect=True):
+        """The open connection to address; opens one if connect is set and the
+        peer has not recently refused. None means use HTTP."""
+        with self._lock:
+            conn = self._connections.get(address)
+            if conn is not None and not conn.closed:
+                self._connections.move_to_end(address)
+                return conn
+            if not connect or self._unavailable.get(address, 0) > time.monotonic():
+                return None
+        try:
+            conn = WireConnection(address, connect_timeout)
+        except OSError:
+            with self._lock:
+                self._unavailable[address] = time.monotonic() + WIRE_RETRY
+            return None
+        evicted = []
+        with self._lock:
+            self._unavailable.pop(address, None)
+            current = self._connections.get(address)
+            if current is not None and not current.closed:
+                evicted.append(conn)  # another thread connected first
+                conn = current
+            else:
+                self._connections[address] = conn
+                while len(self._connections) > self.max_peers:
+                    evicted.append(self._connections.popitem(last=False)[1])
+        for stale in evicted:
+            stale.close()
+        return conn
+
+    def submit(self, peer, path, params=None, body=None, connect_timeout=TIMEOUTS["routing"][0], connect=True):
+        """Start a wire call; returns a Future of (status, payload), or None if
+        this call should go over HTTP."""
+        route = ROUTE_CODES.get(path)
+        if route is None:
+            return None
+        conn = self.connection(peer_address(peer), connect_timeout, connect)
+        return conn.submit(route, params, body) if conn is not None else None
+
+    def request(self, peer, path, options):
+        """PeerClient.request over the wire: a WireResponse, or None for HTTP.
+
+        options are the requests keyword arguments; calls with anything
+        beyond params, json and timeout (raw data, streaming) use HTTP.
+        Options left at None, such as PeerClient.post's data, do not count.
+        """
+        used = {name for name, value in options.items() if value is not None}
+        if path not in ROUTE_CODES or not used <= {"params", "json", "timeout"}:
+            return None
+        connect_timeout, read_timeout = options["timeout"]
+        future = self.submit(peer, path, options.get("params"), options.get("json"), connect_timeout)
+        if future is None:
+            return None
+        try:
+            status, payload = future.result(read_timeout)
+        except FutureTimeout:
+            future.cancel()
+            raise requests.Timeout(f"Wire call {path} to {peer_address(peer)} timed out")
+        return WireResponse(status, payload)
+
+    def drop(self, peer):
+        with self._lock:
+            conn = self._connections.pop(peer_address(peer), None)
+        if conn is not None:
+            conn.close()
+
+    def close(self):
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for conn in connections:
+            conn.close()
+
+
+class WireServer:
+    """Accepts wire connections for a VirtualNodeHost and answers each
+    request with handler(vnode, path, params, body) -> (status, payload)."""
+
+    def __init__(self, host, port, handler, workers=WIRE_WORKERS):
+        self.host = host
+        self.port = port
+        self.handler = handler
+        # Recursive lookups wait on other nodes while holding a thread, so
+        # this is sized like a threaded HTTP server rather than to the CPUs
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="wire")
+        self.sock = None
+
+    def start(self):
+        self.sock = socket.create_server(("0.0.0.0", self.port), backlog=1024)
+        threading.Thread(target=self._accept_loop, daemon=True).start()
+        print(f"[Wire] Serving node-to-node RPC on port {self.port}")
+        return self
+
+    def _accept_loop(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        stream = conn.makefile("rb")
+        write_lock = threading.Lock()
+        try:
+            while True:
+                message = read_frame(stream)
+                if message is None:
+                    break
+                request_id, _, request = message
+                self.pool.submit(self._answer, conn, write_lock, request_id, request)
+        except (OSError, ValueError) as e:
+            print(f"[Wire] Dropping connection: {e}")
+        finally:
+            conn.close()
+
+    def _answer(self, conn, write_lock, request_id, request):
+        started = time.perf_counter()
+        route, params, body = request
+        path = WIRE_ROUTES[route - 1] if isinstance(route, int) and 0 < route <= len(WIRE_ROUTES) else str(route)
+        try:
+            status, payload = self.handler(self.host.resolve(params.get("vnode")), path, params, body)
+        except Exception as e:
+            status, payload = 500, {"status": "error", "message": str(e)}
+        try:
+            response = frame(request_id, RESPONSE, [status, payload])
+        except TypeError as e:
+            status, response = 500, frame(request_id, RESPONSE, [500, {"status": "error", "message": str(e)}])
+        try:
+            with write_lock:
+                conn.sendall(response)
+        except OSError:
+            pass  # the reader notices the closed connection
+        HTTP_REQUESTS.inc(path, "WIRE", status)
+        HTTP_LATENCY.observe(time.perf_counter() - started, path)
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+
+
+def start_server(host, handler, http_port):
+    """Start the wire listener for host if WIRE_PROTOCOL is on."""
+    if not WIRE_PROTOCOL:
+        return None
+    return WireServer(host, http_port + WIRE_PORT_OFFSET, handler).start()
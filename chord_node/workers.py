@@ -0,0 +1,135 @@
+import mmap
+import multiprocessing
+import os
+import shutil
+import signal
+import socket
+import struct
+import tempfile
+import threading
+import time
+import traceback
+
+from metrics import REGISTRY
+
+WORKERS = int(os.getenv("WORKERS", "1"))  # server processes sharing this node's port
+ROUTING_REGION_SIZE = int(os.getenv("ROUTING_REGION_SIZE", str(1 << 20)))  # bytes of shared memory per vnode
+RESPAWN_DELAY = 1.0  # seconds before a crashed worker is restarted
+
+_HEADER = struct.Struct("=QI")  # sequence number, payload length
+
+
+class SharedRouting:
+    """Shared-memory slot holding one vnode's encoded routing snapshot.
+
+    The region is an anonymous shared mapping created before the workers
+    are forked, so every worker sees the same bytes. It is a seqlock: the
+    writer (which holds the node's cross-process routing lock) makes the
+    sequence number odd, copies the payload in, then makes it even again.
+    Readers retry if the number was odd or changed while they copied, and
+    compare it with the last number they decoded to skip unchanged reads.
+    """
+
+    def __init__(self, size=ROUTING_REGION_SIZE):
+        self._buf = mmap.mmap(-1, size)
+
+    def sequence(self):
+        return _HEADER.unpack_from(self._buf)[0]
+
+    def publish(self, raw):
+        if _HEADER.size + len(raw) > len(self._buf):
+            raise ValueError(f"Routing snapshot of {len(raw)} bytes exceeds ROUTING_REGION_SIZE")
+        seq = self.sequence()
+        _HEADER.pack_into(self._buf, 0, seq + 1, 0)
+        self._buf[_HEADER.size:_HEADER.size + len(raw)] = raw
+        _HEADER.pack_into(self._buf, 0, seq + 2, len(raw))
+
+    def read(self):
+        """(sequence, payload) of a snapshot that was not being written while copied."""
+        while True:
+            seq, length = _HEADER.unpack_from(self._buf)
+            if not seq & 1:
+                raw = self._buf[_HEADER.size:_HEADER.size + length]
+                if self.sequence() == seq:
+                    return seq, raw
+            time.sleep(0)
+
+
+def _exit_with_parent(parent):
+    """Stop a worker whose supervisor was killed, so it does not keep the port."""
+    while os.getppid() == parent:
+        time.sleep(1)
+    os._exit(1)
+
+
+def share(host):
+    """Prepare a VirtualNodeHost to be forked into workers.
+
+    Each vnode's routing moves into shared memory behind a process-shared
+    lock, and so does the host's join lock and joined flag. The key store is
+    already shared (ChordNode opens a SqliteKeyStore when WORKERS > 1); its
+    connections are closed so none crosses the fork.
+    """
+    for vnode in host:
+        vnode.share_routing(SharedRouting(), multiprocessing.RLock())
+    host.share_join_state(multiprocessing.Lock(), multiprocessing.RawValue("b", 0))
+    host.primary.data_store.close()
+
+
+def serve(host, run, port, workers=WORKERS):
+    """Serve one node from several processes.
+
+    The listening socket is opened here and inherited by `workers` forked
+    processes, each of which calls run(sock, index) with its own server on
+    that socket, so the kernel spreads connections over them. Worker 0 is
+    expected to run the stabilization loop. This process only supervises:
+    a worker that exits is started again with the same index, and SIGINT or
+    SIGTERM stops them all.
+    """
+    share(host)
+    metrics_dir = tempfile.mkdtemp(prefix="chord-metrics-")
+    REGISTRY.share(metrics_dir)
+    sock = socket.create_server(("0.0.0.0", port), backlog=1024)
+    supervisor = os.getpid()
+    children = {}
+
+    def spawn(index):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGINT, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            threading.Thread(target=_exit_with_parent, args=(supervisor,), daemon=True).start()
+            REGISTRY.start_worker()
+            code = 0
+            try:
+                run(sock, index)
+            except BaseException:
+                traceback.print_exc()
+                code = 1
+            finally:
+                os._exit(code)
+        children[pid] = index
+
+    def stop(signum, frame):
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        raise SystemExit(0)
+
+    for index in range(workers):
+        spawn(index)
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+    print(f"[Workers] Serving port {port} with {workers} worker processes")
+
+    while True:
+        pid, status = os.wait()
+        index = children.pop(pid, None)
+        if index is None:
+            continue
+        print(f"[Workers] Worker {index} (pid {pid}) exited with status {status}; restarting")
+        time.sleep(RESPAWN_DELAY)
+        spawn(index)
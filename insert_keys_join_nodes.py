@@ -13,6 +13,8 @@ KEYSPACE_SIZE = 2 ** M
 
 url_base = "http://localhost:5001/"  # Replace with your entry node
 headers = {'Content-Type': 'text/plain'}
+BATCH_SIZE = 200  # keys per /store_batch request
+JOIN_DELAY = 0.5  # seconds between joins; a join itself returns in well under a second
 
 def generate_random_key(length=16):
     return ''.join(random.choices(string.ascii_letters + string.digits, k=length))
@@ -52,22 +54,40 @@ def verify_distribution(N=10000):
     
     return keys, buckets
 
-def insert_keys(N=1000):
+def verify_node_load(ports):
+    """Keys actually held per node process (all of its virtual nodes), which
+    verify_distribution's hash buckets do not show."""
+    counts = []
+    for port in ports:
+        try:
+            info = requests.get(f"http://localhost:{port}/node_info").json()
+            counts.append(info["data_count"])
+            print(f"Node at port {port}: {info['data_count']} keys on {len(info.get('vnodes', [1]))} virtual nodes")
+        except requests.exceptions.RequestException as e:
+            print(f"Error reading node at port {port}: {e}")
+    if counts:
+        mean = np.mean(counts)
+        cv = np.std(counts) / mean if mean > 0 else 0
+        print(f"Mean keys per node: {mean:.2f}, coefficient of variation: {cv:.4f}")
+    return counts
+
+def insert_keys(N=1000, batch_size=BATCH_SIZE):
     keys, _ = verify_distribution(N)
     
-    for key in keys:
-        key_hash = sha256_hash(key)
-        value = f'value_for_{key}'
+    # The entry node groups each batch by responsible node and ships one request per owner.
+    for i in range(0, len(keys), batch_size):
+        items = {key: f'value_for_{key}' for key in keys[i:i + batch_size]}
         
-        url = url_base + "store/" + key
+        url = url_base + "store_batch"
         try:
-            response = requests.post(url, headers=headers, data=value)
+            response = requests.post(url, json={"items": items})
+            result = response.json()
             if response.status_code == 200:
-                print(f"Inserted key={key} (hash={key_hash}) successfully.")
+                print(f"Inserted {result['stored']} keys across {len(result['nodes'])} nodes.")
             else:
-                print(f"Failed to insert key={key} (hash={key_hash}). Response: {response.text}")
+                print(f"Failed to insert {len(result.get('failed', items))} keys. Response: {response.text}")
         except requests.exceptions.RequestException as e:
-            print(f"Request error for key={key}: {e}")
+            print(f"Request error for batch starting at key={keys[i]}: {e}")
 
 def generate_deterministic_keys(N=1000, seed=42):
     random.seed(seed)
@@ -86,7 +106,7 @@ def join_chord_nodes(new_ports, contact_node_host="chord_node_1", contact_node_p
     for port in new_ports:
         try:
             join_url = f"http://localhost:{port}/join"
-            time.sleep(3)
+            time.sleep(JOIN_DELAY)
             response = requests.post(join_url, data=contact_address, headers={'Content-Type': 'text/plain'})
             if response.status_code == 200:
                 print(f"Node at port {port} successfully joined the ring.")